@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Consultas ao armazém histórico das saídas ([ARMAZEM] arquivo) e importação dos arquivos
+finais já existentes:
+
+    python armazem.py importar [--pasta ./data_output] [--forcar]
+    python armazem.py cpf 012.345.678-90 [--tipo robo]
+    python armazem.py contagens [--de 2025-06-01] [--ate 2025-06-30] [--tipo humano]
+    python armazem.py sql "SELECT tipo, COUNT(*) FROM registros GROUP BY tipo"
+
+As consultas abrem o banco só para leitura e não importam o pandas.
+"""
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+from datetime import date
+from contextlib import closing
+from configparser import ConfigParser
+
+from src.armazem import TIPOS, caminho_armazem, conectar, historico_cpf, contagens_por_dia
+
+def _config(caminho: str) -> ConfigParser:
+    config = ConfigParser()
+    config.read(caminho, encoding='utf-8')
+    return config
+
+def _imprimir_tabela(colunas: list, linhas: list):
+    if not linhas:
+        print("(nenhum registro)")
+        return
+    textos = [['' if valor is None else str(valor) for valor in linha] for linha in linhas]
+    larguras = [max(len(coluna), *(len(linha[i]) for linha in textos)) for i, coluna in enumerate(colunas)]
+    print(' | '.join(coluna.ljust(largura) for coluna, largura in zip(colunas, larguras)))
+    print('-+-'.join('-' * largura for largura in larguras))
+    for linha in textos:
+        print(' | '.join(valor.ljust(largura) for valor, largura in zip(linha, larguras)))
+    print(f"({len(linhas)} linha(s))")
+
+def importar(args: argparse.Namespace, config: ConfigParser) -> int:
+    """Registra no armazém os arquivos finais da pasta que ainda não estão lá (ou todos, com --forcar)."""
+    from src.armazem import iterar_arquivos_finais, ja_registrado, registrar_arquivo_final
+
+    pasta = Path(args.pasta or config.get('PATHS', 'output_dir', fallback='./data_output'))
+    prefixo = config.get('COMPRESSOR', 'archive_name_prefix', fallback='mailing_')
+    destino = caminho_armazem(config)
+    importados = pulados = falhas = 0
+    with closing(conectar(destino)) as conexao:
+        for arquivo in iterar_arquivos_finais(pasta, prefixo):
+            if not args.forcar and ja_registrado(conexao, arquivo):
+                pulados += 1
+                continue
+            inicio = time.perf_counter()
+            try:
+                total = registrar_arquivo_final(conexao, config, arquivo)
+            except Exception as e:
+                print(f"[FALHA] {arquivo.name}: {e}")
+                falhas += 1
+                continue
+            print(f"[OK] {arquivo.name}: {total:,} registros em {time.perf_counter() - inicio:.1f}s")
+            importados += 1
+    print(f"{importados} arquivo(s) importado(s), {pulados} já presente(s), {falhas} falha(s) -> '{destino}'")
+    return 1 if falhas else 0
+
+def _consultar(args: argparse.Namespace, config: ConfigParser) -> int:
+    destino = caminho_armazem(config)
+    if not destino.is_file():
+        print(f"[FALHA] Armazém '{destino}' não encontrado. Use 'armazem.py importar' para criá-lo a partir dos arquivos finais.")
+        return 1
+    inicio = time.perf_counter()
+    with closing(conectar(destino, somente_leitura=True)) as conexao:
+        if args.comando == 'cpf':
+            colunas, linhas = historico_cpf(conexao, int(re.sub(r'\D', '', args.cpf) or 0), args.tipo)
+        elif args.comando == 'contagens':
+            colunas, linhas = contagens_por_dia(conexao, args.de.isoformat(), args.ate.isoformat(), args.tipo)
+        else:
+            cursor = conexao.execute(args.consulta)
+            colunas, linhas = [c[0] for c in cursor.description or []], cursor.fetchall()
+    _imprimir_tabela(colunas, linhas)
+    print(f"Consulta em {time.perf_counter() - inicio:.3f}s")
+    return 0
+
+def main(argv=None) -> int:
+    hoje = date.today()
+    parser = argparse.ArgumentParser(description="Armazém histórico das saídas: importação e consultas.")
+    parser.add_argument('--config', default='config.ini', help="Arquivo de configuração.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    parser_importar = subparsers.add_parser('importar', help="Importa os arquivos finais existentes para o armazém.")
+    parser_importar.add_argument('--pasta', help="Pasta dos arquivos finais (padrão: [PATHS] output_dir).")
+    parser_importar.add_argument('--forcar', action='store_true', help="Reimporta também os arquivos já registrados.")
+    parser_cpf = subparsers.add_parser('cpf', help="Histórico de um CPF (dias, tipo de saída e produto).")
+    parser_cpf.add_argument('cpf', help="CPF, com ou sem máscara e zeros à esquerda.")
+    parser_cpf.add_argument('--tipo', choices=TIPOS)
+    parser_contagens = subparsers.add_parser('contagens', help="Registros por dia, tipo e produto no período.")
+    parser_contagens.add_argument('--de', type=date.fromisoformat, default=hoje.replace(day=1), help="AAAA-MM-DD (padrão: início do mês).")
+    parser_contagens.add_argument('--ate', type=date.fromisoformat, default=hoje, help="AAAA-MM-DD (padrão: hoje).")
+    parser_contagens.add_argument('--tipo', choices=TIPOS)
+    parser_sql = subparsers.add_parser('sql', help="Consulta SQL livre (somente leitura) nas tabelas 'registros' e 'execucoes'.")
+    parser_sql.add_argument('consulta')
+    args = parser.parse_args(argv)
+
+    config = _config(args.config)
+    if args.comando == 'importar':
+        return importar(args, config)
+    return _consultar(args, config)
+
+if __name__ == "__main__":
+    sys.exit(main())
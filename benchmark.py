@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+import sys
+import json
+import time
+import logging
+import zipfile
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from configparser import ConfigParser
+import numpy as np
+import pandas as pd
+
+from src.escritor_csv import escrever_csv
+from src.gerador_robo_mestre import gerar_arquivo_robo_mestre
+from src.dados_sinteticos import gerar_conjunto, gravar_conjunto, ler_conjunto_colunar, LIMITE_LINHAS_EXCEL
+
+REPETICOES = 3
+TAMANHOS_ESCALA = [100_000, 250_000, 1_000_000, 5_000_000]
+# Comandos do cli.py que não podem importar a pilha de dados, e o teto do tempo de import deles
+COMANDOS_LEVES = [[], ['validate-config'], ['schema-diff', '--help'], ['diagnose', '--help'], ['service', 'enviar', '--help'], ['warehouse', '--help']]
+COMANDOS_PESADOS = [['audit', '--help'], ['run', '--help'], ['bench', '--help']]
+LIMITE_IMPORT_MS = 100.0
+
+def carregar_config() -> ConfigParser:
+    config = ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    return config
+
+def _maior_csv_humano_do_ultimo_arquivo(config: ConfigParser, destino: Path) -> Path | None:
+    """Extrai o maior CSV de produto (humano) do arquivo .zip mais recente da pasta de saída."""
+    output_dir = Path(config.get('PATHS', 'output_dir'))
+    prefixo = config.get('COMPRESSOR', 'archive_name_prefix', fallback='mailing_')
+    arquivos = list(output_dir.glob(f"{prefixo}*.zip"))
+    if not arquivos:
+        return None
+    ultimo = max(arquivos, key=lambda f: f.stat().st_mtime)
+    with zipfile.ZipFile(ultimo) as zf:
+        humanos = [i for i in zf.infolist() if i.filename.endswith('.csv') and '_mailing_' in i.filename]
+        if not humanos:
+            return None
+        maior = max(humanos, key=lambda i: i.file_size)
+        return Path(zf.extract(maior, destino))
+
+def benchmark_escrita_csv(caminho_csv: Path, sep: str = ';') -> dict:
+    """
+    Compara os backends de escrita de CSV: confere se a saída do pyarrow é idêntica byte a byte
+    à do pandas e mede a vazão de cada um.
+    """
+    df = pd.read_csv(caminho_csv, sep=sep, dtype=str, encoding='utf-8-sig', keep_default_na=False)
+    df = df.replace('', None)
+    resultado = {'arquivo': caminho_csv.name, 'linhas': len(df), 'backends': {}}
+
+    with tempfile.TemporaryDirectory() as pasta:
+        saidas = {}
+        for backend in ('pandas', 'pyarrow'):
+            destino = Path(pasta) / f"{backend}.csv"
+            tempos = []
+            for _ in range(REPETICOES):
+                inicio = time.perf_counter()
+                escrever_csv(df, destino, sep, backend=backend)
+                tempos.append(time.perf_counter() - inicio)
+            saidas[backend] = destino.read_bytes()
+            melhor = min(tempos)
+            resultado['backends'][backend] = {
+                'segundos': melhor,
+                'mb_por_segundo': len(saidas[backend]) / 1024 / 1024 / melhor if melhor else 0.0,
+            }
+        resultado['identico'] = saidas['pandas'] == saidas['pyarrow']
+    return resultado
+
+def _df_robo_sintetico(linhas: int, semente: int = 42) -> pd.DataFrame:
+    """DataFrame no formato de saída do pipeline, com ~3 faturas por CPF, para medir o gerador do robô."""
+    rng = np.random.default_rng(semente)
+    cpfs = rng.integers(10**9, 10**11, max(1, linhas // 3))[rng.integers(0, max(1, linhas // 3), linhas)]
+    return pd.DataFrame({
+        'NOME_CLIENTE': 'CLIENTE ' + pd.Series(cpfs).astype(str),
+        'PRODUTO': rng.choice(['EPB', 'EMR', 'ESS', 'ESE', 'ETO', 'ERO', 'EMT', 'EMS', 'EAC'], linhas),
+        'CPF': cpfs,
+        'parcelasEmAtrado': rng.integers(1, 12, linhas),
+        'valorDivida': np.round(rng.random(linhas) * 2000, 2),
+        'liquido': np.round(rng.random(linhas) * 500, 2),
+        'codbarra': rng.integers(10**10, 10**11, linhas).astype(str),
+        'dtvenc': pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 700, linhas), unit='D'),
+        'just': rng.choice(['', 'SEM CONTATO', 'PROMESSA'], linhas),
+        'TELEFONE_01': rng.integers(61900000000, 69999999999, linhas).astype(str),
+        'TELEFONE_02': rng.integers(61900000000, 69999999999, linhas).astype(str),
+    })
+
+def benchmark_robo(config: ConfigParser, linhas: int) -> dict:
+    """Mede o tempo do gerador do mailing mestre do robô sobre um DataFrame sintético."""
+    df = _df_robo_sintetico(linhas)
+    tempos = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for _ in range(REPETICOES):
+            inicio = time.perf_counter()
+            gerar_arquivo_robo_mestre(df, config, Path(pasta))
+            tempos.append(time.perf_counter() - inicio)
+    melhor = min(tempos)
+    return {'linhas': linhas, 'cpfs': int(df['CPF'].nunique()), 'segundos': melhor, 'linhas_por_segundo': linhas / melhor if melhor else 0.0}
+
+def preparar_insumos_sinteticos(linhas: int, semente: int, pasta_dados: Path, excel: bool = False) -> Path:
+    """Gera (uma única vez por tamanho e semente) a massa sintética em Parquet e, opcionalmente, em Excel."""
+    destino = pasta_dados / f"sintetico_{linhas}_{semente}"
+    faltando_excel = excel and linhas <= LIMITE_LINHAS_EXCEL and not any(destino.glob('MAILING_NUCLEO_*.xlsx'))
+    if not (destino / 'mailing.parquet').is_file() or faltando_excel:
+        inicio = time.perf_counter()
+        formatos = ['parquet'] + (['xlsx'] if excel else [])
+        gravar_conjunto(gerar_conjunto(linhas, semente), destino, formatos)
+        print(f"  Massa sintética de {linhas:,} linhas gerada em '{destino}' ({time.perf_counter() - inicio:.1f}s)")
+    return destino
+
+def _config_benchmark(config: ConfigParser, pasta_insumos: Path, pasta_saida: Path) -> ConfigParser:
+    """Cópia do config.ini apontando entrada e saída para as pastas do benchmark."""
+    config_local = ConfigParser()
+    config_local.read_dict({secao: dict(config.items(secao, raw=True)) for secao in config.sections()})
+    config_local.set('PATHS', 'input_dir', str(pasta_insumos))
+    config_local.set('PATHS', 'output_dir', str(pasta_saida))
+    return config_local
+
+def benchmark_escala(config: ConfigParser, linhas: int, semente: int, pasta_dados: Path, excel: bool = False) -> dict:
+    """
+    Executa o pipeline completo sobre a massa sintética e mede cada etapa de processar_dados,
+    os exportadores, a formatação e a compressão.
+    """
+    from src.data_loader import load_all_data, converter_identificadores
+    from src.processing_pipeline import processar_dados
+    from src.data_exporter import exportar_dados_humanos
+    from src.formatador_dados import formatar_csvs_para_padrao_br
+    from src.final_polisher import polimento_final
+    from src.compressor import organize_and_compress_output
+
+    pasta_insumos = preparar_insumos_sinteticos(linhas, semente, pasta_dados, excel)
+    etapas = {}
+
+    def medir(nome, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        etapas[nome] = time.perf_counter() - inicio
+        return resultado
+
+    with tempfile.TemporaryDirectory() as pasta:
+        config_local = _config_benchmark(config, pasta_insumos, Path(pasta) / 'saida')
+        pasta_do_dia = Path(pasta) / 'saida' / datetime.now().strftime(config_local.get('SETTINGS', 'output_date_format'))
+        pasta_do_dia.mkdir(parents=True)
+        log_vazio = Path(pasta) / 'benchmark.log'
+        log_vazio.touch()
+
+        if excel and any(pasta_insumos.glob('MAILING_NUCLEO_*.xlsx')):
+            dados = medir('Carregamento (Excel)', load_all_data, config_local)
+        else:
+            # Com a mesma conversão dos identificadores em chaves inteiras que o load_all_data faz
+            dados = medir('Carregamento (Parquet)', lambda pasta: {
+                nome: converter_identificadores(config_local, nome, base) for nome, base in ler_conjunto_colunar(pasta).items()
+            }, pasta_insumos)
+
+        tempos_processamento = {}
+        inicio = time.perf_counter()
+        (df_humano, df_robo), _ = processar_dados(dados, config_local, pasta_do_dia, tempos_processamento)
+        etapas.update({f"processar_dados: {nome}": duracao for nome, duracao in tempos_processamento.items()})
+        etapas['processar_dados (total)'] = time.perf_counter() - inicio
+
+        medir('Exportação Humano', exportar_dados_humanos, df_humano, config_local, pasta_do_dia)
+        medir('Mailing Mestre do Robô', gerar_arquivo_robo_mestre, df_robo, config_local, pasta_do_dia)
+        medir('Formatação BR', formatar_csvs_para_padrao_br, pasta_do_dia)
+        medir('Polimento Final', polimento_final, pasta_do_dia)
+        medir('Organização e Compressão', organize_and_compress_output, config_local, str(log_vazio))
+
+    return {
+        'linhas': linhas, 'semente': semente, 'humano': len(df_humano), 'robo': len(df_robo),
+        'etapas': {nome: round(duracao, 4) for nome, duracao in etapas.items()},
+        'total': round(sum(d for n, d in etapas.items() if not n.startswith('processar_dados: ')), 4),
+    }
+
+def tabela_escala_markdown(resultados: list) -> str:
+    """Tabela de escalabilidade: uma linha por etapa, uma coluna (segundos) por tamanho de entrada."""
+    etapas = list(dict.fromkeys(nome for r in resultados for nome in r['etapas']))
+    cabecalho = "| Etapa | " + " | ".join(f"{r['linhas']:,} linhas" for r in resultados) + " |"
+    linhas = [cabecalho, "|---|" + "---:|" * len(resultados)]
+    for etapa in etapas + ['total']:
+        valores = [r['total'] if etapa == 'total' else r['etapas'].get(etapa) for r in resultados]
+        celulas = [f"{v:.2f}s" if v is not None else "-" for v in valores]
+        nome = f"**{etapa}**" if etapa == 'total' else etapa
+        linhas.append(f"| {nome} | " + " | ".join(celulas) + " |")
+    vazoes = [f"{r['linhas'] / r['total']:,.0f}" if r['total'] else "-" for r in resultados]
+    linhas.append("| linhas/s (total) | " + " | ".join(vazoes) + " |")
+    return "\n".join(linhas)
+
+def _executar_escala(config: ConfigParser, tamanhos: list, semente: int, pasta_dados: str, excel: bool, saida_json: str | None):
+    logging.basicConfig(level=logging.WARNING)
+    resultados = []
+    for linhas in tamanhos:
+        print(f"  Executando o pipeline com {linhas:,} linhas...")
+        resultados.append(benchmark_escala(config, linhas, semente, Path(pasta_dados), excel))
+
+    print("=" * 80)
+    print("  Benchmark de escalabilidade do pipeline (massa sintética)")
+    print("=" * 80)
+    print(tabela_escala_markdown(resultados))
+    if saida_json:
+        Path(saida_json).write_text(json.dumps(resultados, indent=4, ensure_ascii=False), encoding='utf-8')
+        print(f"\n  Resultados gravados em '{saida_json}'.")
+
+def _executar_sintetico(linhas: int, semente: int, destino: str, excel: bool):
+    inicio = time.perf_counter()
+    formatos = ['parquet'] + (['xlsx'] if excel else [])
+    gravados = gravar_conjunto(gerar_conjunto(linhas, semente), Path(destino), formatos)
+    print(f"  {linhas:,} linhas sintéticas gravadas em '{destino}' ({', '.join(sorted(gravados))}) em {time.perf_counter() - inicio:.1f}s")
+
+def _executar_csv(config: ConfigParser, arquivo: str | None):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = Path(arquivo) if arquivo else _maior_csv_humano_do_ultimo_arquivo(config, Path(pasta))
+        if not caminho or not caminho.is_file():
+            print("[FALHA] Nenhum CSV informado e nenhum arquivo de saída encontrado para o benchmark.")
+            return
+
+        sep = '|' if 'TOI_AD_FF_ENERGISA' in caminho.name else ';'
+        resultado = benchmark_escrita_csv(caminho, sep)
+
+    print("=" * 80)
+    print(f"  Benchmark de escrita de CSV: {resultado['arquivo']} ({resultado['linhas']:,} linhas)")
+    print("=" * 80)
+    for backend, medida in resultado['backends'].items():
+        print(f"  {backend:<10} {medida['segundos']:>8.3f}s  {medida['mb_por_segundo']:>8.1f} MB/s")
+    print(f"\n  Saídas idênticas: {'SIM' if resultado['identico'] else 'NÃO'}")
+
+def _executar_robo(config: ConfigParser, linhas: int):
+    resultado = benchmark_robo(config, linhas)
+    print("=" * 80)
+    print(f"  Benchmark do mailing mestre do robô: {resultado['linhas']:,} linhas, {resultado['cpfs']:,} CPFs")
+    print("=" * 80)
+    print(f"  {resultado['segundos']:.3f}s  ({resultado['linhas_por_segundo']:,.0f} linhas/s)")
+
+def medir_inicializacao(comando: list) -> dict:
+    """
+    Executa 'cli.py <comando>' com -X importtime e soma o tempo acumulado dos imports de primeiro
+    nível (os que aparecem sem recuo na saída), ou seja, todo o import feito pelo processo.
+    """
+    inicio = time.perf_counter()
+    processo = subprocess.run([sys.executable, '-X', 'importtime', 'cli.py', *comando], capture_output=True, text=True)
+    total_ms = (time.perf_counter() - inicio) * 1000
+    import_us, modulos = 0, []
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, nome = linha[len('import time:'):].split('|')
+        # Imports aninhados vêm recuados; os de primeiro nível têm um único espaço antes do nome
+        if nome[1:2] != ' ':
+            import_us += int(acumulado)
+            modulos.append((int(acumulado), nome.strip()))
+    return {
+        'comando': ' '.join(comando) or '--help',
+        'import_ms': import_us / 1000,
+        'total_ms': total_ms,
+        'mais_lentos': sorted(modulos, reverse=True)[:3],
+        'pandas': any(nome == 'pandas' for _, nome in modulos),
+    }
+
+def _executar_inicializacao() -> int:
+    print("=" * 80)
+    print(f"  Inicialização dos comandos do cli.py (teto dos comandos leves: {LIMITE_IMPORT_MS:.0f} ms de import)")
+    print("=" * 80)
+    estourados = []
+    for comando in COMANDOS_LEVES + COMANDOS_PESADOS:
+        medida = medir_inicializacao(comando)
+        leve = comando in COMANDOS_LEVES
+        estourou = leve and (medida['import_ms'] > LIMITE_IMPORT_MS or medida['pandas'])
+        if estourou:
+            estourados.append(medida['comando'])
+        mais_lentos = ', '.join(f"{nome} {us / 1000:.0f}ms" for us, nome in medida['mais_lentos'])
+        marcador = '!!' if estourou else '  '
+        print(f"{marcador} {medida['comando']:<26} import {medida['import_ms']:>7.1f} ms  processo {medida['total_ms']:>7.1f} ms  [{mais_lentos}]")
+    if estourados:
+        print(f"\n[FALHA] Comandos leves acima do teto ou importando o pandas: {', '.join(estourados)}")
+        return 1
+    print("\n[OK] Todos os comandos leves dentro do teto.")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline e das etapas de exportação.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    parser_csv = subparsers.add_parser('csv', help="Compara os backends de escrita de CSV (pandas x pyarrow).")
+    parser_csv.add_argument('arquivo', nargs='?', help="CSV a reescrever. Padrão: maior arquivo de produto do último .zip.")
+    parser_robo = subparsers.add_parser('robo', help="Mede o gerador do mailing mestre do robô.")
+    parser_robo.add_argument('linhas', nargs='?', type=int, default=250_000)
+    parser_sintetico = subparsers.add_parser('sintetico', help="Gera massa sintética determinística (Parquet e, opcionalmente, Excel).")
+    parser_sintetico.add_argument('linhas', type=int)
+    parser_sintetico.add_argument('destino', help="Pasta de saída. Com --excel, pode servir de input_dir do pipeline.")
+    parser_sintetico.add_argument('--semente', type=int, default=42)
+    parser_sintetico.add_argument('--excel', action='store_true', help=f"Grava também as planilhas (até {LIMITE_LINHAS_EXCEL:,} linhas).")
+    parser_escala = subparsers.add_parser('escala', help="Mede cada etapa do pipeline em vários tamanhos de massa sintética.")
+    parser_escala.add_argument('tamanhos', nargs='*', type=int, default=TAMANHOS_ESCALA)
+    parser_escala.add_argument('--semente', type=int, default=42)
+    parser_escala.add_argument('--pasta-dados', default='./data_benchmark', help="Cache da massa sintética gerada.")
+    parser_escala.add_argument('--excel', action='store_true', help="Inclui a leitura das planilhas no tempo de carregamento.")
+    parser_escala.add_argument('--json', dest='saida_json', help="Arquivo JSON para os resultados.")
+    subparsers.add_parser('inicializacao', help="Mede o import de cada comando do cli.py (falha se um comando leve passar do teto).")
+    args = parser.parse_args(argv)
+
+    config = carregar_config()
+    if args.comando == 'csv':
+        _executar_csv(config, args.arquivo)
+    elif args.comando == 'robo':
+        _executar_robo(config, args.linhas)
+    elif args.comando == 'sintetico':
+        _executar_sintetico(args.linhas, args.semente, args.destino, args.excel)
+    elif args.comando == 'inicializacao':
+        return _executar_inicializacao()
+    else:
+        _executar_escala(config, args.tamanhos, args.semente, args.pasta_dados, args.excel, args.saida_json)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Ponto de entrada único das ferramentas do projeto:
+
+    python cli.py run [--profile ...]        pipeline completo (main.py)
+    python cli.py merge [PASTA ...]           junta as saídas dos shards (main.py --merge)
+    python cli.py validate-config [--config]  confere o config.ini
+    python cli.py schema-diff [...]           drift de schema das entradas (schema.py)
+    python cli.py audit [...]                 laudo de vazamento das saídas (laudo.py)
+    python cli.py diagnose [...]              diagnóstico das colunas-chave (diagnostico.py)
+    python cli.py bench <benchmark> [...]     benchmarks (benchmark.py)
+    python cli.py service iniciar|enviar      modo serviço com as referências em memória (servico.py)
+    python cli.py warehouse <consulta>        armazém histórico das saídas (armazem.py)
+
+Cada comando só importa o módulo que o executa, no momento em que é chamado: os comandos
+leves não pagam o import de pandas, numpy e pyarrow que o pipeline e o laudo exigem.
+"""
+import sys
+import argparse
+import importlib
+
+# comando: (módulo com main(argv), descrição)
+COMANDOS = {
+    'run': ('main', "Executa o pipeline completo de geração do mailing."),
+    'merge': ('main', "Junta as saídas dos shards (main.py --shard k/N) no arquivo final."),
+    'validate-config': (None, "Valida o config.ini (chaves obrigatórias e tipos)."),
+    'schema-diff': ('schema', "Compara o schema (colunas) dos arquivos de entrada."),
+    'audit': ('laudo', "Audita os arquivos de saída em busca de status proibidos."),
+    'diagnose': ('diagnostico', "Levanta os valores das colunas-chave das entradas."),
+    'bench': ('benchmark', "Benchmarks do pipeline, das exportações e da inicialização."),
+    'service': ('servico', "Modo serviço: pipeline residente atendendo pedidos por socket ou gatilhos."),
+    'warehouse': ('armazem', "Armazém histórico das saídas: importação e consultas por CPF, dia e produto."),
+}
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='cli.py', description="Ferramentas do mailing TOI.",
+        epilog="Use 'cli.py <comando> --help' para as opções de cada comando."
+    )
+    subparsers = parser.add_subparsers(dest='comando', required=True, metavar='comando')
+    for nome, (_, ajuda) in COMANDOS.items():
+        # Sem --help próprio: a ajuda (e todas as opções) ficam com o módulo do comando
+        subparsers.add_parser(nome, help=ajuda, add_help=False)
+    return parser
+
+def _validar_config(argv: list) -> int:
+    parser = argparse.ArgumentParser(prog='cli.py validate-config', description=COMANDOS['validate-config'][1])
+    parser.add_argument('--config', default='config.ini', help="Arquivo de configuração a validar.")
+    args = parser.parse_args(argv)
+
+    from src.config_manager import load_config, validate_config
+    try:
+        validate_config(load_config(args.config))
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[FALHA] {e}")
+        return 1
+    print(f"[OK] '{args.config}' é válido.")
+    return 0
+
+def main(argv: list | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    # 1. Só o nome do comando é interpretado aqui; o restante segue intacto para o módulo
+    args, resto = _parser().parse_known_args(argv[:1])
+    resto += argv[1:]
+
+    # 2. O módulo do comando é importado apenas agora
+    if args.comando == 'validate-config':
+        return _validar_config(resto)
+    if args.comando == 'merge':
+        resto = ['--merge'] + resto
+    modulo = importlib.import_module(COMANDOS[args.comando][0])
+    return modulo.main(resto) or 0
+
+if __name__ == '__main__':
+    sys.exit(main())
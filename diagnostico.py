@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 # 1
-import pandas as pd
+import os
+import argparse
+from collections import Counter
 from pathlib import Path
 from configparser import ConfigParser
 from datetime import datetime
 import logging
 
+from src.cache_arquivos import CacheArquivos
+from src.leitor_xlsx import ler_cabecalho_xlsx, ler_colunas_xlsx
+
 # Configuração básica de logging para o terminal
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -13,8 +18,12 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # 2
 INPUT_DIR_CONFIG_KEY = 'input_dir'
 PATHS_SECTION = 'PATHS'
-COLUNAS_INVESTIGADAS = ['bloq', 'just']
+DIAGNOSTICO_SECTION = 'DIAGNOSTICO'
+# Usadas quando [DIAGNOSTICO] colunas_investigadas não está no config.ini
+COLUNAS_INVESTIGADAS_PADRAO = ['bloq', 'just']
 NOME_ARQUIVO_SAIDA = "RELATORIO_DIAGNOSTICO.md"
+CACHE_PADRAO = "./.diagnostico_cache.json"
+VERSAO_CACHE = 1
 
 def carregar_config() -> ConfigParser:
     """Carrega o arquivo de configuração principal."""
@@ -26,9 +35,22 @@ def carregar_config() -> ConfigParser:
         logging.error(f"Não foi possível ler o config.ini: {e}")
         return None
 
+def colunas_investigadas(config: ConfigParser) -> list:
+    """Colunas investigadas, de [DIAGNOSTICO] colunas_investigadas (separadas por vírgula ou linha)."""
+    bruto = config.get(DIAGNOSTICO_SECTION, 'colunas_investigadas', fallback='')
+    colunas = [c.strip().lower() for c in bruto.replace('\n', ',').split(',') if c.strip()]
+    return colunas or list(COLUNAS_INVESTIGADAS_PADRAO)
+
+def _chave_valor(valor) -> str:
+    """Números inteiros lidos como float (1.0) aparecem como o pandas os mostraria (1)."""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
 def analisar_arquivo_excel(file_path: Path, colunas_alvo: list) -> dict:
     """
-    Lê um arquivo Excel, extrai o schema e os valores únicos das colunas alvo.
+    Lê o cabeçalho da primeira aba e, das linhas, apenas as colunas alvo, contando a frequência
+    de cada valor. Roda em processos separados: recebe e devolve só tipos simples.
     """
     resultado = {
         "arquivo": file_path.name,
@@ -37,35 +59,72 @@ def analisar_arquivo_excel(file_path: Path, colunas_alvo: list) -> dict:
     }
     try:
         logging.info(f"Analisando o arquivo: {file_path.name}")
-        df = pd.read_excel(file_path, engine='openpyxl')
-        
         # Normaliza nomes das colunas
-        df.columns = [str(col).strip().lower() for col in df.columns]
-        resultado["colunas_totais"] = sorted(df.columns)
+        cabecalho = {str(col).strip().lower(): col for col in ler_cabecalho_xlsx(file_path)}
+        resultado["colunas_totais"] = sorted(cabecalho)
 
+        presentes = [coluna for coluna in colunas_alvo if coluna in cabecalho]
+        valores = ler_colunas_xlsx(file_path, [cabecalho[c] for c in presentes]) if presentes else {}
         for coluna in colunas_alvo:
-            if coluna in df.columns:
-                valores_unicos = df[coluna].dropna().unique().tolist()
-                resultado["analise_colunas"][coluna] = valores_unicos
+            if coluna in cabecalho:
+                contagem = Counter(_chave_valor(v) for v in valores[cabecalho[coluna]] if v is not None and v != '')
+                resultado["analise_colunas"][coluna] = dict(contagem.most_common())
             else:
                 resultado["analise_colunas"][coluna] = "Coluna não encontrada"
 
     except Exception as e:
         logging.error(f"Falha ao processar o arquivo {file_path.name}: {e}")
         resultado["erro"] = str(e)
-        
+
     return resultado
 
+def analisar_arquivos(arquivos: list, colunas_alvo: list, cache: CacheArquivos, max_workers: int) -> list:
+    """
+    Analisa os arquivos em paralelo (um processo por arquivo). Do cache vêm o cabeçalho e as
+    contagens já calculadas para o mesmo conteúdo; só as colunas ainda não vistas são lidas.
+    """
+    resultados, pendentes = {}, {}
+    for arquivo in arquivos:
+        sha256 = cache.hash(arquivo)
+        anterior = cache.resultado(sha256) or {}
+        faltantes = [c for c in colunas_alvo if c not in anterior.get('analise_colunas', {})]
+        if anterior and not faltantes:
+            logging.info(f"Arquivo {arquivo.name} sem alterações: resultado do cache.")
+        else:
+            pendentes[arquivo] = (sha256, faltantes)
+        resultados[arquivo] = anterior
+
+    if pendentes:
+        # Importado só aqui: o multiprocessing pesa na inicialização do 'cli.py diagnose --help'
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max(1, min(max_workers, len(pendentes)))) as executor:
+            novos = executor.map(analisar_arquivo_excel, list(pendentes), [f for _, f in pendentes.values()])
+            for (arquivo, (sha256, _)), novo in zip(pendentes.items(), novos):
+                if novo.get("erro"):
+                    resultados[arquivo] = novo
+                    continue
+                combinado = dict(resultados[arquivo])
+                combinado["colunas_totais"] = novo["colunas_totais"]
+                combinado["analise_colunas"] = {**combinado.get("analise_colunas", {}), **novo["analise_colunas"]}
+                cache.registrar(arquivo, sha256, combinado)
+                resultados[arquivo] = combinado
+
+    # Só as colunas pedidas nesta execução entram no relatório, no nome atual do arquivo
+    return [
+        {**r, "arquivo": a.name, "analise_colunas": {c: r["analise_colunas"][c] for c in colunas_alvo if c in r.get("analise_colunas", {})}}
+        for a, r in resultados.items()
+    ]
+
 def gerar_relatorio(resultados_analise: list):
     # 3
     """Gera um arquivo markdown com os resultados da análise."""
     now = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-    
+
     with open(NOME_ARQUIVO_SAIDA, 'w', encoding='utf-8') as f:
         f.write(f"# Relatório de Diagnóstico de Dados\n")
         f.write(f"Gerado em: {now}\n\n")
         f.write("---\n\n")
-        
+
         if not resultados_analise:
             f.write("## Nenhum arquivo Excel encontrado ou processado no diretório de entrada.\n")
             return
@@ -81,16 +140,16 @@ def gerar_relatorio(resultados_analise: list):
             f.write("### Análise de Colunas-Chave\n\n")
             for coluna, valores in resultado['analise_colunas'].items():
                 f.write(f"#### Coluna: `{coluna}`\n")
-                if isinstance(valores, list):
-                    f.write(f"* **Valores Únicos Encontrados ({len(valores)}):**\n")
-                    f.write("    ```\n")
-                    for valor in sorted(valores):
-                        f.write(f"    - {valor}\n")
-                    f.write("    ```\n")
+                if isinstance(valores, dict):
+                    f.write(f"* **Valores Únicos Encontrados ({len(valores)}), com a frequência de cada um:**\n\n")
+                    f.write("| Valor | Ocorrências |\n")
+                    f.write("| :--- | ---: |\n")
+                    for valor, ocorrencias in sorted(valores.items(), key=lambda item: (-item[1], item[0])):
+                        f.write(f"| `{valor}` | {ocorrencias:,} |\n")
                 else:
                     f.write(f"* **Status:** {valores}\n")
                 f.write("\n")
-            
+
             f.write("<details>\n")
             f.write("<summary>Clique para ver todas as colunas</summary>\n\n")
             f.write("```\n")
@@ -99,12 +158,20 @@ def gerar_relatorio(resultados_analise: list):
             f.write("```\n\n")
             f.write("</details>\n\n")
             f.write("---\n\n")
-            
+
     logging.info(f"Relatório de diagnóstico salvo em '{NOME_ARQUIVO_SAIDA}'")
 
-def main():
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Diagnóstico das colunas-chave dos arquivos de entrada.")
+    parser.add_argument('--colunas', help="Colunas investigadas, separadas por vírgula (sobrepõe o config.ini).")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help="Arquivos analisados em paralelo.")
+    parser.add_argument('--sem-cache', action='store_true', help="Ignora e não atualiza o cache de resultados.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     # 4
     """Função principal que orquestra a análise."""
+    args = _parse_args(argv)
     logging.info("Iniciando script de diagnóstico de dados...")
     config = carregar_config()
     if not config or not config.has_section(PATHS_SECTION) or not config.has_option(PATHS_SECTION, INPUT_DIR_CONFIG_KEY):
@@ -116,14 +183,17 @@ def main():
         logging.critical(f"O diretório de entrada '{input_dir}' não existe. Abortando.")
         return
 
-    arquivos_excel = list(input_dir.glob("*.xlsx"))
+    arquivos_excel = sorted(input_dir.glob("*.xlsx"))
     if not arquivos_excel:
         logging.warning(f"Nenhum arquivo .xlsx encontrado em '{input_dir}'.")
-    
-    resultados = []
-    for arquivo in arquivos_excel:
-        resultados.append(analisar_arquivo_excel(arquivo, COLUNAS_INVESTIGADAS))
-        
+
+    colunas_alvo = [c.strip().lower() for c in args.colunas.split(',') if c.strip()] if args.colunas else colunas_investigadas(config)
+    caminho_cache = config.get(DIAGNOSTICO_SECTION, 'cache', fallback=CACHE_PADRAO)
+    cache = CacheArquivos(None if args.sem_cache else Path(caminho_cache), VERSAO_CACHE)
+
+    resultados = analisar_arquivos(arquivos_excel, colunas_alvo, cache, args.workers)
+    cache.salvar()
+
     gerar_relatorio(resultados)
     logging.info("Diagnóstico concluído.")
 
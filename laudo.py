@@ -1,24 +1,28 @@
 # -*- coding: utf-8 -*-
+import os
+import argparse
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from configparser import ConfigParser
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import logging
 import zipfile
-import tempfile
+
+from src.checkpoints import GerenciadorCheckpoints
+from src.data_loader import localizar_arquivos_entrada
+from src.leitor_xlsx import ler_cabecalho_xlsx, ler_colunas_xlsx
+from src.motor_regras import Regra, corrigir_mojibake, regra_status_bloqueio
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- FUNÇÕES AUXILIARES ---
+# Linhas lidas de cada CSV para decidir quais colunas podem conter texto
+LINHAS_AMOSTRA = 1000
+# Conteúdo que não é texto livre: números, datas, telefones e valores monetários
+PADRAO_NAO_TEXTO = r'[\d\s.,:/+\-]*'
 
-def _sanitize_encoding(text: str) -> str:
-    """Tenta corrigir problemas comuns de encoding (Mojibake)."""
-    if not isinstance(text, str):
-        return text
-    try:
-        return text.encode('latin1').decode('utf-8')
-    except (UnicodeEncodeError, UnicodeDecodeError):
-        return text
+# --- FUNÇÕES AUXILIARES ---
 
 def carregar_config() -> ConfigParser:
     """Carrega o arquivo de configuração principal."""
@@ -43,6 +47,22 @@ def encontrar_arquivo_recente(diretorio: Path, padrao: str) -> Path | None:
 
 # --- FUNÇÕES DE ANÁLISE ---
 
+def _ler_coluna_entrada(config: ConfigParser, arquivo_mailing: Path, coluna: str) -> pd.Series:
+    """
+    Valores de uma coluna do mailing sem reler a planilha inteira: primeiro da cópia colunar do
+    checkpoint do carregamento (se for do mesmo arquivo), depois por projeção direta do XML.
+    """
+    checkpoints = GerenciadorCheckpoints(config)
+    if checkpoints.habilitado and localizar_arquivos_entrada(config).get('mailing_nucleo_pattern') == arquivo_mailing:
+        df = checkpoints.carregar_colunas('carregamento', checkpoints.chave_carregamento(), ['mailing'], [coluna])
+        if df is not None and coluna in df.columns:
+            logging.info(f"Coluna '{coluna}' lida da cópia colunar (checkpoint do carregamento).")
+            return df[coluna]
+    cabecalho = {str(col).strip().lower(): col for col in ler_cabecalho_xlsx(arquivo_mailing)}
+    if coluna not in cabecalho:
+        return None
+    return pd.Series(ler_colunas_xlsx(arquivo_mailing, [cabecalho[coluna]])[cabecalho[coluna]], dtype=object)
+
 def analisar_status_entrada(config: ConfigParser) -> set:
     logging.info("--- Fase 1: Analisando arquivo de ENTRADA ---")
     input_dir = Path(config.get('PATHS', 'input_dir'))
@@ -55,82 +75,107 @@ def analisar_status_entrada(config: ConfigParser) -> set:
         return set()
 
     logging.info(f"Lendo arquivo de entrada: {arquivo_mailing.name}")
-    df = pd.read_excel(arquivo_mailing, engine='openpyxl')
-    df.columns = [str(col).strip().lower() for col in df.columns]
+    valores = _ler_coluna_entrada(config, arquivo_mailing, coluna_bloqueio)
 
-    if coluna_bloqueio not in df.columns:
+    if valores is None:
         logging.warning(f"A coluna de bloqueio '{coluna_bloqueio}' não foi encontrada no arquivo de entrada.")
         return set()
 
-    status_unicos_raw = df[coluna_bloqueio].dropna().unique()
-    status_unicos_sanitizados = {_sanitize_encoding(str(s)) for s in status_unicos_raw}
+    status_unicos_raw = valores.dropna().unique()
+    status_unicos_sanitizados = {corrigir_mojibake(str(s)) for s in status_unicos_raw}
     logging.info(f"Encontrados {len(status_unicos_sanitizados)} status únicos na entrada.")
     return status_unicos_sanitizados
 
-def analisar_arquivos_saida(config: ConfigParser, status_a_remover: set) -> dict:
+def _colunas_candidatas(amostra: pd.DataFrame) -> list:
+    """
+    Colunas que podem conter um status: as que têm texto na amostra ou que vieram vazias nela.
+    Colunas só com números, datas, telefones e valores na amostra não são lidas por inteiro.
+    """
+    candidatas = []
+    for coluna in amostra.columns:
+        valores = amostra[coluna].dropna()
+        if valores.empty or not valores.str.fullmatch(PADRAO_NAO_TEXTO).all():
+            candidatas.append(coluna)
+    return candidatas
+
+def _status_proibidos(df: pd.DataFrame, regra: Regra) -> set:
+    """
+    Normalização da regra de bloqueio (a mesma do pipeline) só sobre os valores únicos; nos
+    ASCII, que não têm o que reparar no encoding, ela se reduz a strip + lower vetorizados.
+    """
+    if df.empty or not len(df.columns):
+        return set()
+    unicos = pd.Series(pd.unique(np.concatenate([df[col].dropna().unique() for col in df.columns])), dtype=object)
+    if unicos.empty:
+        return set()
+    nao_ascii = ~unicos.map(str.isascii).astype(bool)
+    normalizados = unicos.str.strip().str.lower()
+    normalizados[nao_ascii] = unicos[nao_ascii].map(regra.normalizar)
+    return set(normalizados[normalizados.isin(regra.conjunto)])
+
+def _auditar_membro(zf: zipfile.ZipFile, membro: str, regra: Regra, todas_colunas: bool):
+    """Lê o CSV direto do ZIP (sem extrair), só com as colunas candidatas."""
+    sep = '|' if 'TOI_AD_FF_ENERGISA' in membro else ';'
+    opcoes = dict(sep=sep, dtype=str, encoding='utf-8-sig', on_bad_lines='warn')
+    usecols = None
+    if not todas_colunas:
+        with zf.open(membro) as f:
+            usecols = _colunas_candidatas(pd.read_csv(f, nrows=LINHAS_AMOSTRA, **opcoes))
+        if not usecols:
+            return "OK"
+    with zf.open(membro) as f:
+        df_saida = pd.read_csv(f, usecols=usecols, **opcoes)
+    status_encontrados = _status_proibidos(df_saida, regra)
+    return sorted(status_encontrados) if status_encontrados else "OK"
+
+def auditar_arquivo_zip(caminho_zip: Path, regra: Regra, todas_colunas: bool = False) -> dict:
+    """Audita todos os CSVs de um arquivo final. Pode rodar em outro processo (só usa argumentos serializáveis)."""
+    resultados = {}
+    try:
+        with zipfile.ZipFile(caminho_zip, 'r') as zf:
+            membros = [m for m in zf.namelist() if m.endswith('.csv')]
+            if not membros:
+                logging.warning(f"Nenhum arquivo CSV encontrado dentro de '{caminho_zip.name}'.")
+            for membro in membros:
+                nome = Path(membro).name
+                logging.info(f"  -> Verificando arquivo: {caminho_zip.name}/{nome}")
+                # 1
+                if nome == 'rejeitados_por_status_de_bloqueio.csv':
+                    logging.info(f"  -> Ignorando arquivo de relatório de rejeição: {nome}")
+                    continue
+                try:
+                    resultados[nome] = _auditar_membro(zf, membro, regra, todas_colunas)
+                except Exception as e:
+                    logging.error(f"    Falha ao ler ou processar o arquivo {nome}: {e}")
+                    resultados[nome] = f"ERRO NA LEITURA: {e}"
+    except zipfile.BadZipFile:
+        logging.error(f"O arquivo {caminho_zip.name} está corrompido ou não é um ZIP válido.")
+        return {"ERRO": f"Arquivo {caminho_zip.name} corrompido."}
+    return resultados
+
+def analisar_arquivos_saida(config: ConfigParser, regra: Regra, quantidade: int = 1,
+                            max_workers: int = 1, todas_colunas: bool = False) -> dict:
+    """Audita os 'quantidade' arquivos .zip mais recentes, em paralelo. Devolve {arquivo_zip: {csv: resultado}}."""
     logging.info("--- Fase 2: Analisando arquivos de SAÍDA ---")
     output_dir = Path(config.get('PATHS', 'output_dir'))
-    resultados = {}
 
     archive_pattern = f"{config.get('COMPRESSOR', 'archive_name_prefix', fallback='mailing_')}*.zip"
-    latest_zip = encontrar_arquivo_recente(output_dir, archive_pattern)
+    arquivos_zip = sorted(output_dir.glob(archive_pattern), key=lambda f: f.stat().st_mtime, reverse=True)[:max(1, quantidade)]
 
-    if not latest_zip:
+    if not arquivos_zip:
         logging.warning(f"Nenhum arquivo .zip de saída encontrado em '{output_dir}'. A análise de saída será pulada.")
-        return resultados
-
-    logging.info(f"Analisando conteúdo do arquivo: {latest_zip.name}")
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        try:
-            with zipfile.ZipFile(latest_zip, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-            logging.info(f"Arquivos extraídos para diretório temporário.")
-        except zipfile.BadZipFile:
-            logging.error(f"O arquivo {latest_zip.name} está corrompido ou não é um ZIP válido.")
-            return {"ERRO": f"Arquivo {latest_zip.name} corrompido."}
-
-        pasta_base = Path(temp_dir)
-        arquivos_csv = list(pasta_base.rglob("*.csv"))
-
-        if not arquivos_csv:
-            logging.warning("Nenhum arquivo CSV encontrado dentro do arquivo ZIP.")
-            return resultados
-
-        for file_path in arquivos_csv:
-            logging.info(f"  -> Verificando arquivo: {file_path.name}")
-            
-            # 1
-            if file_path.name == 'rejeitados_por_status_de_bloqueio.csv':
-                logging.info(f"  -> Ignorando arquivo de relatório de rejeição: {file_path.name}")
-                continue
-            
-            try:
-                sep = '|' if 'TOI_AD_FF_ENERGISA' in file_path.name else ';'
-                df_saida = pd.read_csv(file_path, sep=sep, dtype=str, encoding='utf-8-sig', on_bad_lines='warn')
-                
-                status_encontrados = set()
-                for col in df_saida.columns:
-                    valores_coluna = {_sanitize_encoding(str(v)).lower() for v in df_saida[col].dropna().unique()}
-                    encontrados_na_coluna = valores_coluna.intersection(status_a_remover)
-                    if encontrados_na_coluna:
-                        status_encontrados.update(encontrados_na_coluna)
-                
-                if status_encontrados:
-                    resultados[file_path.name] = sorted(list(status_encontrados))
-                else:
-                    resultados[file_path.name] = "OK"
-            except Exception as e:
-                logging.error(f"    Falha ao ler ou processar o arquivo {file_path.name}: {e}")
-                resultados[file_path.name] = f"ERRO NA LEITURA: {e}"
-    
-    return resultados
+        return {}
+
+    logging.info(f"Analisando conteúdo de: {', '.join(f.name for f in arquivos_zip)}")
+    if len(arquivos_zip) == 1 or max_workers <= 1:
+        return {f.name: auditar_arquivo_zip(f, regra, todas_colunas) for f in arquivos_zip}
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(arquivos_zip))) as executor:
+        resultados = executor.map(auditar_arquivo_zip, arquivos_zip, [regra] * len(arquivos_zip),
+                                  [todas_colunas] * len(arquivos_zip))
+        return {f.name: r for f, r in zip(arquivos_zip, resultados)}
 
-def gerar_relatorio_auditoria(config: ConfigParser, status_entrada: set, resultados_saida: dict):
+def gerar_relatorio_auditoria(regra: Regra | None, status_entrada: set, resultados_saida: dict):
     logging.info("--- Fase 3: Gerando Relatório de Auditoria ---")
-    status_a_remover_raw = config.get('SCHEMA_MAILING', 'status_de_bloqueio_para_remover', fallback='')
-    status_a_remover = {s.strip().lower() for s in status_a_remover_raw.split('\n') if s.strip()}
-    status_a_remover_sanitizados = {_sanitize_encoding(s) for s in status_a_remover}
 
     with open("RELATORIO_AUDITORIA_COMPLETA.md", 'w', encoding='utf-8') as f:
         f.write(f"# Relatório de Auditoria Completa de Status\n")
@@ -145,7 +190,7 @@ def gerar_relatorio_auditoria(config: ConfigParser, status_entrada: set, resulta
             f.write("| Nenhum status encontrado | - |\n")
         else:
             for status in sorted(list(status_entrada)):
-                marcador = "✅ **Sim**" if status.lower() in status_a_remover_sanitizados else "Não"
+                marcador = "✅ **Sim**" if regra is not None and regra.corresponde(status) else "Não"
                 f.write(f"| `{status}` | {marcador} |\n")
         f.write("\n---\n\n")
 
@@ -153,35 +198,50 @@ def gerar_relatorio_auditoria(config: ConfigParser, status_entrada: set, resulta
         f.write("Esta seção verifica se algum dos status marcados para remoção foi encontrado em qualquer coluna dos arquivos finais.\n\n")
         if not resultados_saida:
             f.write("**Nenhum arquivo de saída foi analisado.**\n")
-        else:
-            for arquivo, resultado in sorted(resultados_saida.items()):
+        for arquivo_zip, resultados_zip in resultados_saida.items():
+            f.write(f"### `{arquivo_zip}`\n\n")
+            for arquivo, resultado in sorted(resultados_zip.items()):
                 if resultado == "OK":
                     f.write(f"- **`{arquivo}`:** <span style='color:green;'>OK</span> - Nenhum status proibido encontrado.\n")
+                elif isinstance(resultado, str):
+                    f.write(f"- **`{arquivo}`:** <span style='color:red;'>ERRO</span> - {resultado}\n")
                 else:
                     f.write(f"- **`{arquivo}`:** <span style='color:red;'>ALERTA</span> - Status proibidos encontrados:\n")
                     f.write("  ```\n")
                     for status in resultado:
                         f.write(f"  - {status}\n")
                     f.write("  ```\n")
+            f.write("\n")
         f.write("\n---\n\n")
 
     logging.info("Relatório 'RELATORIO_AUDITORIA_COMPLETA.md' gerado com sucesso.")
 
-def main():
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Auditoria de status de bloqueio na entrada e nos arquivos de saída.")
+    parser.add_argument('--arquivos', type=int, default=1, help="Quantidade de arquivos .zip mais recentes auditados.")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help="Arquivos .zip auditados em paralelo.")
+    parser.add_argument('--todas-colunas', action='store_true',
+                        help="Lê todas as colunas dos CSVs, inclusive as que parecem só numéricas na amostra.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Função principal que orquestra todo o processo de auditoria."""
+    args = _parse_args(argv)
     config = carregar_config()
     if not config:
         return
 
     status_entrada = analisar_status_entrada(config)
     
-    status_a_remover_raw = config.get('SCHEMA_MAILING', 'status_de_bloqueio_para_remover', fallback='')
-    status_a_remover = {s.strip().lower() for s in status_a_remover_raw.split('\n') if s.strip()}
-    status_a_remover_sanitizados = {_sanitize_encoding(s) for s in status_a_remover}
-    
-    resultados_saida = analisar_arquivos_saida(config, status_a_remover_sanitizados)
+    # Mesma regra (e mesma normalização) que o pipeline aplica no filtro de bloqueio
+    regra = regra_status_bloqueio(config)
+    if regra is None:
+        logging.warning("Nenhum status de bloqueio para remover definido no config.ini. Saídas não auditadas.")
+        resultados_saida = {}
+    else:
+        resultados_saida = analisar_arquivos_saida(config, regra, args.arquivos, args.workers, args.todas_colunas)
     
-    gerar_relatorio_auditoria(config, status_entrada, resultados_saida)
+    gerar_relatorio_auditoria(regra, status_entrada, resultados_saida)
     
     logging.info("Auditoria concluída.")
 
@@ -1,87 +1,464 @@
 # -*- coding: utf-8 -*-
 import logging
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, date
 import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 from configparser import ConfigParser
 
 # Módulos do projeto
 from src.logger_setup import setup_logger, ExecutionReporter
-from src.config_manager import load_config
-from src.data_loader import load_all_data
-from src.processing_pipeline import processar_dados
+from src.config_manager import load_config, validate_config
+from src.escritor_csv import configurar_escritor_csv
+from src.data_loader import load_all_data, localizar_arquivos_entrada, localizar_mailings_periodo
+from src.processing_pipeline import processar_dados, gravar_rejeitados
 from src.data_exporter import exportar_dados_humanos
 from src.gerador_robo_mestre import gerar_arquivo_robo_mestre
 from src.formatador_dados import formatar_csvs_para_padrao_br
 from src.final_polisher import polimento_final
 from src.compressor import organize_and_compress_output
-from src.state_manager import StateManager
+from src.state_manager import StateManager, medir_pico_memoria_mb
+from src.manifesto import ManifestoSaida
+from src.checkpoints import GerenciadorCheckpoints, VERSAO_CHECKPOINT, motivo_checkpoints_indisponiveis, pyarrow_disponivel
+from src.hashing import hash_arquivos, hash_secoes_config
+from src.metricas_prometheus import exportar_metricas
+from src.perfilador import criar_perfilador, MODOS_SUPORTADOS
+from src.referencias_residentes import ReferenciasResidentes
+from src.motor_regras import mensagem_regra
+from src.armazem import armazem_habilitado, registrar_execucao
+from src.shards import interpretar_shard, filtrar_shard, gravar_shard, juntar_shards
 
 MSG_COBRANCA_ERRO = "FALHA NA AUTOMAÇÃO: Erro inesperado. Verifique o log para detalhes."
 
-def main():
+def _periodo(texto: str) -> tuple:
+    """'AAAA-MM-DD..AAAA-MM-DD' (ou um único dia) -> (início, fim)."""
+    partes = texto.split('..')
+    try:
+        if len(partes) > 2:
+            raise ValueError
+        inicio, fim = date.fromisoformat(partes[0].strip()), date.fromisoformat(partes[-1].strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"período inválido '{texto}' (use AAAA-MM-DD..AAAA-MM-DD)")
+    if fim < inicio:
+        raise argparse.ArgumentTypeError(f"período invertido '{texto}'")
+    return inicio, fim
+
+def _shard(texto: str) -> tuple:
+    """'k/N' -> (k, N)."""
+    try:
+        return interpretar_shard(texto)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _parse_args(argv: list | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Automação do mailing de cobrança TOI.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Retoma a partir dos checkpoints de estágio, mesmo com [CHECKPOINTS] reutilizar = false.")
+    parser.add_argument('--profile', choices=MODOS_SUPORTADOS,
+                        help="Perfila a execução (cprofile ou sampling) e grava os artefatos em [PATHS] archive_dir.")
+    parser.add_argument('--force', action='store_true',
+                        help="Reprocessa mesmo que as entradas e o config.ini sejam idênticos aos da última execução bem-sucedida.")
+    parser.add_argument('--backfill', type=_periodo, metavar='DE..ATE',
+                        help="Reprocessa, em paralelo, todos os mailings do período (ex.: 2025-06-01..2025-06-07); "
+                             "cada dia é arquivado com a sua própria data.")
+    parser.add_argument('--workers', type=int,
+                        help="Processos simultâneos do --backfill (sobrepõe [BACKFILL] max_workers).")
+    parser.add_argument('--shard', type=_shard, metavar='K/N',
+                        help="Processa só os CPFs do shard K de N e grava uma saída parcial em [SHARDS] pasta, sem arquivo final.")
+    parser.add_argument('--merge', nargs='*', type=Path, metavar='PASTA',
+                        help="Junta as saídas dos N shards (as pastas informadas ou todas de [SHARDS] pasta) e gera o arquivo final.")
+    args = parser.parse_args(argv)
+    if args.backfill and args.profile:
+        parser.error("--profile não é suportado junto com --backfill.")
+    if sum(bool(modo) for modo in (args.backfill, args.shard, args.merge is not None)) > 1:
+        parser.error("--backfill, --shard e --merge não podem ser combinados.")
+    if (args.shard or args.merge is not None) and not pyarrow_disponivel():
+        # As saídas parciais dos shards são gravadas em Arrow IPC
+        parser.error("--shard e --merge requerem o pacote 'pyarrow' (pip install -r requirements.txt).")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers deve ser pelo menos 1.")
+    return args
+
+def _entrada_historico(status: str, inicio: datetime, reporter: ExecutionReporter, metricas: dict,
+                       arquivos_entrada: dict, erro: str | None = None) -> dict:
+    """Monta o registro da execução para o histórico append-only."""
+    entrada = {
+        'inicio': inicio.isoformat(),
+        'status': status,
+        'duracao_total': round((datetime.now() - inicio).total_seconds(), 3),
+        'estagios': reporter.stages,
+        'linhas': metricas,
+        'pico_memoria_mb': round(medir_pico_memoria_mb() or 0, 1) or None,
+        'entradas': {f.name: f.stat().st_size for f in arquivos_entrada.values() if f.is_file()}
+    }
+    if erro:
+        entrada['erro'] = erro
+    return entrada
+
+def _assinatura_execucao(config: ConfigParser, arquivos_entrada: dict, hashes: dict, data_referencia: datetime) -> dict:
+    """
+    O que determina o arquivo final de uma execução: o conteúdo de cada arquivo de entrada, o
+    config.ini efetivo (todas as seções), o dia de referência e a versão do código dos estágios.
+    """
+    return {
+        'versao': VERSAO_CHECKPOINT,
+        'dia': data_referencia.strftime('%Y-%m-%d'),
+        'config': hash_secoes_config(config, config.sections()),
+        'entradas': {chave: f"{arquivo.name}:{hashes[arquivo]}" for chave, arquivo in sorted(arquivos_entrada.items())},
+    }
+
+def _concluir_sem_arquivo_final(state_manager: StateManager, reporter: ExecutionReporter, config: ConfigParser, inicio: datetime,
+                                metricas: dict, ultimas_metricas: dict, arquivos_entrada: dict, status: str):
+    """Encerra com sucesso uma execução que não gera um arquivo final novo (execução inalterada ou shard)."""
+    # Status próprio no histórico: essas execuções não entram na mediana de desempenho das completas
+    state_manager.append_history(_entrada_historico(status, inicio, reporter, metricas, arquivos_entrada))
+    _finalizar_perfil(reporter, config, inicio)
+    reporter.generate_final_report(metricas, ultimas_metricas)
+
+def _registrar_regras_carregamento(reporter: ExecutionReporter, relatorio_regras: list, total: int) -> int:
+    """Uma etapa no relatório por regra aplicada no carregamento. Devolve as linhas que restaram."""
+    for item in relatorio_regras:
+        reporter.add_step(f"Regra '{item['regra']}' (carregamento)", total, total - item['removidos'], mensagem_regra(item))
+        total -= item['removidos']
+    return total
+
+def _finalizar_perfil(reporter: ExecutionReporter, config: ConfigParser, inicio: datetime):
+    """Encerra o perfilador (se ativo) e leva o resumo dos pontos quentes para o relatório."""
+    if reporter.perfilador is None:
+        return
+    pasta = Path(config.get('PATHS', 'archive_dir', fallback='./data_archives')) / f"perfil_{inicio.strftime('%Y-%m-%d_%H-%M-%S')}"
+    reporter.profile_lines = reporter.perfilador.finalizar(pasta)
+    reporter.perfilador = None
+
+def main(argv: list | None = None):
+    args = _parse_args(argv)
     config = None
     run_log_file = None
     try:
         config = load_config('config.ini')
-        run_log_file = setup_logger(config.get('PATHS', 'log_dir'), config.get('SETTINGS', 'log_level'))
+        validate_config(config)
+        # Shards rodando na mesma máquina não podem dividir o arquivo de log
+        sufixo = f"_shard_{args.shard[0]}_de_{args.shard[1]}" if args.shard else ''
+        run_log_file = setup_logger(config.get('PATHS', 'log_dir'), config.get('SETTINGS', 'log_level'), config.get('SETTINGS', 'log_format', fallback='texto'), sufixo=sufixo)
     except (FileNotFoundError, ValueError) as e:
         print(f"ERRO CRÍTICO NA CONFIGURAÇÃO: {e}\nProcesso abortado.")
         sys.exit(1)
 
-    state_manager = StateManager(config.get('PATHS', 'state_file'))
+    if args.resume:
+        # Sem checkpoints, o --resume seria uma execução completa silenciosa
+        motivo = motivo_checkpoints_indisponiveis(config)
+        if motivo:
+            logging.critical(f"--resume solicitado, mas {motivo}. Processo abortado.")
+            sys.exit(1)
+
+    configurar_escritor_csv(config)
+    if args.backfill:
+        inicio, fim = args.backfill
+        max_workers = args.workers or config.getint('BACKFILL', 'max_workers', fallback=2)
+        sucesso = executar_backfill(config, inicio, fim, max_workers, resume=args.resume)
+    else:
+        sucesso = executar_pipeline(config, run_log_file, resume=args.resume, profile=args.profile, forcar=args.force,
+                                    shard=args.shard, shards_para_juntar=args.merge)
+    if not sucesso:
+        sys.exit(1)
+
+# --- BACKFILL ---
+
+# Estado de cada processo do backfill, montado uma única vez por _iniciar_processo_backfill
+_backfill = {}
+
+def _iniciar_processo_backfill(caminho_config: str, residentes: ReferenciasResidentes):
+    config = load_config(caminho_config)
+    configurar_escritor_csv(config)
+    _backfill.update(config=config, residentes=residentes)
+
+def _processar_dia_backfill(dia: date, arquivo_mailing: Path, resume: bool) -> dict:
+    """Executa o pipeline de um dia do backfill, com log próprio, num processo de trabalho."""
+    config = _backfill['config']
+    run_log_file = setup_logger(
+        config.get('PATHS', 'log_dir'), config.get('SETTINGS', 'log_level'), config.get('SETTINGS', 'log_format', fallback='texto'),
+        sufixo=f"_backfill_{dia.isoformat()}"
+    )
+    inicio = time.perf_counter()
+    # O horário de agora entra só no nome dos arquivos do robô; as pastas, a Data_de_Importacao e o arquivo final usam o dia.
+    # O backfill é um reprocessamento pedido explicitamente: nunca reaproveita o arquivo anterior.
+    sucesso = executar_pipeline(
+        config, run_log_file, resume=resume, residentes=_backfill['residentes'],
+        arquivo_mailing=arquivo_mailing, data_referencia=datetime.combine(dia, datetime.now().time()), forcar=True
+    )
+    return {'dia': dia, 'sucesso': sucesso, 'duracao_segundos': round(time.perf_counter() - inicio, 1), 'log': run_log_file}
+
+def executar_backfill(config: ConfigParser, inicio: date, fim: date, max_workers: int, resume: bool = False) -> bool:
+    """
+    Reprocessa todos os mailings de 'inicio' a 'fim' em até 'max_workers' processos simultâneos.
+    As bases de referência são lidas e indexadas uma única vez aqui e entregues prontas a cada
+    processo. Devolve True se todos os dias foram concluídos com sucesso.
+    """
+    mailings = localizar_mailings_periodo(config, inicio, fim)
+    if not mailings:
+        logging.error(f"Backfill: nenhum mailing encontrado entre {inicio:%d/%m/%Y} e {fim:%d/%m/%Y}.")
+        return False
+    max_workers = min(max_workers, len(mailings))
+    logging.info(f"Backfill de {len(mailings)} mailing(s) entre {inicio:%d/%m/%Y} e {fim:%d/%m/%Y}, com até {max_workers} processo(s) simultâneo(s).")
+
+    # 1. Bases de referência e índices montados uma vez, no processo principal
+    residentes = ReferenciasResidentes()
+    residentes.atualizar(config)
+
+    # 2. 'spawn' em vez de 'fork': o processo principal já tem a thread de log rodando. Cada
+    # processo recebe as bases prontas na sua criação, e não a cada dia processado.
+    resultados = []
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_iniciar_processo_backfill, initargs=('config.ini', residentes)) as executor:
+        futuros = {executor.submit(_processar_dia_backfill, dia, arquivo, resume): (dia, arquivo) for dia, arquivo in mailings}
+        for futuro in as_completed(futuros):
+            dia, arquivo = futuros[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                logging.error(f"Backfill de {dia:%d/%m/%Y} ('{arquivo.name}'): o processo de trabalho falhou: {e}")
+                resultado = {'dia': dia, 'sucesso': False}
+            else:
+                situacao = 'concluído' if resultado['sucesso'] else 'FALHOU'
+                logging.info(f"Backfill de {dia:%d/%m/%Y} ('{arquivo.name}') {situacao} em {resultado['duracao_segundos']}s. Log: {resultado['log']}")
+            resultados.append(resultado)
+
+    # 3. Resumo do período
+    falhas = sorted(r['dia'] for r in resultados if not r['sucesso'])
+    if falhas:
+        logging.error(f"Backfill concluído com {len(falhas)} falha(s): {', '.join(f'{d:%d/%m/%Y}' for d in falhas)}.")
+        print(MSG_COBRANCA_ERRO)
+    else:
+        logging.info(f"Backfill concluído: {len(resultados)} dia(s) processado(s) com sucesso.")
+    return not falhas
+
+def executar_pipeline(config: ConfigParser, run_log_file: str, resume: bool = False, profile: str | None = None,
+                      residentes: ReferenciasResidentes | None = None, arquivo_mailing: Path | None = None,
+                      data_referencia: datetime | None = None, forcar: bool = False,
+                      shard: tuple | None = None, shards_para_juntar: list | None = None) -> bool:
+    """
+    Uma execução completa do pipeline, com config e log já preparados. Devolve True em caso de
+    sucesso. O modo serviço (servico.py) chama esta função a cada pedido, passando as bases de
+    referência mantidas em memória em 'residentes'. O backfill informa também o mailing a
+    processar e o dia a que ele se refere (pastas, Data_de_Importacao e arquivo final).
+
+    Se as entradas e o config.ini forem idênticos aos da última execução bem-sucedida e o
+    arquivo final dela ainda existir, ele é reaproveitado sem reprocessar ('forcar' desativa).
+
+    Com 'shard' (k, N), só os CPFs do shard são processados e a saída parcial é gravada em
+    [SHARDS] pasta, sem exportação. Com 'shards_para_juntar' (lista de pastas; vazia para
+    todas), as saídas dos shards substituem os estágios 1 e 2 e a execução segue normalmente.
+    """
+    data_referencia = data_referencia or datetime.now()
+    state_manager = StateManager(
+        config.get('PATHS', 'state_file'),
+        config.get('HISTORICO', 'arquivo', fallback='./run_history.jsonl'),
+        config.getint('HISTORICO', 'retencao', fallback=200)
+    )
     reporter = ExecutionReporter()
+    inicio_execucao = datetime.now()
+    reporter.perfilador = criar_perfilador(profile, config)
+    if reporter.perfilador is not None:
+        reporter.perfilador.iniciar()
+    arquivos_entrada = localizar_arquivos_entrada(config)
+    if arquivo_mailing is not None:
+        arquivos_entrada['mailing_nucleo_pattern'] = arquivo_mailing
 
+    manifesto = None
+    current_metrics = {}
+    resumo_arquivo = None
+    sucesso = False
     try:
         logging.info("="*30 + " INÍCIO DO PROCESSO DE AUTOMAÇÃO (ARQUITETURA UNIFICADA) " + "="*30)
 
+        juncao = None
+        if shards_para_juntar is not None:
+            # As saídas parciais dos shards substituem os estágios 1 e 2; o dia vem delas
+            with reporter.medir_estagio('Junção dos Shards') as estagio:
+                juncao = juntar_shards(config, shards_para_juntar)
+                estagio['linhas'] = len(juncao['frames']['humano']) + len(juncao['frames']['robo'])
+            data_referencia = datetime.combine(juncao['dia'], data_referencia.time())
+
+        # Hashes das entradas (lidas em blocos, em paralelo), calculados uma vez: servem à
+        # detecção de execução inalterada e às chaves dos checkpoints
+        with reporter.medir_estagio('Verificação das Entradas'):
+            hashes_entrada = hash_arquivos(arquivos_entrada.values())
+            assinatura = _assinatura_execucao(config, arquivos_entrada, hashes_entrada, data_referencia)
+            # Shards e junções sempre processam e não servem de referência para a próxima execução
+            parcial = shard is not None or juncao is not None
+            arquivo_anterior = None if forcar or parcial else state_manager.reusable_archive(assinatura)
+        if arquivo_anterior:
+            logging.info(
+                f"Entradas e configuração idênticas às da última execução bem-sucedida: arquivo final "
+                f"'{arquivo_anterior['caminho']}' reaproveitado, sem reprocessar (use --force para reprocessar)."
+            )
+            current_metrics, resumo_arquivo = state_manager.get_last_metrics(), arquivo_anterior
+            reporter.add_attention_point("Execução Inalterada", f"Arquivo final '{arquivo_anterior['caminho'].name}' reaproveitado.")
+            state_manager.save_success(current_metrics, assinatura, arquivo_anterior)
+            sucesso = True
+            _concluir_sem_arquivo_final(state_manager, reporter, config, inicio_execucao, current_metrics, current_metrics,
+                                        arquivos_entrada, 'UNCHANGED')
+            return sucesso
+
         # Define a pasta de saída do dia no início para que possa ser usada pelo pipeline
         output_dir = Path(config.get('PATHS', 'output_dir', fallback='./data_output'))
         date_format = config.get('SETTINGS', 'output_date_format').replace('%%', '%')
-        pasta_do_dia = output_dir / datetime.now().strftime(date_format)
-        pasta_do_dia.mkdir(exist_ok=True, parents=True)
-
-        logging.info("--- ESTÁGIO 1: Carregando e Validando dados ---")
-        all_dataframes = load_all_data(config)
-        reporter.add_step("Carregamento de Dados", len(all_dataframes.get('mailing', pd.DataFrame())), len(all_dataframes.get('mailing', pd.DataFrame())), "Dados carregados.")
-        logging.info("--- ESTÁGIO 1 CONCLUÍDO ---")
-
-        logging.info("--- ESTÁGIO 2: Processando dados ---")
-        # 1. Passa o diretório 'pasta_do_dia' para a função de processamento
-        (df_humano, df_robo), process_report = processar_dados(all_dataframes, config, pasta_do_dia)
-        reporter.steps.extend(process_report)
-        logging.info("--- ESTÁGIO 2 CONCLUÍDO ---")
+        pasta_do_dia = output_dir / data_referencia.strftime(date_format)
+        if shard is None:
+            pasta_do_dia.mkdir(exist_ok=True, parents=True)
+
+        # Checkpoints por estágio: a chave de cada estágio é o hash das suas entradas
+        checkpoints = GerenciadorCheckpoints(config, forcar_reutilizacao=resume)
+        if resume:
+            logging.info(f"Retomando execução (último status registrado: {state_manager.state.get('status', 'desconhecido')}).")
+        chave_carregamento = checkpoints.chave_carregamento(arquivos_entrada, hashes_entrada)
+        chave_processamento = checkpoints.chave_processamento(chave_carregamento, data_referencia, shard)
+
+        restaurado = None
+        if juncao is None:
+            with reporter.medir_estagio('Restauração de Checkpoint'):
+                restaurado = checkpoints.carregar('processamento', chave_processamento, pasta_do_dia)
+        # Relatórios do processamento devolvidos em memória (só nos shards, que não gravam na pasta do dia)
+        relatorios = {}
+        if juncao is not None:
+            df_humano, df_robo = juncao['frames']['humano'], juncao['frames']['robo']
+            if 'rejeitados' in juncao['frames']:
+                gravar_rejeitados(juncao['frames']['rejeitados'], config, pasta_do_dia)
+            process_report = juncao['process_report']
+            total_inicial = juncao['registros_iniciais']
+            reporter.add_step("Carregamento de Dados", total_inicial, total_inicial, f"Dados juntados de {juncao['shards']} shards.")
+            _registrar_regras_carregamento(reporter, juncao['regras_carregamento'], total_inicial)
+            reporter.steps.extend(process_report)
+            logging.info("--- ESTÁGIOS 1 E 2 SUBSTITUÍDOS PELA JUNÇÃO DOS SHARDS ---")
+        elif restaurado:
+            frames, meta = restaurado
+            df_humano, df_robo = frames.get('humano', pd.DataFrame()), frames.get('robo', pd.DataFrame())
+            relatorios = frames.get('relatorios', {})
+            process_report = meta.get('process_report', [])
+            total_inicial = meta.get('registros_iniciais', 0)
+            relatorio_regras = meta.get('regras_carregamento', [])
+            reporter.add_step("Carregamento de Dados", total_inicial, total_inicial, "Dados restaurados do checkpoint.")
+            _registrar_regras_carregamento(reporter, relatorio_regras, total_inicial)
+            reporter.steps.extend(process_report)
+            logging.info("--- ESTÁGIOS 1 E 2 RESTAURADOS DO CHECKPOINT ---")
+        else:
+            logging.info("--- ESTÁGIO 1: Carregando e Validando dados ---")
+            with reporter.medir_estagio('Carregamento') as estagio:
+                restaurado = checkpoints.carregar('carregamento', chave_carregamento)
+                bases = referencias = None
+                if residentes is not None:
+                    # Modo serviço: bases de referência e seus índices vêm da memória (só o que mudou é relido)
+                    bases, referencias = residentes.atualizar(config)
+                if restaurado:
+                    all_dataframes, relatorio_regras = restaurado[0], restaurado[1].get('regras', [])
+                else:
+                    relatorio_regras = []
+                    all_dataframes = load_all_data(config, bases, relatorio_regras, arquivo_mailing)
+                    checkpoints.salvar('carregamento', chave_carregamento, all_dataframes, {'regras': relatorio_regras})
+                # Linhas lidas do mailing, antes das regras aplicadas no carregamento
+                total_inicial = estagio['linhas'] = len(all_dataframes.get('mailing', pd.DataFrame())) + sum(r['removidos'] for r in relatorio_regras)
+            reporter.add_step("Carregamento de Dados", total_inicial, total_inicial, "Dados carregados.")
+            total_filtrado = _registrar_regras_carregamento(reporter, relatorio_regras, total_inicial)
+            if shard is not None:
+                # O carregamento (e o seu checkpoint) é o da base completa; o shard fica só com os seus CPFs
+                mailing_shard = filtrar_shard(all_dataframes.get('mailing', pd.DataFrame()), config.get('SOURCE_COLUMNS', 'cpf').lower(), shard)
+                all_dataframes = {**all_dataframes, 'mailing': mailing_shard}
+                reporter.add_step(f"Shard {shard[0]}/{shard[1]}", total_filtrado, len(mailing_shard),
+                                  f"{len(mailing_shard)} registros pertencem ao shard {shard[0]} de {shard[1]}.")
+                total_filtrado = len(mailing_shard)
+            logging.info("--- ESTÁGIO 1 CONCLUÍDO ---")
+
+            logging.info("--- ESTÁGIO 2: Processando dados ---")
+            with reporter.medir_estagio('Processamento') as estagio:
+                estagio['linhas'] = total_filtrado
+                arquivos_antes = {f for f in pasta_do_dia.rglob('*') if f.is_file()}
+                # 1. Passa o diretório 'pasta_do_dia' para a função de processamento
+                (df_humano, df_robo), process_report = processar_dados(
+                    all_dataframes, config, pasta_do_dia, referencias=referencias, data_referencia=data_referencia,
+                    relatorios=relatorios if shard is not None else None
+                )
+                reporter.steps.extend(process_report)
+                # Arquivos gerados pelo estágio (ex.: relatório de rejeitados) são guardados junto do checkpoint
+                artefatos = sorted(f for f in pasta_do_dia.rglob('*') if f.is_file() and f not in arquivos_antes)
+                checkpoints.salvar(
+                    'processamento', chave_processamento, {'humano': df_humano, 'robo': df_robo, 'relatorios': relatorios},
+                    {'process_report': process_report, 'registros_iniciais': total_inicial, 'regras_carregamento': relatorio_regras},
+                    pasta_do_dia, artefatos
+                )
+            logging.info("--- ESTÁGIO 2 CONCLUÍDO ---")
         
         logging.info("--- SUMÁRIO PÓS-PROCESSAMENTO ---")
         logging.info(f"Registros para 'Acionamento Humano': {len(df_humano)}")
         logging.info(f"Registros para 'Acionamento Robô': {len(df_robo)}")
         logging.info("------------------------------------")
+        current_metrics = {'initial': total_inicial, 'human': len(df_humano), 'robot': len(df_robo)}
+        total_saida = len(df_humano) + len(df_robo)
+
+        if shard is not None:
+            with reporter.medir_estagio('Gravação do Shard') as estagio:
+                estagio['linhas'] = total_saida
+                gravar_shard(config, shard, {'humano': df_humano, 'robo': df_robo, **relatorios}, {
+                    'dia': data_referencia.strftime('%Y-%m-%d'), 'assinatura': assinatura, 'registros_iniciais': total_inicial,
+                    'regras_carregamento': relatorio_regras, 'process_report': process_report
+                })
+            logging.info(f"Shard {shard[0]}/{shard[1]} concluído. Use 'main.py --merge' depois que todos os {shard[1]} shards terminarem.")
+            # O estado (últimas métricas, assinatura) continua sendo o da última execução completa
+            sucesso = True
+            _concluir_sem_arquivo_final(state_manager, reporter, config, inicio_execucao, current_metrics,
+                                        state_manager.get_last_metrics(), arquivos_entrada, 'SHARD')
+            return sucesso
         
         if df_humano.empty and df_robo.empty:
             logging.warning("Todos os DataFrames de saída estão vazios. Nenhum arquivo será exportado.")
             reporter.add_attention_point("Exportação", "Nenhum dado gerado para exportação.")
         else:
             logging.info("--- ESTÁGIO 3: Exportando arquivos finais ---")
-            exportar_dados_humanos(df_humano, config, pasta_do_dia)
-            gerar_arquivo_robo_mestre(df_robo, config, pasta_do_dia)
+            with reporter.medir_estagio('Exportação') as estagio:
+                estagio['linhas'] = total_saida
+                manifesto = ManifestoSaida.carregar(config)
+                exportar_dados_humanos(df_humano, config, pasta_do_dia, manifesto, data_referencia)
+                gerar_arquivo_robo_mestre(df_robo, config, pasta_do_dia, manifesto, data_referencia)
+            if manifesto.reutilizados:
+                logging.info(f"{manifesto.reutilizados} partições inalteradas reaproveitadas da execução anterior.")
             logging.info("--- ESTÁGIO 3 CONCLUÍDO ---")
         
         logging.info("--- ESTÁGIO 4: Formatando e Polindo Saídas ---")
-        formatar_csvs_para_padrao_br(pasta_do_dia)
-        polimento_final(pasta_do_dia) 
+        with reporter.medir_estagio('Formatação e Polimento') as estagio:
+            estagio['linhas'] = total_saida
+            formatar_csvs_para_padrao_br(pasta_do_dia)
+            polimento_final(pasta_do_dia) 
         logging.info("--- ESTÁGIO 4 CONCLUÍDO ---")
 
         logging.info("--- ESTÁGIO 5: Organizando e Comprimindo a saída ---")
-        organize_and_compress_output(config, run_log_file)
+        with reporter.medir_estagio('Compressão') as estagio:
+            estagio['linhas'] = total_saida
+            resumo_arquivo = organize_and_compress_output(config, run_log_file, manifesto, data_referencia)
         logging.info("--- ESTÁGIO 5 CONCLUÍDO ---")
+
+        if resumo_arquivo and armazem_habilitado(config):
+            # As linhas do arquivo final (como foram entregues) entram no armazém histórico
+            with reporter.medir_estagio('Armazém Histórico') as estagio:
+                estagio['linhas'] = registrar_execucao(config, resumo_arquivo['caminho']) or 0
         
-        current_metrics = {'initial': len(all_dataframes.get('mailing', pd.DataFrame())), 'human': len(df_humano), 'robot': len(df_robo)}
-        state_manager.save_success(current_metrics)
+        # As métricas anteriores são lidas antes de o estado ser sobrescrito
+        last_metrics = state_manager.get_last_metrics()
+        historico = state_manager.load_history(config.getint('HISTORICO', 'janela_mediana', fallback=10), status='COMPLETED')
+        state_manager.save_success(current_metrics, None if parcial else assinatura, resumo_arquivo)
+        sucesso = True
+        state_manager.append_history(_entrada_historico('COMPLETED', inicio_execucao, reporter, current_metrics, arquivos_entrada))
         
         logging.info("="*30 + " PROCESSO DE AUTOMAÇÃO CONCLUÍDO COM SUCESSO " + "="*30)
+        _finalizar_perfil(reporter, config, inicio_execucao)
 
-        last_metrics = state_manager.get_last_metrics()
+        reporter.analisar_desempenho(
+            historico,
+            config.getfloat('HISTORICO', 'limite_desvio_percentual', fallback=50.0),
+            config.getfloat('HISTORICO', 'duracao_minima_segundos', fallback=1.0)
+        )
         reporter.generate_final_report(current_metrics, last_metrics)
         
         logging.info("\n\n\n\n\n")
@@ -89,10 +466,19 @@ def main():
     except Exception as e:
         logging.critical(f"ERRO CRÍTICO NO FLUXO PRINCIPAL: {e}", exc_info=True)
         state_manager.save_failure(str(e))
+        state_manager.append_history(_entrada_historico('FAILED', inicio_execucao, reporter, current_metrics, arquivos_entrada, str(e)))
         reporter.add_attention_point("FALHA CRÍTICA", str(e))
+        _finalizar_perfil(reporter, config, inicio_execucao)
         reporter.generate_final_report({}, {})
         print(MSG_COBRANCA_ERRO)
-        sys.exit(1)
+    finally:
+        # Textfile do Prometheus, gravado tanto no sucesso quanto na falha
+        exportar_metricas(
+            config, sucesso=sucesso, inicio=inicio_execucao, estagios=reporter.stages, etapas=reporter.steps,
+            volumetria=current_metrics, resumo_arquivo=resumo_arquivo, pico_memoria_mb=medir_pico_memoria_mb(),
+            ultimo_sucesso=state_manager.state.get('last_successful_run')
+        )
+    return sucesso
 
 if __name__ == '__main__':
     main()
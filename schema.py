@@ -1,26 +1,57 @@
 # -*- coding: utf-8 -*-
-import pandas as pd
+import os
+import sys
+import json
+import argparse
 from pathlib import Path
-from typing import List, Dict, Tuple
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional
+
+from src.cache_arquivos import CacheArquivos
+from src.leitor_xlsx import ler_cabecalho_xlsx
 
 # 1. Configuração do diretório de entrada
 # O script espera ser executado da pasta raiz do projeto.
 INPUT_DIR = Path("./data_input")
 FILE_PATTERN = "MAILING_NUCLEO_*.xlsx"
+# Cache persistente dos cabeçalhos, indexado pelo sha256 de cada arquivo
+CACHE_FILE = Path("./.schema_cache.json")
+VERSAO_CACHE = 2
 
 def get_excel_columns(file_path: Path) -> List[str]:
     """
     Lê apenas o cabeçalho de um arquivo Excel para extrair os nomes das colunas.
-    É uma forma otimizada de não carregar o arquivo inteiro na memória.
+    Só a primeira linha do XML da aba é interpretada; o restante do arquivo não é carregado.
     """
     try:
-        # nrows=0 lê apenas as colunas, sem nenhuma linha de dados.
-        df_header = pd.read_excel(file_path, nrows=0)
-        return [str(col).strip() for col in df_header.columns]
+        return [str(col).strip() for col in ler_cabecalho_xlsx(file_path)]
     except Exception as e:
-        print(f"  [ERRO] Não foi possível ler o arquivo {file_path.name}: {e}")
+        print(f"  [ERRO] Não foi possível ler o arquivo {file_path.name}: {e}", file=sys.stderr)
         return []
 
+def _schema_do_arquivo(file_path: Path, cache: CacheArquivos) -> Tuple[str, List[str], bool]:
+    """
+    (sha256, colunas, veio_do_cache). Arquivos com o mesmo tamanho e mtime do cache nem são
+    relidos; os demais são identificados pelo hash, e só um hash novo leva à leitura do cabeçalho.
+    """
+    sha256 = cache.hash(file_path)
+    resultado = cache.resultado(sha256)
+    if resultado is not None:
+        return sha256, resultado['colunas'], True
+    return sha256, get_excel_columns(file_path), False
+
+def extrair_schemas(files: List[Path], cache: CacheArquivos, max_workers: int = 4) -> Dict[str, dict]:
+    """Extrai (em paralelo) o schema de cada arquivo e atualiza o cache em memória."""
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='schema') as executor:
+        resultados = list(executor.map(lambda f: _schema_do_arquivo(f, cache), files))
+    schemas = {}
+    for file, (sha256, columns, do_cache) in zip(files, resultados):
+        if columns:
+            cache.registrar(file, sha256, {'colunas': columns})
+        schemas[file.name] = {'sha256': sha256, 'colunas': columns, 'cache': do_cache}
+    return schemas
+
 def compare_schemas(base_schema: List[str], new_schema: List[str]) -> Tuple[List[str], List[str], bool]:
     """
     Compara duas listas de colunas (schemas) e retorna as diferenças.
@@ -41,20 +72,53 @@ def compare_schemas(base_schema: List[str], new_schema: List[str]) -> Tuple[List
     
     return added_columns, removed_columns, order_is_different
 
-def main():
+def relatorio_json(schemas: Dict[str, dict]) -> dict:
+    """Relatório de drift legível por máquina: cada arquivo comparado ao primeiro (base)."""
+    validos = {nome: s for nome, s in schemas.items() if s['colunas']}
+    base_nome = next(iter(validos), None)
+    arquivos = []
+    for nome, schema in schemas.items():
+        entrada = {'arquivo': nome, 'sha256': schema['sha256'], 'colunas': schema['colunas'], 'cache': schema['cache']}
+        if not schema['colunas']:
+            entrada['erro'] = 'Cabeçalho não pôde ser lido.'
+        elif nome != base_nome:
+            added, removed, order_changed = compare_schemas(validos[base_nome]['colunas'], schema['colunas'])
+            entrada.update({
+                'adicionadas': added, 'removidas': removed, 'ordem_alterada': order_changed,
+                'identico': not added and not removed and not order_changed
+            })
+        arquivos.append(entrada)
+    return {'gerado_em': datetime.now().isoformat(timespec='seconds'), 'base': base_nome, 'arquivos': arquivos}
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Analisador de drift de schema dos arquivos de mailing.")
+    parser.add_argument('--input-dir', type=Path, default=INPUT_DIR, help="Pasta com os arquivos de mailing.")
+    parser.add_argument('--padrao', default=FILE_PATTERN, help="Padrão (glob) dos arquivos analisados.")
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1), help="Arquivos lidos em paralelo.")
+    parser.add_argument('--cache', type=Path, default=CACHE_FILE, help="Arquivo do cache de cabeçalhos.")
+    parser.add_argument('--sem-cache', action='store_true', help="Ignora e não atualiza o cache.")
+    parser.add_argument('--json', nargs='?', const='-', metavar='ARQUIVO',
+                        help="Emite o relatório em JSON (no stdout, ou no arquivo informado) em vez do texto.")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
     """
     Função principal que orquestra a busca, leitura e comparação dos schemas.
     """
+    args = _parse_args(argv)
+    if args.json:
+        return main_json(args)
+
     print("="*80)
     print("  Analisador de Schema dos Arquivos de Mailing (v3 - Lógica Corrigida)")
     print("="*80)
     
-    if not INPUT_DIR.exists():
-        print(f"[FALHA] O diretório de entrada '{INPUT_DIR}' não foi encontrado.")
+    if not args.input_dir.exists():
+        print(f"[FALHA] O diretório de entrada '{args.input_dir}' não foi encontrado.")
         return
 
     # Encontra e ordena os arquivos para garantir a comparação cronológica
-    files = sorted(INPUT_DIR.glob(FILE_PATTERN))
+    files = sorted(args.input_dir.glob(args.padrao))
     
     if len(files) < 2:
         print("[INFO] Menos de dois arquivos de mailing encontrados. Não há nada para comparar.")
@@ -66,14 +130,17 @@ def main():
                 print(f"  - {col}")
         return
 
-    # Extrai o schema de todos os arquivos
+    # Extrai o schema de todos os arquivos (em paralelo; arquivos já vistos vêm do cache)
+    cache = CacheArquivos(None if args.sem_cache else args.cache, VERSAO_CACHE)
+    extraidos = extrair_schemas(files, cache, args.workers)
     schemas: Dict[str, List[str]] = {}
-    for file in files:
-        print(f"\nLendo schema de: {file.name}...")
-        columns = get_excel_columns(file)
-        if columns:
-            schemas[file.name] = columns
-            print(f"  - {len(columns)} colunas encontradas.")
+    for file_name, schema in extraidos.items():
+        print(f"\nLendo schema de: {file_name}...")
+        if schema['colunas']:
+            schemas[file_name] = schema['colunas']
+            origem = " (cache)" if schema['cache'] else ""
+            print(f"  - {len(schema['colunas'])} colunas encontradas{origem}.")
+    cache.salvar()
 
     if not schemas:
         print("\n[FALHA] Nenhum schema pôde ser lido. Verifique os arquivos.")
@@ -125,7 +192,21 @@ def main():
     print("  Análise Concluída.")
     print("="*80)
 
+def main_json(args: argparse.Namespace) -> int:
+    """Versão para automação do main: só JSON na saída, código de retorno 1 se houver drift ou erro."""
+    files = sorted(args.input_dir.glob(args.padrao)) if args.input_dir.exists() else []
+    cache = CacheArquivos(None if args.sem_cache else args.cache, VERSAO_CACHE)
+    relatorio = relatorio_json(extrair_schemas(files, cache, args.workers))
+    cache.salvar()
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.json == '-':
+        print(texto)
+    else:
+        Path(args.json).write_text(texto, encoding='utf-8')
+    houve_drift = any(not a.get('identico', True) or 'erro' in a for a in relatorio['arquivos'])
+    return 1 if houve_drift else 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
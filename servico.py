@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Modo serviço: um processo de longa duração que mantém em memória o interpretador, o pandas,
+o config.ini já validado e as bases de referência (Pontuação e Tabulações, com seus índices),
+e executa o pipeline a cada pedido. O custo de cada pedido passa a ser só o do novo mailing.
+
+Pedidos chegam por um socket Unix local ([SERVICO] socket) ou por arquivos deixados na pasta
+de gatilhos ([SERVICO] pasta_gatilhos). Um pedido é uma linha JSON, opcional, com 'resume',
+'profile' e 'force' (as mesmas opções do main.py); a resposta pelo socket é outra linha JSON.
+
+    python servico.py iniciar
+    python servico.py enviar [--resume] [--profile cprofile] [--force]
+"""
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+from pathlib import Path
+from configparser import ConfigParser
+
+from src.perfilador import MODOS_SUPORTADOS
+
+logger = logging.getLogger(__name__)
+
+SECAO = 'SERVICO'
+SOCKET_PADRAO = './servico.sock'
+PASTA_GATILHOS_PADRAO = './data_gatilhos'
+INTERVALO_PADRAO = 1.0
+# Só arquivos com este sufixo na pasta de gatilhos viram pedidos (evita ler arquivos ainda sendo escritos)
+SUFIXO_GATILHO = '.gatilho'
+
+def _config_servico(caminho: str = 'config.ini') -> ConfigParser:
+    config = ConfigParser()
+    config.read(caminho, encoding='utf-8')
+    return config
+
+def _ler_pedido(texto: str) -> dict:
+    """Pedido vazio usa as opções padrão; campos desconhecidos são ignorados."""
+    pedido = json.loads(texto) if texto.strip() else {}
+    if not isinstance(pedido, dict):
+        raise ValueError("O pedido deve ser um objeto JSON.")
+    return {'resume': bool(pedido.get('resume', False)), 'profile': pedido.get('profile'), 'force': bool(pedido.get('force', False))}
+
+class ServicoPipeline:
+    """Estado residente entre pedidos: config (relido só quando o arquivo muda) e bases de referência."""
+
+    def __init__(self, caminho_config: str = 'config.ini'):
+        # O pipeline (e o pandas) só é importado por quem de fato processa pedidos
+        import main as pipeline
+        from src.referencias_residentes import ReferenciasResidentes
+        self.pipeline = pipeline
+        self.caminho_config = Path(caminho_config)
+        self.residentes = ReferenciasResidentes()
+        self.config = None
+        self._hash_config = None
+
+    def _config_atual(self) -> ConfigParser:
+        from src.hashing import hash_arquivo
+        from src.escritor_csv import configurar_escritor_csv
+        hash_config = hash_arquivo(self.caminho_config) if self.caminho_config.is_file() else None
+        if self.config is None or hash_config != self._hash_config:
+            config = self.pipeline.load_config(str(self.caminho_config))
+            self.pipeline.validate_config(config)
+            configurar_escritor_csv(config)
+            if self.config is not None:
+                logger.info(f"'{self.caminho_config}' alterado: configuração recarregada.")
+            self.config, self._hash_config = config, hash_config
+        return self.config
+
+    def processar(self, pedido: dict) -> dict:
+        inicio = time.perf_counter()
+        try:
+            config = self._config_atual()
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(f"Configuração inválida, pedido recusado: {e}")
+            return {'sucesso': False, 'erro': str(e)}
+        run_log_file = self.pipeline.setup_logger(
+            config.get('PATHS', 'log_dir'), config.get('SETTINGS', 'log_level'), config.get('SETTINGS', 'log_format', fallback='texto')
+        )
+        sucesso = self.pipeline.executar_pipeline(
+            config, run_log_file, resume=pedido['resume'], profile=pedido['profile'], residentes=self.residentes,
+            forcar=pedido['force']
+        )
+        return {'sucesso': sucesso, 'duracao_segundos': round(time.perf_counter() - inicio, 3), 'log': run_log_file}
+
+def _atender_conexao(servico: ServicoPipeline, conexao: socket.socket):
+    with conexao, conexao.makefile('rwb') as canal:
+        try:
+            resposta = servico.processar(_ler_pedido(canal.readline().decode('utf-8')))
+        except ValueError as e:
+            resposta = {'sucesso': False, 'erro': f"Pedido inválido: {e}"}
+        canal.write((json.dumps(resposta, ensure_ascii=False) + '\n').encode('utf-8'))
+        canal.flush()
+
+def _atender_gatilhos(servico: ServicoPipeline, pasta: Path):
+    """Cada arquivo '*.gatilho' da pasta é um pedido; é removido antes do processamento."""
+    for gatilho in sorted(pasta.glob(f'*{SUFIXO_GATILHO}')):
+        try:
+            texto = gatilho.read_text(encoding='utf-8')
+            gatilho.unlink()
+            pedido = _ler_pedido(texto)
+        except (OSError, ValueError) as e:
+            logger.error(f"Gatilho '{gatilho.name}' ignorado: {e}")
+            continue
+        logger.info(f"Gatilho '{gatilho.name}' recebido.")
+        resposta = servico.processar(pedido)
+        logger.info(f"Gatilho '{gatilho.name}' concluído: {json.dumps(resposta, ensure_ascii=False)}")
+
+def _abrir_socket(caminho: Path, intervalo: float) -> socket.socket:
+    if caminho.exists():
+        # Socket de uma instância anterior: só é removido se ninguém mais estiver escutando nele
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as teste:
+                teste.connect(str(caminho))
+            raise RuntimeError(f"Já existe um serviço escutando em '{caminho}'.")
+        except ConnectionRefusedError:
+            caminho.unlink()
+    servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    servidor.bind(str(caminho))
+    servidor.listen()
+    servidor.settimeout(intervalo)
+    return servidor
+
+def iniciar(args: argparse.Namespace) -> int:
+    config = _config_servico(args.config)
+    caminho_socket = args.socket or config.get(SECAO, 'socket', fallback=SOCKET_PADRAO)
+    pasta_gatilhos = args.gatilhos or config.get(SECAO, 'pasta_gatilhos', fallback=PASTA_GATILHOS_PADRAO)
+    intervalo = config.getfloat(SECAO, 'intervalo_segundos', fallback=INTERVALO_PADRAO)
+
+    servico = ServicoPipeline(args.config)
+    try:
+        config = servico._config_atual()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERRO CRÍTICO NA CONFIGURAÇÃO: {e}\nServiço não iniciado.")
+        return 1
+    servico.pipeline.setup_logger(config.get('PATHS', 'log_dir'), config.get('SETTINGS', 'log_level'), config.get('SETTINGS', 'log_format', fallback='texto'))
+
+    servidor = None
+    if caminho_socket and hasattr(socket, 'AF_UNIX'):
+        servidor = _abrir_socket(Path(caminho_socket), intervalo)
+    elif caminho_socket:
+        logger.warning("Socket Unix indisponível nesta plataforma: apenas a pasta de gatilhos será atendida.")
+    pasta = Path(pasta_gatilhos) if pasta_gatilhos else None
+    if pasta:
+        pasta.mkdir(parents=True, exist_ok=True)
+    if servidor is None and pasta is None:
+        print("[FALHA] Nenhum canal de pedidos configurado ([SERVICO] socket ou pasta_gatilhos).")
+        return 1
+    logger.info(f"Serviço do pipeline no ar (socket: {caminho_socket if servidor else '-'}, gatilhos: {pasta or '-'}).")
+
+    try:
+        while True:
+            if servidor is not None:
+                try:
+                    conexao, _ = servidor.accept()
+                    _atender_conexao(servico, conexao)
+                except socket.timeout:
+                    pass
+            else:
+                time.sleep(intervalo)
+            if pasta is not None:
+                _atender_gatilhos(servico, pasta)
+    except KeyboardInterrupt:
+        logger.info("Serviço do pipeline encerrado.")
+    finally:
+        if servidor is not None:
+            servidor.close()
+            Path(caminho_socket).unlink(missing_ok=True)
+    return 0
+
+def enviar(args: argparse.Namespace) -> int:
+    """Cliente: envia um pedido pelo socket e espera a resposta (não importa o pipeline)."""
+    caminho_socket = args.socket or _config_servico(args.config).get(SECAO, 'socket', fallback=SOCKET_PADRAO)
+    pedido = {'resume': args.resume, 'profile': args.profile, 'force': args.force}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as cliente:
+            cliente.connect(caminho_socket)
+            cliente.sendall((json.dumps(pedido) + '\n').encode('utf-8'))
+            with cliente.makefile('rb') as canal:
+                resposta = json.loads(canal.readline().decode('utf-8') or '{}')
+    except (OSError, ValueError) as e:
+        print(f"[FALHA] Não foi possível falar com o serviço em '{caminho_socket}': {e}")
+        return 1
+    print(json.dumps(resposta, ensure_ascii=False, indent=2))
+    return 0 if resposta.get('sucesso') else 1
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Modo serviço do pipeline, com as bases de referência em memória.")
+    parser.add_argument('--config', default='config.ini', help="Arquivo de configuração.")
+    parser.add_argument('--socket', help="Caminho do socket Unix (sobrepõe [SERVICO] socket).")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    parser_iniciar = subparsers.add_parser('iniciar', help="Sobe o serviço e atende pedidos até ser interrompido (Ctrl+C).")
+    parser_iniciar.add_argument('--gatilhos', help="Pasta de gatilhos (sobrepõe [SERVICO] pasta_gatilhos).")
+    parser_enviar = subparsers.add_parser('enviar', help="Pede uma execução ao serviço e mostra o resultado.")
+    parser_enviar.add_argument('--resume', action='store_true', help="Mesmo efeito do --resume do main.py.")
+    parser_enviar.add_argument('--profile', choices=MODOS_SUPORTADOS, help="Mesmo efeito do --profile do main.py.")
+    parser_enviar.add_argument('--force', action='store_true', help="Mesmo efeito do --force do main.py.")
+    args = parser.parse_args(argv)
+    return iniciar(args) if args.comando == 'iniciar' else enviar(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
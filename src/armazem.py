@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Armazém histórico local das saídas: um banco SQLite ([ARMAZEM] arquivo) com uma linha por
+registro exportado (humano e robô) ou rejeitado por status de bloqueio, de todos os dias,
+indexado por CPF e por data de execução. Perguntas como "quando este CPF foi para o robô pela
+última vez?" ou "quantos registros por produto por dia neste mês?" viram uma consulta, sem
+abrir os arquivos finais.
+
+Cada execução registra o próprio arquivo final ao terminar; o armazem.py importa os arquivos
+finais já existentes e faz as consultas. Reprocessar um dia substitui as linhas daquele dia.
+"""
+import re
+import sqlite3
+import logging
+from pathlib import Path
+from datetime import datetime
+from contextlib import closing
+from configparser import ConfigParser
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SECAO = 'ARMAZEM'
+ARQUIVO_PADRAO = './data_armazem/historico.sqlite'
+NOME_REJEITADOS = 'rejeitados_por_status_de_bloqueio.csv'
+# Espera pela trava do banco quando várias execuções (backfill) registram ao mesmo tempo
+TIMEOUT_TRAVA_SEGUNDOS = 60
+TIPOS = ('humano', 'robo', 'rejeitado')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    data_execucao TEXT PRIMARY KEY,
+    arquivo TEXT NOT NULL,
+    tamanho INTEGER NOT NULL,
+    registros INTEGER NOT NULL,
+    registrado_em TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS registros (
+    data_execucao TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    produto TEXT,
+    cpf INTEGER,
+    valor_divida REAL,
+    motivo TEXT,
+    arquivo TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_registros_cpf ON registros (cpf, data_execucao);
+CREATE INDEX IF NOT EXISTS idx_registros_data ON registros (data_execucao, tipo, produto);
+"""
+
+def armazem_habilitado(config: ConfigParser) -> bool:
+    return config.getboolean(SECAO, 'habilitado', fallback=False)
+
+def caminho_armazem(config: ConfigParser) -> Path:
+    return Path(config.get(SECAO, 'arquivo', fallback=ARQUIVO_PADRAO))
+
+def conectar(caminho: Path, somente_leitura: bool = False) -> sqlite3.Connection:
+    """Abre o banco (criando o esquema, na escrita). A leitura nunca cria nem altera o arquivo."""
+    if somente_leitura:
+        return sqlite3.connect(f"file:{caminho}?mode=ro", uri=True, timeout=TIMEOUT_TRAVA_SEGUNDOS)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=TIMEOUT_TRAVA_SEGUNDOS)
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+def data_do_arquivo_final(caminho: Path) -> Optional[str]:
+    """
+    Dia ('AAAA-MM-DD') no nome de um arquivo final, que é gravado com '%d-%m-%Y'.
+
+    >>> data_do_arquivo_final(Path('Mailing_Energisa_TOI_03-06-2025.tar.zst')), data_do_arquivo_final(Path('outro.zip'))
+    ('2025-06-03', None)
+    """
+    encontrado = re.search(r'(\d{2})-(\d{2})-(\d{4})', caminho.name)
+    if not encontrado:
+        return None
+    dia, mes, ano = (int(g) for g in encontrado.groups())
+    try:
+        return datetime(ano, mes, dia).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+def _tipo_membro(nome: str, prefixo_humano: str, prefixo_robo: str) -> Optional[str]:
+    # O prefixo do robô é testado primeiro: o padrão dele pode começar com o prefixo humano
+    nome = Path(nome).name
+    if nome == NOME_REJEITADOS:
+        return 'rejeitado'
+    if nome.startswith(prefixo_robo):
+        return 'robo'
+    if nome.startswith(prefixo_humano):
+        return 'humano'
+    return None
+
+def _linhas_membro(data_execucao: str, nome: str, dados: bytes, tipo: str) -> List[tuple]:
+    """Linhas de um CSV do arquivo final no formato da tabela 'registros'."""
+    import io
+    import pandas as pd
+    from src.identificadores import para_chave
+
+    coluna_cpf = 'ncpf' if tipo == 'rejeitado' else 'CPF'
+    usadas = {coluna_cpf, 'PRODUTO', 'valorDivida', 'motivo_remocao'}
+    df = pd.read_csv(io.BytesIO(dados), sep='|' if tipo == 'robo' else ';', dtype=str, encoding='utf-8-sig',
+                     keep_default_na=False, usecols=lambda coluna: coluna in usadas)
+
+    def _coluna(valores):
+        return valores.astype(object).where(valores.notna(), None).tolist()
+
+    vazia = [None] * len(df)
+    cpfs = _coluna(para_chave(df[coluna_cpf])) if coluna_cpf in df.columns else vazia
+    produtos = _coluna(df['PRODUTO'].replace('', None)) if 'PRODUTO' in df.columns else vazia
+    valores = _coluna(pd.to_numeric(df['valorDivida'].str.replace(',', '.', regex=False), errors='coerce')) if 'valorDivida' in df.columns else vazia
+    motivos = _coluna(df['motivo_remocao'].replace('', None)) if 'motivo_remocao' in df.columns else vazia
+    membro = Path(nome).name
+    return [(data_execucao, tipo, produto, cpf, valor, motivo, membro)
+            for produto, cpf, valor, motivo in zip(produtos, cpfs, valores, motivos)]
+
+def ja_registrado(conexao: sqlite3.Connection, caminho_arquivo: Path) -> bool:
+    """O mesmo arquivo final (nome e tamanho) já está no armazém."""
+    linha = conexao.execute(
+        "SELECT 1 FROM execucoes WHERE data_execucao = ? AND arquivo = ? AND tamanho = ?",
+        (data_do_arquivo_final(caminho_arquivo), caminho_arquivo.name, caminho_arquivo.stat().st_size)
+    ).fetchone()
+    return linha is not None
+
+def registrar_arquivo_final(conexao: sqlite3.Connection, config: ConfigParser, caminho_arquivo: Path) -> int:
+    """
+    Grava (numa única transação) as linhas humanas, do robô e rejeitadas de um arquivo final,
+    substituindo as do mesmo dia. Devolve o número de registros gravados.
+    """
+    from src.compressor import iterar_membros_arquivo
+
+    data_execucao = data_do_arquivo_final(caminho_arquivo)
+    if data_execucao is None:
+        raise ValueError(f"Data não reconhecida no nome do arquivo final '{caminho_arquivo.name}'.")
+    prefixo_humano = config.get('SETTINGS', 'output_file_prefix', fallback='Telecobranca_TOI_')
+    prefixo_robo = config.get('ROBO', 'output_file_prefix', fallback='Telecobranca_TOI_Robo_')
+
+    total = 0
+    with conexao:
+        conexao.execute("DELETE FROM registros WHERE data_execucao = ?", (data_execucao,))
+        for nome, dados in iterar_membros_arquivo(caminho_arquivo, '.csv'):
+            tipo = _tipo_membro(nome, prefixo_humano, prefixo_robo)
+            if tipo is None:
+                continue
+            linhas = _linhas_membro(data_execucao, nome, dados, tipo)
+            conexao.executemany("INSERT INTO registros VALUES (?, ?, ?, ?, ?, ?, ?)", linhas)
+            total += len(linhas)
+        conexao.execute(
+            "INSERT OR REPLACE INTO execucoes VALUES (?, ?, ?, ?, ?)",
+            (data_execucao, caminho_arquivo.name, caminho_arquivo.stat().st_size, total, datetime.now().isoformat(timespec='seconds'))
+        )
+    return total
+
+def registrar_execucao(config: ConfigParser, caminho_arquivo: Path) -> Optional[int]:
+    """Registro feito pelo pipeline ao fim de cada execução. Falhas aqui nunca interrompem o pipeline."""
+    destino = caminho_armazem(config)
+    try:
+        with closing(conectar(destino)) as conexao:
+            total = registrar_arquivo_final(conexao, config, caminho_arquivo)
+        logger.info(f"Armazém histórico: {total} registros de '{caminho_arquivo.name}' gravados em '{destino}'.")
+        return total
+    except Exception as e:
+        logger.error(f"Não foi possível registrar '{caminho_arquivo.name}' no armazém histórico '{destino}': {e}")
+        return None
+
+# --- CONSULTAS ---
+
+def historico_cpf(conexao: sqlite3.Connection, cpf: int, tipo: Optional[str] = None) -> Tuple[List[str], List[tuple]]:
+    """Todas as aparições de um CPF, da mais recente para a mais antiga."""
+    filtro, parametros = ("AND tipo = ?", (cpf, tipo)) if tipo else ("", (cpf,))
+    cursor = conexao.execute(
+        f"SELECT data_execucao, tipo, produto, valor_divida, motivo, arquivo FROM registros "
+        f"WHERE cpf = ? {filtro} ORDER BY data_execucao DESC, tipo", parametros
+    )
+    return [c[0] for c in cursor.description], cursor.fetchall()
+
+def contagens_por_dia(conexao: sqlite3.Connection, de: str, ate: str, tipo: Optional[str] = None) -> Tuple[List[str], List[tuple]]:
+    """Registros, CPFs distintos e dívida total por dia, tipo e produto no período (datas 'AAAA-MM-DD')."""
+    filtro, parametros = ("AND tipo = ?", (de, ate, tipo)) if tipo else ("", (de, ate))
+    cursor = conexao.execute(
+        f"SELECT data_execucao, tipo, produto, COUNT(*) AS registros, COUNT(DISTINCT cpf) AS cpfs, "
+        f"ROUND(SUM(valor_divida), 2) AS valor_divida FROM registros "
+        f"WHERE data_execucao BETWEEN ? AND ? {filtro} GROUP BY data_execucao, tipo, produto "
+        f"ORDER BY data_execucao, tipo, produto", parametros
+    )
+    return [c[0] for c in cursor.description], cursor.fetchall()
+
+def iterar_arquivos_finais(pasta: Path, prefixo: str) -> Iterator[Path]:
+    """Arquivos finais (qualquer codec) de uma pasta, em ordem de data."""
+    from src.compressor import CODECS_SUPORTADOS
+    extensoes = tuple(set(CODECS_SUPORTADOS.values()))
+    arquivos = [f for f in pasta.glob(f"{prefixo}*") if f.is_file() and f.name.endswith(extensoes) and data_do_arquivo_final(f)]
+    yield from sorted(arquivos, key=lambda f: (data_do_arquivo_final(f), f.stat().st_mtime))
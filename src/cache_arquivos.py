@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Cache persistente (JSON) de resultados calculados a partir de arquivos, indexado pelo sha256 do
+conteúdo. Arquivos com o mesmo tamanho e mtime já vistos nem são relidos para o hash; um arquivo
+renomeado ou copiado reaproveita o resultado pelo hash.
+"""
+import os
+import json
+from pathlib import Path
+from typing import Optional
+from src.hashing import hash_arquivo
+
+class CacheArquivos:
+    """
+    {'versao', 'arquivos': {nome: {tamanho, mtime_ns, sha256}}, 'resultados': {sha256: {...}}}.
+    Sem caminho, funciona só em memória (nada é lido nem gravado).
+    """
+    def __init__(self, caminho: Optional[Path], versao: int = 1):
+        self.caminho = caminho
+        self.versao = versao
+        self.dados = {'versao': versao, 'arquivos': {}, 'resultados': {}}
+        try:
+            if caminho:
+                dados = json.loads(caminho.read_text(encoding='utf-8'))
+                if dados.get('versao') == versao:
+                    self.dados = dados
+        except (OSError, ValueError):
+            pass
+
+    def hash(self, arquivo: Path) -> str:
+        """sha256 do arquivo, sem relê-lo quando tamanho e mtime batem com o registro anterior."""
+        stat = arquivo.stat()
+        registro = self.dados['arquivos'].get(arquivo.name)
+        if registro and registro['tamanho'] == stat.st_size and registro['mtime_ns'] == stat.st_mtime_ns:
+            return registro['sha256']
+        return hash_arquivo(arquivo)
+
+    def registrar(self, arquivo: Path, sha256: str, resultado: dict):
+        stat = arquivo.stat()
+        self.dados['arquivos'][arquivo.name] = {'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        self.dados['resultados'][sha256] = resultado
+
+    def resultado(self, sha256: str) -> Optional[dict]:
+        return self.dados['resultados'].get(sha256)
+
+    def salvar(self):
+        """Grava o cache de forma atômica."""
+        if not self.caminho:
+            return
+        temporario = self.caminho.with_name(self.caminho.name + '.tmp')
+        temporario.write_text(json.dumps(self.dados, ensure_ascii=False, indent=1), encoding='utf-8')
+        os.replace(temporario, self.caminho)
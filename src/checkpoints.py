@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints endereçados por conteúdo: a saída de cada estágio é gravada em Arrow IPC numa pasta
+cujo nome é o hash das entradas do estágio (arquivos + seções do config.ini que ele lê). Uma nova
+execução, ou um --resume após falha, recomeça a partir do primeiro estágio cuja chave mudou.
+"""
+import os
+import json
+import importlib.util
+import shutil
+import logging
+from pathlib import Path
+from datetime import datetime
+from configparser import ConfigParser
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from src.hashing import hash_arquivos, hash_secoes_config, combinar_hashes
+from src.data_loader import localizar_arquivos_entrada
+from src.motor_regras import secoes_de_regras
+
+logger = logging.getLogger(__name__)
+
+# Incrementar sempre que uma mudança de código alterar a saída de algum estágio
+VERSAO_CHECKPOINT = 7
+NOME_META = 'meta.json'
+
+# Seções do config.ini lidas por cada estágio (além das seções [REGRA:<nome>], lidas por ambos)
+SECOES_CARREGAMENTO = ['FILENAMES', 'SCHEMA_MAILING', 'SCHEMA_TABULACOES', 'PRE_FILTROS', 'SOURCE_COLUMNS']
+SECOES_PROCESSAMENTO = ['SOURCE_COLUMNS', 'SCHEMA_MAILING', 'SCHEMA_TABULACOES', 'SEGMENTACAO', 'PRIORITIES', 'EXPORT']
+
+def pyarrow_disponivel() -> bool:
+    """Checkpoints, --resume e shards gravam em Arrow IPC, que exige o pacote 'pyarrow'."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+def motivo_checkpoints_indisponiveis(config: ConfigParser) -> Optional[str]:
+    """Por que os checkpoints não podem ser usados nesta execução, ou None se podem."""
+    if not config.getboolean('CHECKPOINTS', 'habilitado', fallback=True):
+        return "os checkpoints estão desabilitados em [CHECKPOINTS] habilitado"
+    if not pyarrow_disponivel():
+        return "o pacote 'pyarrow' não está instalado"
+    return None
+
+class GerenciadorCheckpoints:
+    """Grava, localiza e remove checkpoints de estágio em [PATHS] checkpoint_dir."""
+    def __init__(self, config: ConfigParser, forcar_reutilizacao: bool = False):
+        self.config = config
+        self.diretorio = Path(config.get('PATHS', 'checkpoint_dir', fallback='./data_checkpoints'))
+        self.habilitado = config.getboolean('CHECKPOINTS', 'habilitado', fallback=True)
+        self.reutilizar = self.habilitado and (forcar_reutilizacao or config.getboolean('CHECKPOINTS', 'reutilizar', fallback=True))
+        self.manter_por_estagio = max(1, config.getint('CHECKPOINTS', 'manter_por_estagio', fallback=3))
+        if self.habilitado and not pyarrow_disponivel():
+            logger.warning("Checkpoints habilitados, mas o pacote 'pyarrow' não está instalado. Checkpoints desativados.")
+            self.habilitado = self.reutilizar = False
+
+    # --- CHAVES ---
+
+    def chave_carregamento(self, arquivos_entrada: Optional[Dict[str, Path]] = None, hashes: Optional[Dict[Path, str]] = None) -> str:
+        """
+        Hash dos arquivos que o carregamento vai ler (o mais recente de cada padrão, ou os de
+        'arquivos_entrada', como no backfill) e das seções lidas. 'hashes' reaproveita os hashes
+        dos arquivos já calculados pelo chamador.
+        """
+        arquivos = list((arquivos_entrada or localizar_arquivos_entrada(self.config)).values())
+        hashes = hashes if hashes is not None and all(f in hashes for f in arquivos) else hash_arquivos(arquivos)
+        entradas = [f"{f.name}:{hashes[f]}" for f in arquivos]
+        return combinar_hashes(f"v{VERSAO_CHECKPOINT}", hash_secoes_config(self.config, SECOES_CARREGAMENTO + secoes_de_regras(self.config)), *entradas)
+
+    def chave_processamento(self, chave_carregamento: str, data_referencia: datetime, shard: Optional[Tuple[int, int]] = None) -> str:
+        """
+        A data entra na chave porque o processamento grava a Data_de_Importacao; o shard (k, N),
+        porque cada shard processa só parte do mailing.
+        """
+        partes = [chave_carregamento, hash_secoes_config(self.config, SECOES_PROCESSAMENTO + secoes_de_regras(self.config)), data_referencia.strftime('%Y-%m-%d')]
+        if shard is not None:
+            partes.append(f"shard {shard[0]}/{shard[1]}")
+        return combinar_hashes(*partes)
+
+    # --- GRAVAÇÃO E LEITURA ---
+
+    def _pasta(self, estagio: str, chave: str) -> Path:
+        return self.diretorio / estagio / chave
+
+    def salvar(self, estagio: str, chave: str, frames: Dict, meta: Optional[dict] = None,
+               pasta_artefatos: Optional[Path] = None, artefatos: Optional[List[Path]] = None):
+        """
+        Grava os DataFrames do estágio (valores de 'frames' podem ser DataFrames ou dicionários de
+        DataFrames) e cópias dos arquivos gerados como efeito colateral. Falhas apenas desativam o
+        checkpoint do estágio.
+        """
+        if not self.habilitado:
+            return
+
+        destino = self._pasta(estagio, chave)
+        # Pasta temporária por processo: shards da mesma execução gravam o mesmo checkpoint ao mesmo tempo
+        temporaria = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+        shutil.rmtree(temporaria, ignore_errors=True)
+        temporaria.mkdir(parents=True)
+        indice = []
+        try:
+            for i, (caminho_frame, df) in enumerate(_achatar(frames)):
+                nome_arquivo = f"frame_{i:03d}.arrow"
+                gravar_arrow(df, temporaria / nome_arquivo)
+                indice.append({'caminho': list(caminho_frame), 'arquivo': nome_arquivo})
+            for artefato in artefatos or []:
+                relativo = artefato.relative_to(pasta_artefatos)
+                (temporaria / 'artefatos' / relativo).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(artefato, temporaria / 'artefatos' / relativo)
+            conteudo_meta = {
+                'versao': VERSAO_CHECKPOINT, 'estagio': estagio, 'chave': chave,
+                'criado_em': datetime.now().isoformat(), 'frames': indice, 'meta': meta or {}
+            }
+            (temporaria / NOME_META).write_text(json.dumps(conteudo_meta, indent=4, ensure_ascii=False), encoding='utf-8')
+        except Exception as e:
+            shutil.rmtree(temporaria, ignore_errors=True)
+            logger.warning(f"Checkpoint do estágio '{estagio}' não gravado (conversão para Arrow falhou): {e}")
+            return
+
+        shutil.rmtree(destino, ignore_errors=True)
+        try:
+            temporaria.replace(destino)
+        except OSError:
+            # Outro processo acabou de gravar o mesmo checkpoint (mesma chave, mesmo conteúdo)
+            shutil.rmtree(temporaria, ignore_errors=True)
+            return
+        logger.info(f"Checkpoint do estágio '{estagio}' gravado em '{destino}'.")
+        self._coletar_lixo(estagio)
+
+    def carregar(self, estagio: str, chave: str, pasta_artefatos: Optional[Path] = None) -> Optional[Tuple[Dict, dict]]:
+        """Devolve (frames, meta) do checkpoint com a chave informada, restaurando os artefatos."""
+        if not self.reutilizar:
+            return None
+        pasta = self._pasta(estagio, chave)
+        if not (pasta / NOME_META).is_file():
+            return None
+        try:
+            conteudo_meta = json.loads((pasta / NOME_META).read_text(encoding='utf-8'))
+            if conteudo_meta.get('versao') != VERSAO_CHECKPOINT:
+                return None
+            frames = {}
+            for item in conteudo_meta['frames']:
+                _inserir(frames, item['caminho'], ler_arrow(pasta / item['arquivo']))
+            if pasta_artefatos is not None and (pasta / 'artefatos').is_dir():
+                shutil.copytree(pasta / 'artefatos', pasta_artefatos, dirs_exist_ok=True)
+        except Exception as e:
+            logger.warning(f"Checkpoint do estágio '{estagio}' ilegível e será ignorado: {e}")
+            return None
+        # Atualiza o mtime para que o checkpoint em uso não seja o próximo a ser removido
+        (pasta / NOME_META).touch()
+        logger.info(f"Estágio '{estagio}' restaurado do checkpoint de {conteudo_meta.get('criado_em')}.")
+        return frames, conteudo_meta.get('meta', {})
+
+    def carregar_colunas(self, estagio: str, chave: str, caminho_frame: List[str], colunas: List[str]) -> Optional[pd.DataFrame]:
+        """
+        Lê apenas algumas colunas de um frame do checkpoint, com o arquivo Arrow mapeado em memória
+        (só os buffers das colunas pedidas são lidos do disco). Não restaura artefatos e não
+        depende de [CHECKPOINTS] reutilizar: serve às ferramentas de diagnóstico.
+        """
+        pasta = self._pasta(estagio, chave)
+        if not (pasta / NOME_META).is_file():
+            return None
+        try:
+            import pyarrow as pa
+            conteudo_meta = json.loads((pasta / NOME_META).read_text(encoding='utf-8'))
+            if conteudo_meta.get('versao') != VERSAO_CHECKPOINT:
+                return None
+            item = next((i for i in conteudo_meta['frames'] if i['caminho'] == list(caminho_frame)), None)
+            if item is None:
+                return None
+            with pa.memory_map(str(pasta / item['arquivo']), 'r') as origem:
+                tabela = pa.ipc.open_file(origem).read_all()
+                return tabela.select([c for c in colunas if c in tabela.column_names]).to_pandas()
+        except Exception as e:
+            logger.warning(f"Colunas do checkpoint do estágio '{estagio}' ilegíveis: {e}")
+            return None
+
+    def _coletar_lixo(self, estagio: str):
+        """Mantém apenas os checkpoints mais recentes de cada estágio."""
+        pasta_estagio = self.diretorio / estagio
+        checkpoints = sorted(
+            (p for p in pasta_estagio.iterdir() if p.is_dir() and not p.name.endswith('.tmp') and (p / NOME_META).is_file()),
+            key=lambda p: (p / NOME_META).stat().st_mtime, reverse=True
+        )
+        for antigo in checkpoints[self.manter_por_estagio:]:
+            shutil.rmtree(antigo, ignore_errors=True)
+            logger.info(f"Checkpoint antigo removido: '{antigo}'.")
+
+def gravar_arrow(df: pd.DataFrame, caminho: Path):
+    """Grava o DataFrame em Arrow IPC, preservando tipos e índice (requer 'pyarrow')."""
+    import pyarrow as pa
+    tabela = pa.Table.from_pandas(df)
+    with pa.OSFile(str(caminho), 'wb') as sink:
+        with pa.ipc.new_file(sink, tabela.schema) as writer:
+            writer.write_table(tabela)
+
+def ler_arrow(caminho: Path) -> pd.DataFrame:
+    import pyarrow as pa
+    with pa.OSFile(str(caminho), 'rb') as origem:
+        return pa.ipc.open_file(origem).read_all().to_pandas()
+
+def _achatar(frames: Dict, prefixo: Tuple[str, ...] = ()):
+    for nome, valor in frames.items():
+        if isinstance(valor, dict):
+            yield from _achatar(valor, prefixo + (str(nome),))
+        elif isinstance(valor, pd.DataFrame):
+            yield prefixo + (str(nome),), valor
+
+def _inserir(frames: Dict, caminho: List[str], df: pd.DataFrame):
+    for nome in caminho[:-1]:
+        frames = frames.setdefault(nome, {})
+    frames[caminho[-1]] = df
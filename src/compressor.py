@@ -3,12 +3,27 @@ import shutil
 from pathlib import Path
 from datetime import datetime
 import os
+import time
+import lzma
+import zlib
+import struct
+import hashlib
+import tarfile
+import zipfile
 import logging
 from configparser import ConfigParser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 import pandas as pd
+from src.escritor_csv import escrever_csv
+from src.logger_setup import descarregar_logs, arquivos_de_log
+from src.manifesto import ManifestoSaida, NOME_MANIFESTO, PASTA_REUTILIZADOS, caminho_manifesto_externo
 
 logger = logging.getLogger(__name__)
 
+CODECS_SUPORTADOS = {'stored': '.zip', 'deflate': '.zip', 'xz': '.tar.xz', 'zstd': '.tar.zst'}
+
 def _exorcizar_arquivos_fantasmas(diretorio_alvo: Path):
     logger.info("Iniciando ritual de exorcismo de arquivos fantasmas (BOM)...")
     fantasmas_encontrados = [f for f in diretorio_alvo.glob('*.csv') if 'ï»¿' in f.name]
@@ -18,7 +33,7 @@ def _exorcizar_arquivos_fantasmas(diretorio_alvo: Path):
     for fantasma in fantasmas_encontrados:
         try:
             os.remove(fantasma)
-            logger.warning(f"FANTASMA BANIDO: O arquivo '{fantasma.name}' foi removido.")
+            logger.warning("FANTASMA BANIDO: O arquivo '%s' foi removido.", fantasma.name)
         except OSError as e:
             logger.error(f"Falha ao banir o fantasma '{fantasma.name}': {e}")
 
@@ -29,7 +44,7 @@ def _substituir_nan_por_nulo(diretorio_alvo: Path):
             sep = '|' if 'Robo' in file_path.name or 'TOI_AD_FF_ENERGISA' in file_path.name else ';'
             df = pd.read_csv(file_path, sep=sep, dtype=str, encoding='utf-8-sig', keep_default_na=False)
             df.replace(['nan', 'NaT', 'None', 'NAN'], '', inplace=True)
-            df.to_csv(file_path, sep=sep, index=False, encoding='utf-8-sig', na_rep='')
+            escrever_csv(df, file_path, sep)
         except Exception as e:
             logger.error(f"Falha ao substituir 'nan' no arquivo '{file_path.name}': {e}")
 
@@ -47,9 +62,9 @@ def _deduplicar_arquivos_finais(diretorio: Path):
                 df.sort_values(by=[chave_deduplicacao, 'completude'], ascending=[True, False], inplace=True)
                 df.drop_duplicates(subset=[chave_deduplicacao], keep='last', inplace=True)
                 df.drop(columns=['completude'], inplace=True)
-                df.to_csv(file_path, sep=sep, index=False, encoding='utf-8-sig', na_rep='')
+                escrever_csv(df, file_path, sep)
                 removidos = tamanho_inicial - len(df)
-                logger.warning(f"  -> {removidos} duplicatas removidas de '{file_path.name}'.")
+                logger.warning("  -> %d duplicatas removidas de '%s'.", removidos, file_path.name)
         except Exception as e:
             logger.error(f"Falha ao deduplicar o arquivo '{file_path.name}': {e}")
 
@@ -65,54 +80,304 @@ def _corrigir_encoding_geral(diretorio_alvo: Path):
                 if coluna in df.columns:
                     for texto_corrompido, texto_correto in correcoes.items():
                         df[coluna] = df[coluna].str.replace(texto_corrompido, texto_correto, regex=False)
-            df.to_csv(file_path, sep=sep, index=False, encoding='utf-8-sig', na_rep='')
+            escrever_csv(df, file_path, sep)
         except Exception as e:
             logger.error(f"Falha ao corrigir encoding no arquivo '{file_path.name}': {e}")
 
 # 2
-def _limpar_cpf_numerico(diretorio_alvo: Path):
-    logger.info("--- Iniciando purificação de CPFs não numéricos ---")
-    coluna_cpf = 'CPF'
-    for file_path in diretorio_alvo.glob('*.csv'):
+def _obter_codec(config: ConfigParser) -> tuple:
+    """Lê o codec e o nível de compressão do [COMPRESSOR], com fallback para deflate."""
+    codec = config.get('COMPRESSOR', 'codec', fallback='deflate').strip().lower()
+    if codec not in CODECS_SUPORTADOS:
+        logger.warning(f"Codec '{codec}' não suportado. Usando 'deflate'.")
+        codec = 'deflate'
+    if codec == 'zstd':
         try:
-            sep = '|' if 'Robo' in file_path.name or 'TOI_AD_FF_ENERGISA' in file_path.name else ';'
-            df = pd.read_csv(file_path, sep=sep, dtype=str, encoding='utf-8-sig')
-            if coluna_cpf in df.columns:
-                df[coluna_cpf] = df[coluna_cpf].str.replace(r'\D', '', regex=True)
-                df.to_csv(file_path, sep=sep, index=False, encoding='utf-8-sig', na_rep='')
-        except Exception as e:
-            logger.error(f"Falha ao purificar CPFs no arquivo '{file_path.name}': {e}")
+            import zstandard  # noqa: F401
+        except ImportError:
+            logger.warning("Codec 'zstd' requer o pacote 'zstandard', que não está instalado. Usando 'deflate'.")
+            codec = 'deflate'
+    niveis_padrao = {'stored': 0, 'deflate': 6, 'xz': 6, 'zstd': 3}
+    nivel = config.getint('COMPRESSOR', 'compression_level', fallback=niveis_padrao[codec])
+    limites = {'stored': (0, 0), 'deflate': (1, 9), 'xz': (0, 9), 'zstd': (1, 22)}
+    minimo, maximo = limites[codec]
+    return codec, max(minimo, min(nivel, maximo))
+
+def _bloco_tar(nome: str, dados: bytes, mtime: float) -> bytes:
+    """Monta o cabeçalho e os dados de um membro tar, alinhados em blocos de 512 bytes."""
+    info = tarfile.TarInfo(nome)
+    info.size = len(dados)
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    cabecalho = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+    return cabecalho + dados + b'\0' * (-len(dados) % tarfile.BLOCKSIZE)
+
+def _comprimir_bytes(dados: bytes, codec: str, nivel: int) -> bytes:
+    if codec == 'stored':
+        return dados
+    if codec == 'deflate':
+        # Deflate "cru" (wbits negativo), exatamente como é gravado dentro de um ZIP
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+        return compressor.compress(dados) + compressor.flush()
+    if codec == 'xz':
+        return lzma.compress(dados, preset=nivel)
+    import zstandard
+    return zstandard.ZstdCompressor(level=nivel).compress(dados)
+
+def _preparar_membro(nome: str, dados: bytes, mtime: float, codec: str, nivel: int) -> Dict:
+    """
+    Comprime um membro numa única passada sobre os dados, junto com o CRC-32 e o sha256. No
+    tar xz/zstd cada membro vira um fluxo independente; fluxos concatenados formam um arquivo válido.
+    """
+    inicio = time.perf_counter()
+    if codec in ('xz', 'zstd'):
+        comprimido = _comprimir_bytes(_bloco_tar(nome, dados, mtime), codec, nivel)
+    else:
+        comprimido = _comprimir_bytes(dados, codec, nivel)
+    return {
+        'nome': nome, 'dados': comprimido, 'tamanho': len(dados), 'comprimido': len(comprimido),
+        'crc': zlib.crc32(dados), 'sha256': hashlib.sha256(dados).hexdigest(), 'mtime': mtime,
+        'duracao': time.perf_counter() - inicio
+    }
+
+def _comprimir_membro(caminho: Path, nome: str, codec: str, nivel: int) -> Dict:
+    """Lê e comprime um único membro do arquivo final. Executado em threads de trabalho."""
+    return _preparar_membro(nome, caminho.read_bytes(), caminho.stat().st_mtime, codec, nivel)
+
+class _EscritorZip:
+    """
+    Monta um ZIP a partir de membros já comprimidos nas threads de trabalho (stored ou deflate
+    cru), seguindo a especificação do formato (PKWARE APPNOTE), com ZIP64 quando os tamanhos ou
+    deslocamentos passam de 4 GiB. O zipfile não tem API pública para gravar dados
+    pré-comprimidos; ele continua sendo usado para ler os arquivos finais.
+    """
+    LIMITE_32 = 0xFFFFFFFF
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.centrais = []
+
+    @staticmethod
+    def _data_dos(mtime: float) -> tuple:
+        ano, mes, dia, hora, minuto, segundo = time.localtime(mtime)[:6]
+        if ano < 1980:
+            ano, mes, dia, hora, minuto, segundo = 1980, 1, 1, 0, 0, 0
+        return (hora << 11) | (minuto << 5) | (segundo // 2), ((ano - 1980) << 9) | (mes << 5) | dia
+
+    def gravar(self, membro: Dict, codec: str):
+        nome = membro['nome'].encode('utf-8')
+        # Bit 11: nome em UTF-8 (só quando não é ASCII, como o zipfile)
+        flags = 0 if membro['nome'].isascii() else 0x800
+        metodo = zipfile.ZIP_STORED if codec == 'stored' else zipfile.ZIP_DEFLATED
+        hora_dos, data_dos = self._data_dos(membro['mtime'])
+        tamanho, comprimido, deslocamento = membro['tamanho'], membro['comprimido'], self.destino.tell()
+
+        zip64_local = tamanho >= self.LIMITE_32 or comprimido >= self.LIMITE_32
+        extra = struct.pack('<HHQQ', 1, 16, tamanho, comprimido) if zip64_local else b''
+        versao = 45 if zip64_local else 20
+        self.destino.write(struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, versao, flags, metodo, hora_dos, data_dos, membro['crc'],
+            self.LIMITE_32 if zip64_local else comprimido, self.LIMITE_32 if zip64_local else tamanho, len(nome), len(extra)
+        ) + nome + extra)
+        self.destino.write(membro['dados'])
+
+        # No diretório central, o extra ZIP64 leva só os campos que estouraram, nesta ordem
+        campos = [valor for valor in (tamanho, comprimido, deslocamento) if valor >= self.LIMITE_32]
+        extra = struct.pack(f'<HH{len(campos)}Q', 1, 8 * len(campos), *campos) if campos else b''
+        versao = 45 if campos else 20
+        self.centrais.append(struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | versao, versao, flags, metodo, hora_dos, data_dos, membro['crc'],
+            min(comprimido, self.LIMITE_32), min(tamanho, self.LIMITE_32), len(nome), len(extra), 0, 0, 0,
+            0o100644 << 16, min(deslocamento, self.LIMITE_32)
+        ) + nome + extra)
+
+    def fechar(self):
+        inicio_central = self.destino.tell()
+        for registro in self.centrais:
+            self.destino.write(registro)
+        tamanho_central = self.destino.tell() - inicio_central
+        total = len(self.centrais)
+        if total >= 0xFFFF or inicio_central >= self.LIMITE_32 or tamanho_central >= self.LIMITE_32:
+            inicio_zip64 = self.destino.tell()
+            self.destino.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, total, total, tamanho_central, inicio_central))
+            self.destino.write(struct.pack('<IIQI', 0x07064b50, 0, inicio_zip64, 1))
+        self.destino.write(struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, min(total, 0xFFFF), min(total, 0xFFFF),
+            min(tamanho_central, self.LIMITE_32), min(inicio_central, self.LIMITE_32), 0
+        ))
+
+def _em_ordem(executor: ThreadPoolExecutor, funcao, itens, limite: int):
+    """
+    Resultados de 'funcao' sobre 'itens', na ordem dos itens, com no máximo 'limite' tarefas
+    em andamento: ao contrário do executor.map, os resultados não se acumulam na memória
+    enquanto o consumidor está ocupado gravando.
+    """
+    pendentes = deque()
+    for item in itens:
+        if len(pendentes) >= limite:
+            yield pendentes.popleft().result()
+        pendentes.append(executor.submit(funcao, *item))
+    while pendentes:
+        yield pendentes.popleft().result()
+
+def _registrar_membro(membro: Dict):
+    tamanho, comprimido = membro['tamanho'], membro['comprimido']
+    razao = (comprimido / tamanho) if tamanho else 1.0
+    logger.info("  -> '%s': %s -> %s bytes (razão %.1f%%) em %.2fs", membro['nome'], f"{tamanho:,}", f"{comprimido:,}", razao * 100, membro['duracao'])
+
+def _comprimir_pasta(pasta: Path, caminho_arquivo: Path, codec: str, nivel: int, max_workers: int,
+                     manifesto: Optional[ManifestoSaida] = None) -> dict:
+    """
+    Comprime todos os arquivos da pasta em paralelo e monta um único arquivo final. Cada membro
+    é lido uma vez numa thread de trabalho, que calcula o CRC-32 e o sha256 e o comprime
+    inteiro; o arquivo é montado na ordem dos nomes, com no máximo 'max_workers' membros
+    comprimidos aguardando a gravação. Com um manifesto, o manifest.json é gravado como último
+    membro (e ao lado do arquivo final). Devolve o caminho, o tamanho do arquivo final e o
+    nome/tamanho original de cada membro.
+    """
+    arquivos = sorted(f for f in pasta.rglob('*') if f.is_file())
+    nomes = [f.relative_to(pasta).as_posix() for f in arquivos]
+    inicio = time.perf_counter()
+    resumo_membros = []
+    limite = max(1, max_workers)
+
+    caminho_temporario = caminho_arquivo.with_name(caminho_arquivo.name + '.part')
+    with ThreadPoolExecutor(max_workers=limite, thread_name_prefix='compressor') as executor:
+        membros = _em_ordem(executor, lambda caminho, nome: _comprimir_membro(caminho, nome, codec, nivel), zip(arquivos, nomes), limite)
+        with open(caminho_temporario, 'wb') as destino:
+            escritor_zip = _EscritorZip(destino) if codec in ('stored', 'deflate') else None
+            for membro in membros:
+                if escritor_zip:
+                    escritor_zip.gravar(membro, codec)
+                else:
+                    destino.write(membro['dados'])
+                _registrar_membro(membro)
+                resumo_membros.append({k: membro[k] for k in ('nome', 'tamanho', 'sha256')})
+            if manifesto is not None:
+                dados_manifesto = manifesto.gerar(resumo_membros, caminho_arquivo.name, codec)
+                membro_manifesto = _preparar_membro(NOME_MANIFESTO, dados_manifesto, time.time(), codec, nivel)
+                if escritor_zip:
+                    escritor_zip.gravar(membro_manifesto, codec)
+                else:
+                    destino.write(membro_manifesto['dados'])
+            if escritor_zip:
+                escritor_zip.fechar()
+            else:
+                # Blocos finais do tar (dois blocos zerados, completando o registro de 10240 bytes)
+                destino.write(_comprimir_bytes(b'\0' * tarfile.RECORDSIZE, codec, nivel))
+    os.replace(caminho_temporario, caminho_arquivo)
+    if manifesto is not None:
+        caminho_manifesto_externo(caminho_arquivo).write_bytes(dados_manifesto)
+
+    tamanho_total = sum(f.stat().st_size for f in arquivos)
+    tamanho_final = caminho_arquivo.stat().st_size
+    razao = (tamanho_final / tamanho_total) if tamanho_total else 1.0
+    logger.info(
+        f"Compressão '{codec}' (nível {nivel}) de {len(arquivos)} arquivos: {tamanho_total:,} -> "
+        f"{tamanho_final:,} bytes (razão {razao:.1%}) em {time.perf_counter() - inicio:.2f}s"
+    )
+    return {'caminho': caminho_arquivo, 'bytes': tamanho_final, 'membros': resumo_membros}
+
+def encontrar_ultimo_arquivo(output_dir: Path, prefixo: str) -> Optional[Path]:
+    """Arquivo final mais recente (qualquer codec) gerado com o prefixo configurado."""
+    extensoes = tuple(set(CODECS_SUPORTADOS.values()))
+    candidatos = [f for f in output_dir.glob(f"{prefixo}*") if f.is_file() and f.name.endswith(extensoes)]
+    return max(candidatos, key=lambda f: f.stat().st_mtime) if candidatos else None
+
+def ler_membro_arquivo(caminho_arquivo: Path, nome: str) -> Optional[bytes]:
+    """Lê um membro de um arquivo final (.zip, .tar.xz ou .tar.zst). Retorna None se não existir."""
+    if caminho_arquivo.name.endswith('.zip'):
+        with zipfile.ZipFile(caminho_arquivo) as zf:
+            return zf.read(nome) if nome in zf.NameToInfo else None
+    if caminho_arquivo.name.endswith('.tar.zst'):
+        import zstandard
+        with open(caminho_arquivo, 'rb') as bruto:
+            leitor = zstandard.ZstdDecompressor().stream_reader(bruto, read_across_frames=True)
+            with tarfile.open(fileobj=leitor, mode='r|') as tf:
+                for info in tf:
+                    if info.name == nome:
+                        return tf.extractfile(info).read()
+        return None
+    with tarfile.open(caminho_arquivo, 'r:xz') as tf:
+        try:
+            return tf.extractfile(nome).read()
+        except KeyError:
+            return None
+
+def iterar_membros_arquivo(caminho_arquivo: Path, sufixo: str = ''):
+    """Percorre os membros (nome, bytes) de um arquivo final de qualquer codec, um de cada vez."""
+    if caminho_arquivo.name.endswith('.zip'):
+        with zipfile.ZipFile(caminho_arquivo) as zf:
+            for nome in zf.namelist():
+                if nome.endswith(sufixo):
+                    yield nome, zf.read(nome)
+        return
+    if caminho_arquivo.name.endswith('.tar.zst'):
+        import zstandard
+        with open(caminho_arquivo, 'rb') as bruto:
+            leitor = zstandard.ZstdDecompressor().stream_reader(bruto, read_across_frames=True)
+            with tarfile.open(fileobj=leitor, mode='r|') as tf:
+                for info in tf:
+                    if info.isfile() and info.name.endswith(sufixo):
+                        yield info.name, tf.extractfile(info).read()
+        return
+    with tarfile.open(caminho_arquivo, 'r:xz') as tf:
+        for info in tf:
+            if info.isfile() and info.name.endswith(sufixo):
+                yield info.name, tf.extractfile(info).read()
+
+def _restaurar_reutilizados(pasta_do_dia: Path):
+    """Move para a pasta do dia os arquivos reaproveitados da execução anterior."""
+    pasta_reutilizados = pasta_do_dia / PASTA_REUTILIZADOS
+    if not pasta_reutilizados.is_dir():
+        return
+    for arquivo in pasta_reutilizados.iterdir():
+        arquivo.replace(pasta_do_dia / arquivo.name)
+    pasta_reutilizados.rmdir()
 
 # 3
-def organize_and_compress_output(config: ConfigParser, run_log_file: str):
+def organize_and_compress_output(config: ConfigParser, run_log_file: str, manifesto: Optional[ManifestoSaida] = None,
+                                 data_referencia: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Organiza e comprime a pasta do dia ('data_referencia', hoje por padrão). Devolve o resumo do
+    arquivo final, ou None se não foi gerado.
+    """
     logger.info("--- INICIANDO ROTINA DE ORGANIZAÇÃO E COMPRESSÃO ---")
     
     output_dir = Path(config.get('PATHS', 'output_dir'))
     date_format_str = config.get('SETTINGS', 'output_date_format').replace('%%', '%')
-    pasta_do_dia = output_dir / datetime.now().strftime(date_format_str)
+    data_referencia = data_referencia or datetime.now()
+    pasta_do_dia = output_dir / data_referencia.strftime(date_format_str)
 
     if not pasta_do_dia.is_dir():
         logger.error(f"Pasta do dia '{pasta_do_dia}' não encontrada. Abortando.")
-        return
+        return None
 
     if run_log_file and Path(run_log_file).exists():
-        shutil.copy(run_log_file, pasta_do_dia)
+        # O log é escrito numa thread de fundo: esvazia a fila antes de copiar o arquivo e os pedaços rotacionados
+        descarregar_logs()
+        for arquivo_log in arquivos_de_log(run_log_file):
+            shutil.copy(arquivo_log, pasta_do_dia)
         logger.info(f"Log da execução '{Path(run_log_file).name}' copiado para a pasta de arquivamento.")
     
     _exorcizar_arquivos_fantasmas(pasta_do_dia)
     _substituir_nan_por_nulo(pasta_do_dia)
     _deduplicar_arquivos_finais(pasta_do_dia)
     _corrigir_encoding_geral(pasta_do_dia)
-    _limpar_cpf_numerico(pasta_do_dia)
+    _restaurar_reutilizados(pasta_do_dia)
 
+    codec, nivel = _obter_codec(config)
+    max_workers = config.getint('COMPRESSOR', 'max_workers', fallback=4)
     archive_name_prefix = config.get('COMPRESSOR', 'archive_name_prefix', fallback='mailing_')
-    zip_name = f"{archive_name_prefix}{datetime.now().strftime('%d-%m-%Y')}.zip"
-    zip_path = output_dir / zip_name
+    archive_name = f"{archive_name_prefix}{data_referencia.strftime('%d-%m-%Y')}{CODECS_SUPORTADOS[codec]}"
+    archive_path = output_dir / archive_name
 
+    resumo = None
     try:
-        shutil.make_archive(str(zip_path.with_suffix('')), 'zip', str(pasta_do_dia))
-        logger.info(f"Pasta do dia comprimida com sucesso em '{zip_path}'")
+        resumo = _comprimir_pasta(pasta_do_dia, archive_path, codec, nivel, max_workers, manifesto)
+        logger.info(f"Pasta do dia comprimida com sucesso em '{archive_path}'")
         shutil.rmtree(pasta_do_dia)
         logger.info(f"Pasta de trabalho original '{pasta_do_dia}' removida com sucesso.")
     except Exception as e:
         logger.error(f"Falha na compressão ou remoção: {e}")
+    return resumo
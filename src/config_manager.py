@@ -2,6 +2,7 @@
 import configparser
 import logging
 from pathlib import Path
+from src.motor_regras import regras_do_config
 
 logger = logging.getLogger(__name__)
 
@@ -18,17 +19,43 @@ def load_config(path: str) -> configparser.ConfigParser:
     logger.info("Arquivo de configuração carregado com sucesso.")
     return config
 
+# Chaves lidas sem fallback pelo pipeline (a ausência derruba a execução no meio)
+CHAVES_OBRIGATORIAS = {
+    'PATHS': ['input_dir', 'output_dir', 'log_dir', 'state_file'],
+    'FILENAMES': ['mailing_nucleo_pattern', 'enriquecimento_file', 'regras_disposicao_file'],
+    'SETTINGS': ['log_level', 'output_date_format'],
+    'EXPORT_COLUMNS': ['human_columns', 'robo_columns'],
+    'SOURCE_COLUMNS': ['cpf', 'bloqueio', 'valor_divida', 'vencimento_fatura', 'id_cliente_tabulacao', 'status_tabulacao'],
+    'PRIORITIES': ['order'],
+}
+
+# Chaves opcionais com tipo: se presentes, precisam ser convertíveis
+CHAVES_TIPADAS = {
+    ('EXPORT', 'max_workers'): 'int',
+    ('EXPORT', 'digitos_cpf'): 'int',
+    ('COMPRESSOR', 'compression_level'): 'int',
+    ('COMPRESSOR', 'max_workers'): 'int',
+    ('CHECKPOINTS', 'habilitado'): 'boolean',
+    ('CHECKPOINTS', 'reutilizar'): 'boolean',
+    ('CHECKPOINTS', 'manter_por_estagio'): 'int',
+    ('PRE_FILTROS', 'habilitado'): 'boolean',
+    ('HISTORICO', 'retencao'): 'int',
+    ('HISTORICO', 'janela_mediana'): 'int',
+    ('HISTORICO', 'limite_desvio_percentual'): 'float',
+    ('HISTORICO', 'duracao_minima_segundos'): 'float',
+    ('PERFIL', 'intervalo_ms'): 'float',
+    ('PERFIL', 'top_n'): 'int',
+    ('SCHEMA_TABULACOES', 'limiar_remocao_status_criticos'): 'int',
+    ('SERVICO', 'intervalo_segundos'): 'float',
+    ('BACKFILL', 'max_workers'): 'int',
+    ('ARMAZEM', 'habilitado'): 'boolean',
+}
+
 def validate_config(config: configparser.ConfigParser):
-    """Valida se as seções e chaves essenciais existem no config.ini."""
+    """Valida se as seções e chaves essenciais existem no config.ini e se as chaves tipadas são legíveis."""
     logger.info("Validando chaves de configuração essenciais...")
-    
-    required_sections = {
-        'PATHS': ['input_dir', 'output_dir', 'log_dir'],
-        'FILENAMES': [], # A validação de FILENAMES foi customizada abaixo
-        'SETTINGS': ['log_level']
-    }
 
-    for section, keys in required_sections.items():
+    for section, keys in CHAVES_OBRIGATORIAS.items():
         if section not in config:
             raise ValueError(f"Seção obrigatória '{section}' não encontrada no config.ini")
         for key in keys:
@@ -36,17 +63,20 @@ def validate_config(config: configparser.ConfigParser):
                 raise ValueError(f"Chave obrigatória '{key}' não encontrada na seção '[{section}]' do config.ini")
 
     # 1
-    """
-    # --- LÓGICA ANTIGA (PRESERVADA PARA HOMOLOGAÇÃO) ---
-    if 'mailing_nucleo_pattern' not in config['FILENAMES']:
-        raise ValueError("Chave obrigatória 'mailing_nucleo_pattern' não encontrada na seção '[FILENAMES]' do config.ini")
-    """
+    # A validação antiga exigia 'mailing_regulariza_pattern' e 'mailing_nao_regulariza_pattern', da
+    # arquitetura de dois funis; o carregamento atual lê as três chaves de [FILENAMES] acima.
 
     # 2
-    # --- NOVA LÓGICA DE VALIDAÇÃO PARA ARQUITETURA DE DOIS FUNIS ---
-    required_filenames = ['mailing_regulariza_pattern', 'mailing_nao_regulariza_pattern']
-    for filename_key in required_filenames:
-        if filename_key not in config['FILENAMES']:
-            raise ValueError(f"Chave obrigatória '{filename_key}' não encontrada na seção '[FILENAMES]' do config.ini")
+    for (section, key), tipo in CHAVES_TIPADAS.items():
+        if config.has_option(section, key):
+            try:
+                getattr(config, f"get{tipo}")(section, key)
+            except ValueError:
+                raise ValueError(f"Valor inválido para '{key}' na seção '[{section}]': esperado {tipo}, recebido '{config.get(section, key)}'")
+
+    # 3
+    # Compila as regras de filtragem ([PRE_FILTROS], status de bloqueio e [REGRA:<nome>]): uma regra
+    # malformada é apontada aqui, e não no meio do carregamento.
+    regras_do_config(config)
 
     logger.info("Configuração validada com sucesso.")
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador determinístico de massa sintética no formato das entradas reais (MAILING_NUCLEO,
+Pontuação com várias abas e Tabulações), para medir o desempenho do pipeline sem dados de
+clientes. As distribuições imitam a base real: CPFs repetidos, várias UCs por CPF, várias
+faturas por UC, textos com mojibake em 'bloq'/'faixa'/'iu12m' e mistura de status.
+"""
+import logging
+from pathlib import Path
+from typing import Dict, Iterable
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Limite de linhas de uma planilha do Excel (descontado o cabeçalho)
+LIMITE_LINHAS_EXCEL = 1_048_575
+
+PRODUTOS = ['EPB', 'EMR', 'ESS', 'ESE', 'ETO', 'ERO', 'EMT', 'EMS', 'EAC']
+LOCALIDADES = ['JOAO PESSOA', 'CAMPINA GRANDE', 'CUIABA', 'RONDONOPOLIS', 'PORTO VELHO', 'ARACAJU', 'PALMAS', 'RIO BRANCO']
+
+# (valor, peso). Valores com mojibake reproduzem o 'UTF-8 lido como latin-1' visto na base real.
+STATUS_BLOQUEIO = [
+    ('', 0.70), ('REFATURAMENTO', 0.04), ('refaturamento', 0.01), ('NEGOCIAÇÃO COM CLIENTE', 0.04),
+    ('NEGOCIAÃ‡ÃƒO COM CLIENTE', 0.03), ('AÇÃO JUDICIAL EM AVALIAÇÃO', 0.02), ('AÃ‡ÃƒO JUDICIAL EM AVALIAÃ‡ÃƒO', 0.02),
+    ('SOMENTE NEGATIVAÇÃO', 0.02), ('SOMENTE NEGATIVAÃ‡ÃƒO', 0.02), ('decisão da empresa', 0.02),
+    ('DECISÃƒO DA EMPRESA', 0.01), ('FAT ENV P/PROTESTO', 0.02), ('EM ANÁLISE', 0.03), ('EM ANÃ\x81LISE', 0.02),
+]
+FAIXAS = [
+    ('A VENCER', 0.15), ('ATÉ 30 DIAS', 0.15), ('ATÃ‰ 30 DIAS', 0.05), ('31 A 60 DIAS', 0.15),
+    ('61 A 90 DIAS', 0.15), ('91 A 180 DIAS', 0.15), ('+ 180 DIAS', 0.20),
+]
+SITUACOES = [('LIGADO', 0.55), ('DESLIGADO', 0.30), ('INATIVO', 0.10), ('SUSPENSO', 0.05)]
+IU12M = [('SIM', 0.45), ('NÃO', 0.35), ('NÃƒO', 0.20)]
+STATUS_TABULACAO = [
+    ('CLIENTE FALECIDO', 0.10), ('cliente falecido', 0.03), ('NAO PERTENCE A UC', 0.10), ('Nao Pertence a UC', 0.03),
+    ('SEM CONTATO', 0.30), ('CAIXA POSTAL', 0.24), ('PROMESSA DE PAGAMENTO', 0.15), ('RECADO', 0.05),
+]
+
+def _escolher(rng: np.random.Generator, opcoes, tamanho: int) -> np.ndarray:
+    valores, pesos = zip(*opcoes)
+    pesos = np.asarray(pesos, dtype=float)
+    return np.asarray(valores, dtype=object)[rng.choice(len(valores), size=tamanho, p=pesos / pesos.sum())]
+
+def _telefones(rng: np.random.Generator, tamanho: int, nulos: float) -> np.ndarray:
+    ddd = rng.choice([61, 62, 63, 65, 66, 68, 69, 79, 83], tamanho)
+    numeros = (ddd * 1_000_000_000 + 900_000_000 + rng.integers(0, 100_000_000, tamanho)).astype(float)
+    numeros[rng.random(tamanho) < nulos] = np.nan
+    return numeros
+
+def gerar_mailing(linhas: int, semente: int = 42) -> pd.DataFrame:
+    """
+    Uma linha por fatura. Cada CPF tem em média três faturas, distribuídas entre uma ou mais UCs.
+
+    >>> df = gerar_mailing(1000)
+    >>> len(df), bool(df['ncpf'].duplicated().any()), df.equals(gerar_mailing(1000))
+    (1000, True, True)
+    """
+    rng = np.random.default_rng(semente)
+    total_cpfs = max(1, linhas // 3)
+    # CPFs distintos (sorteio com folga e remoção de repetidos), em ordem aleatória
+    base_cpfs = rng.permutation(np.unique(rng.integers(10**9, 10**11, size=int(total_cpfs * 1.1) + 10)))[:total_cpfs]
+    indice_cpf = np.sort(rng.integers(0, total_cpfs, linhas))
+    ncpf = base_cpfs[indice_cpf]
+
+    # Várias UCs por CPF (mesmo produto) e várias faturas por UC
+    uc_do_cpf = rng.integers(0, 3, linhas) * (rng.random(linhas) < 0.35)
+    ucv = (indice_cpf * 4 + uc_do_cpf + 100_000).astype(np.int64)
+    produtos = np.asarray(PRODUTOS, dtype=object)[indice_cpf % len(PRODUTOS)]
+    # Uma pequena parte vem com BOM colado no código do produto, como nos arquivos reais
+    com_bom = rng.random(linhas) < 0.01
+    produtos[com_bom] = '﻿' + produtos[com_bom]
+
+    nomes = pd.Series(ncpf).astype(str).radd('CLIENTE ').to_numpy(dtype=object)
+    nomes[rng.random(linhas) < 0.03] = None
+    vencimentos = pd.Series(pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 1100, linhas), unit='D')).dt.strftime('%d/%m/%Y').to_numpy(dtype=object)
+    vencimentos[rng.random(linhas) < 0.03] = None
+    valores = np.round(rng.gamma(2.0, 120.0, linhas), 2)
+    liquido = np.where(rng.random(linhas) < 0.25, np.round(valores), valores)
+
+    df = pd.DataFrame({
+        'empresa': produtos,
+        'ucv': ucv,
+        'nomecad': nomes,
+        'ndoc': ncpf.astype(float),
+        'ncpf': ncpf,
+        'ano': rng.integers(2022, 2026, linhas),
+        'mes': rng.integers(1, 13, linhas),
+        'liquido': liquido,
+        'loc': np.asarray(LOCALIDADES, dtype=object)[indice_cpf % len(LOCALIDADES)],
+        'sit': _escolher(rng, SITUACOES, linhas),
+        'faixa': _escolher(rng, FAIXAS, linhas),
+        'iu12m': _escolher(rng, IU12M, linhas),
+        'bloq': _escolher(rng, STATUS_BLOQUEIO, linhas),
+        'just': _escolher(rng, [(None, 0.6), ('SEM CONTATO', 0.2), ('PROMESSA', 0.1), ('RECUSA', 0.1)], linhas),
+        'dtvenc': vencimentos,
+        'codbarra': pd.Series(rng.integers(10**10, 10**11, linhas)).astype(str).radd('836').to_numpy(dtype=object),
+        'totfat': rng.integers(1, 12, linhas),
+        'valor': pd.Series(valores).map('{:.2f}'.format).to_numpy(dtype=object),
+        'venc_maior_1ano': _escolher(rng, [('S', 0.3), ('N', 0.5), (None, 0.2)], linhas),
+        'ind_telefone_1_valido': _telefones(rng, linhas, 0.4),
+        'ind_telefone_2_valido': _telefones(rng, linhas, 0.7),
+        'fone_consumidor': _telefones(rng, linhas, 0.8),
+        'total_toi': np.round(rng.gamma(2.0, 300.0, linhas), 2),
+    })
+    return df
+
+def gerar_pontuacao(df_mailing: pd.DataFrame, semente: int = 42, abas: int = 3) -> Dict[str, pd.DataFrame]:
+    """Base de telefones pontuados para ~60% dos documentos do mailing, dividida em várias abas."""
+    rng = np.random.default_rng(semente + 1)
+    documentos = df_mailing['ndoc'].drop_duplicates().to_numpy()
+    documentos = documentos[rng.random(len(documentos)) < 0.6]
+    repeticoes = rng.integers(1, 4, len(documentos))
+    documentos = np.repeat(documentos, repeticoes)
+    df = pd.DataFrame({
+        'documento': documentos,
+        'telefone': _telefones(rng, len(documentos), 0.02),
+        'pontuacao': rng.integers(0, 1000, len(documentos)),
+    })
+    limites = np.linspace(0, len(df), abas + 1).astype(int)
+    return {f"Pontuacao_{i + 1}": df.iloc[limites[i]:limites[i + 1]].reset_index(drop=True) for i in range(abas)}
+
+def gerar_tabulacoes(df_mailing: pd.DataFrame, semente: int = 42) -> pd.DataFrame:
+    """Histórico de acionamentos de ~15% dos CPFs, com várias tentativas por cliente."""
+    rng = np.random.default_rng(semente + 2)
+    cpfs = df_mailing['ncpf'].drop_duplicates().to_numpy()
+    cpfs = cpfs[rng.random(len(cpfs)) < 0.15]
+    cpfs = np.repeat(cpfs, rng.integers(1, 7, len(cpfs)))
+    return pd.DataFrame({
+        'idcliente': cpfs.astype(float),
+        'status': _escolher(rng, STATUS_TABULACAO, len(cpfs)),
+    })
+
+def gerar_conjunto(linhas: int, semente: int = 42) -> Dict[str, object]:
+    """Os três insumos no formato devolvido por load_all_data."""
+    mailing = gerar_mailing(linhas, semente)
+    return {
+        'mailing': mailing,
+        'pagamentos': pd.DataFrame(),
+        'enriquecimento': gerar_pontuacao(mailing, semente),
+        'regras_disposicao': gerar_tabulacoes(mailing, semente),
+    }
+
+def gravar_conjunto(conjunto: Dict[str, object], destino: Path, formatos: Iterable[str] = ('parquet',)) -> Dict[str, Path]:
+    """
+    Grava os insumos em 'xlsx' (nomes esperados pelo [FILENAMES], até o limite do Excel) e/ou
+    'parquet' (equivalente colunar, uma aba por arquivo). Devolve os caminhos gravados.
+    """
+    destino.mkdir(parents=True, exist_ok=True)
+    formatos = set(formatos)
+    gravados = {}
+    mailing, abas, tabulacoes = conjunto['mailing'], conjunto['enriquecimento'], conjunto['regras_disposicao']
+
+    if 'xlsx' in formatos:
+        maior = max([len(mailing), len(tabulacoes)] + [len(aba) for aba in abas.values()])
+        if maior > LIMITE_LINHAS_EXCEL:
+            logger.warning(f"{maior:,} linhas excedem o limite do Excel ({LIMITE_LINHAS_EXCEL:,}). Somente o formato colunar será gravado.")
+        else:
+            gravados['mailing'] = destino / 'MAILING_NUCLEO_SINTETICO.xlsx'
+            mailing.to_excel(gravados['mailing'], index=False)
+            gravados['enriquecimento'] = destino / 'Pontuação.xlsx'
+            with pd.ExcelWriter(gravados['enriquecimento']) as writer:
+                for nome, aba in abas.items():
+                    aba.to_excel(writer, sheet_name=nome, index=False)
+            gravados['regras_disposicao'] = destino / 'Tabulações para retirar.xlsx'
+            tabulacoes.to_excel(gravados['regras_disposicao'], index=False)
+
+    if 'parquet' in formatos:
+        mailing.to_parquet(destino / 'mailing.parquet', index=False)
+        for nome, aba in abas.items():
+            aba.to_parquet(destino / f"enriquecimento__{nome}.parquet", index=False)
+        tabulacoes.to_parquet(destino / 'regras_disposicao.parquet', index=False)
+        gravados['parquet'] = destino
+    return gravados
+
+def ler_conjunto_colunar(origem: Path) -> Dict[str, object]:
+    """Lê os insumos gravados em Parquet por gravar_conjunto, no formato de load_all_data."""
+    return {
+        'mailing': pd.read_parquet(origem / 'mailing.parquet'),
+        'pagamentos': pd.DataFrame(),
+        'enriquecimento': {
+            f.stem.split('__', 1)[1]: pd.read_parquet(f) for f in sorted(origem.glob('enriquecimento__*.parquet'))
+        },
+        'regras_disposicao': pd.read_parquet(origem / 'regras_disposicao.parquet'),
+    }
@@ -1,21 +1,62 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
 import logging
+import time
 from pathlib import Path
 from configparser import ConfigParser
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+from src.escritor_csv import escrever_csv
+from src.formatacao_br import formatar_moeda, formatar_datas
+from src.identificadores import formatar_identificador, DIGITOS_CPF
+from src.manifesto import ManifestoSaida
+from src.exportador_parquet import parquet_habilitado, exportar_parquet, PASTA_PARQUET
 
 logger = logging.getLogger(__name__)
 
-def _formatar_valor_para_duas_casas(valor) -> str:
-    if pd.isna(valor): return ''
-    try:
-        valor_float = float(valor)
-        return f'{valor_float:.2f}'.replace('.', ',')
-    except (ValueError, TypeError):
-        return str(valor)
+def _nome_seguro(valor) -> str:
+    """Remove caracteres que não podem compor o nome de um arquivo de partição."""
+    return "".join(c for c in str(valor) if c.isalnum() or c in (' ', '_')).rstrip()
+
+def _escrever_particao(df_particao: pd.DataFrame, caminho_saida: Path, sep: str) -> Tuple[Path, int, int, float]:
+    inicio = time.perf_counter()
+    escrever_csv(df_particao, caminho_saida, sep)
+    duracao = time.perf_counter() - inicio
+    return caminho_saida, len(df_particao), caminho_saida.stat().st_size, duracao
 
-def exportar_dados_humanos(df_humano: pd.DataFrame, config: ConfigParser, diretorio_alvo: Path):
+def exportar_particoes(particoes: List[Tuple[str, pd.DataFrame, Path]], sep: str, max_workers: int = 1,
+                       manifesto: Optional[ManifestoSaida] = None, tipo: str = 'outro'):
+    """
+    Serializa partições já separadas (chave, DataFrame, caminho) em arquivos CSV, em paralelo
+    quando 'max_workers' > 1. Cada arquivo tem sua contagem de linhas, bytes e tempo de escrita
+    registrada no log. Com um manifesto, partições idênticas às da execução anterior não são
+    reescritas: os bytes finais do arquivo anterior são reaproveitados.
+    """
+    if not particoes:
+        return
+    pendentes = []
+    for chave, df, caminho in particoes:
+        hash_particao = manifesto.hash_particao(df) if manifesto is not None else None
+        if manifesto is not None and manifesto.reutilizar(tipo, chave, hash_particao, caminho):
+            continue
+        pendentes.append((chave, df, caminho, hash_particao))
+    if not pendentes:
+        return
+
+    max_workers = max(1, min(max_workers, len(pendentes)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='exportador') as executor:
+        futuros = {executor.submit(_escrever_particao, df, caminho, sep): (chave, df, hash_particao) for chave, df, caminho, hash_particao in pendentes}
+        for futuro in as_completed(futuros):
+            caminho_saida, linhas, tamanho, duracao = futuro.result()
+            logger.info("Exportadas %d linhas para '%s' (%s bytes em %.2fs)", linhas, caminho_saida, f"{tamanho:,}", duracao,
+                        extra={'linhas': linhas, 'duracao': round(duracao, 4)})
+            if manifesto is not None:
+                chave, df, hash_particao = futuros[futuro]
+                manifesto.registrar(caminho_saida, tipo, chave, linhas, list(df.columns), hash_particao)
+
+def exportar_dados_humanos(df_humano: pd.DataFrame, config: ConfigParser, diretorio_alvo: Path, manifesto: Optional[ManifestoSaida] = None,
+                           data_referencia: Optional[datetime] = None):
     """
     Função refatorada para a arquitetura de fluxo único.
     Exporta o mailing humano, particionando por 'PRODUTO' e selecionando colunas específicas.
@@ -27,7 +68,7 @@ def exportar_dados_humanos(df_humano: pd.DataFrame, config: ConfigParser, direto
         return
 
     formato_data_string = config.get('SETTINGS', 'output_date_format').replace('%%', '%')
-    data_str_hoje = datetime.now().strftime(formato_data_string)
+    data_str_hoje = (data_referencia or datetime.now()).strftime(formato_data_string)
     
     colunas_data = ['dtvenc', 'dtreav', 'dtprot', 'dt_deslig', 'dtapr', 'data_encer_cont', 'min_datavcm', 'dt_aplicação']
     colunas_financeiras = ['liquido', 'total_toi', 'valor', 'valorDivida']
@@ -37,10 +78,12 @@ def exportar_dados_humanos(df_humano: pd.DataFrame, config: ConfigParser, direto
     # Aplica formatações
     for coluna in colunas_financeiras:
         if coluna in df_export.columns:
-            df_export[coluna] = df_export[coluna].apply(_formatar_valor_para_duas_casas)
+            df_export[coluna] = formatar_moeda(df_export[coluna])
     for coluna_data in colunas_data:
         if coluna_data in df_export.columns:
-            df_export[coluna_data] = pd.to_datetime(df_export[coluna_data], errors='coerce').dt.strftime('%d/%m/%Y')
+            df_export[coluna_data] = formatar_datas(df_export[coluna_data])
+    if 'CPF' in df_export.columns:
+        df_export['CPF'] = formatar_identificador(df_export['CPF'], config.getint('EXPORT', 'digitos_cpf', fallback=DIGITOS_CPF))
     
     try:
         colunas_human_str = config.get('EXPORT_COLUMNS', 'human_columns')
@@ -53,20 +96,26 @@ def exportar_dados_humanos(df_humano: pd.DataFrame, config: ConfigParser, direto
         logger.warning(f"Não foi possível ler a configuração de colunas de exportação para arquivos humanos: {e}. Exportando todas as colunas.")
         df_export_final = df_export
 
-    # Exporta particionado por produto
+    # Exporta particionado por produto, separando o DataFrame uma única vez
     prefixo = config.get('SETTINGS', 'output_file_prefix', fallback='Telecobranca_TOI_')
+    max_workers = config.getint('EXPORT', 'max_workers', fallback=4)
+    particoes = []
     if 'PRODUTO' in df_export_final.columns:
         df_export_final['PRODUTO'] = df_export_final['PRODUTO'].astype(str).str.strip()
-        for produto in df_export_final['PRODUTO'].unique():
+        for produto, df_produto in df_export_final.groupby('PRODUTO', sort=False):
             if pd.isna(produto) or not str(produto).strip(): continue
-            
-            df_produto = df_export_final[df_export_final['PRODUTO'] == produto]
-            nome_arquivo = f"{prefixo}mailing_{produto}_{data_str_hoje}.csv"
-            caminho_saida = diretorio_alvo / nome_arquivo
-            
-            logger.info(f"Exportando {len(df_produto)} linhas para '{caminho_saida}'")
-            df_produto.to_csv(caminho_saida, index=False, sep=';', encoding='utf-8-sig', na_rep='')
+            nome_arquivo = f"{prefixo}mailing_{_nome_seguro(produto)}_{data_str_hoje}.csv"
+            particoes.append((str(produto), df_produto, diretorio_alvo / nome_arquivo))
     else:
-        logger.error("Coluna 'PRODUTO' não encontrada. Não é possível particionar a exportação.")
+        logger.warning("Coluna 'PRODUTO' não encontrada. Exportando arquivo consolidado.")
+        nome_arquivo = f"{prefixo}Humano_Consolidado_{data_str_hoje}.csv"
+        particoes.append(('CONSOLIDADO', df_export_final, diretorio_alvo / nome_arquivo))
+
+    exportar_particoes(particoes, sep=';', max_workers=max_workers, manifesto=manifesto, tipo='humano')
 
+    if parquet_habilitado(config):
+        # Mesmas colunas do CSV, mas com os tipos originais (antes da formatação BR)
+        caminho_parquet = diretorio_alvo / PASTA_PARQUET / f"{prefixo}Humano_{data_str_hoje}.parquet"
+        if exportar_parquet(df_humano[list(df_export_final.columns)], caminho_parquet) and manifesto is not None:
+            manifesto.registrar(caminho_parquet, 'parquet', 'humano', len(df_humano), list(df_export_final.columns))
     logger.info("="*20 + " EXPORTAÇÃO DE DADOS HUMANOS CONCLUÍDA " + "="*20)
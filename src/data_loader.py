@@ -1,10 +1,14 @@
 # --- src/data_loader.py ---
+import re
 import pandas as pd
 import logging
 from pathlib import Path
+from datetime import date, datetime
 from configparser import ConfigParser
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from src.schema_validator import validate_schema, SchemaValidationError
+from src.motor_regras import regras_do_config, aplicar_regras
+from src.identificadores import converter_colunas
 
 logger = logging.getLogger(__name__)
 
@@ -44,58 +48,132 @@ def _load_excel_file(file_path: Path, config: ConfigParser, schema_key: str, all
         logger.error(f"Falha ao carregar ou validar o arquivo {file_path.name}: {e}", exc_info=True)
         return None
 
-def load_all_data(config: ConfigParser) -> Dict[str, pd.DataFrame]:
+def localizar_arquivos_entrada(config: ConfigParser) -> Dict[str, Path]:
+    """Arquivo mais recente de cada padrão de [FILENAMES], sem validação nem log (para hashes e métricas)."""
+    input_dir = Path(config.get('PATHS', 'input_dir'))
+    arquivos = {}
+    for chave in ('mailing_nucleo_pattern', 'enriquecimento_file', 'regras_disposicao_file'):
+        candidatos = [f for f in input_dir.glob(config.get('FILENAMES', chave)) if f.is_file()]
+        if candidatos:
+            arquivos[chave] = max(candidatos, key=lambda f: f.stat().st_mtime)
+    return arquivos
+
+# Datas reconhecidas no nome do mailing, na ordem de tentativa: (regex, ordem dos grupos ano/mês/dia)
+PADROES_DATA_NOME = [
+    (re.compile(r'(?<!\d)(\d{4})[-_.](\d{2})[-_.](\d{2})(?!\d)'), (0, 1, 2)),
+    (re.compile(r'(?<!\d)(\d{2})[-_.](\d{2})[-_.](\d{4})(?!\d)'), (2, 1, 0)),
+    (re.compile(r'(?<!\d)(\d{2})(\d{2})(\d{4})(?!\d)'), (2, 1, 0)),
+    (re.compile(r'(?<!\d)(\d{4})(\d{2})(\d{2})(?!\d)'), (0, 1, 2)),
+]
+
+def data_do_mailing(arquivo: Path) -> date:
+    """
+    Dia a que o mailing se refere: a data no nome do arquivo (2025-06-03, 03-06-2025, 03062025
+    ou 20250603), ou, sem data no nome, o dia da última modificação do arquivo.
+
+    >>> data_do_mailing(Path('MAILING_NUCLEO_03-06-2025.xlsx')), data_do_mailing(Path('MAILING_NUCLEO_20250603.xlsx'))
+    (datetime.date(2025, 6, 3), datetime.date(2025, 6, 3))
+    """
+    for padrao, ordem in PADROES_DATA_NOME:
+        for encontrado in padrao.finditer(arquivo.stem):
+            grupos = encontrado.groups()
+            try:
+                return date(*(int(grupos[i]) for i in ordem))
+            except ValueError:
+                continue
+    return datetime.fromtimestamp(arquivo.stat().st_mtime).date()
+
+def localizar_mailings_periodo(config: ConfigParser, inicio: date, fim: date) -> List[Tuple[date, Path]]:
+    """
+    Mailings (padrão [FILENAMES] mailing_nucleo_pattern) cujo dia está entre 'inicio' e 'fim',
+    inclusive, em ordem de data. Se houver mais de um arquivo no mesmo dia, vale o mais recente,
+    como no _find_latest_file.
+    """
+    input_dir = Path(config.get('PATHS', 'input_dir'))
+    por_dia: Dict[date, Path] = {}
+    for arquivo in input_dir.glob(config.get('FILENAMES', 'mailing_nucleo_pattern')):
+        if not arquivo.is_file():
+            continue
+        dia = data_do_mailing(arquivo)
+        if not inicio <= dia <= fim:
+            continue
+        anterior = por_dia.get(dia)
+        if anterior is not None:
+            logger.warning(f"Mais de um mailing para {dia:%d/%m/%Y} ('{anterior.name}' e '{arquivo.name}'): usando o mais recente.")
+            if anterior.stat().st_mtime >= arquivo.stat().st_mtime:
+                continue
+        por_dia[dia] = arquivo
+    return sorted(por_dia.items())
+
+# Bases de referência: chave em all_data -> (chave do padrão em [FILENAMES], seção do schema, todas as abas)
+REFERENCIAS = {
+    'enriquecimento': ('enriquecimento_file', '', True),
+    'regras_disposicao': ('regras_disposicao_file', 'SCHEMA_TABULACOES', False),
+}
+
+def colunas_identificadoras(config: ConfigParser) -> Dict[str, List[str]]:
+    """Colunas de identificadores (CPF, documento, ID de cliente) de cada base, convertidas em chaves inteiras na leitura."""
+    return {
+        'mailing': [config.get('SOURCE_COLUMNS', 'cpf').lower(), 'ndoc'],
+        'enriquecimento': ['documento'],
+        'regras_disposicao': [config.get('SOURCE_COLUMNS', 'id_cliente_tabulacao').lower()],
+    }
+
+def converter_identificadores(config: ConfigParser, nome: str, dados):
+    """Converte os identificadores de uma base de all_data (DataFrame ou dicionário de abas) em chaves Int64."""
+    colunas = colunas_identificadoras(config).get(nome, [])
+    if isinstance(dados, dict):
+        for aba, df in dados.items():
+            converter_colunas(df, colunas, f"{nome}/{aba}")
+    elif isinstance(dados, pd.DataFrame):
+        converter_colunas(dados, colunas, nome)
+    return dados
+
+def carregar_referencia(config: ConfigParser, nome: str, arquivo: Optional[Path]):
+    """Carrega uma das bases de REFERENCIAS; sem arquivo, devolve a estrutura vazia correspondente."""
+    _, schema_key, todas_abas = REFERENCIAS[nome]
+    if arquivo:
+        return converter_identificadores(config, nome, _load_excel_file(arquivo, config, schema_key, all_sheets=todas_abas))
+    return {} if todas_abas else pd.DataFrame()
+
+def load_all_data(config: ConfigParser, referencias: Optional[Dict] = None,
+                  relatorio_regras: Optional[List[dict]] = None,
+                  arquivo_mailing: Optional[Path] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Carrega o mailing e as bases de referência. As bases presentes em 'referencias' (já carregadas
+    e mantidas em memória pelo modo serviço) não são lidas de novo. As regras da etapa
+    'carregamento' são aplicadas ao mailing logo após a leitura; se 'relatorio_regras' for
+    informado, recebe a contagem de linhas removidas por regra. 'arquivo_mailing' (backfill)
+    substitui o mailing mais recente da pasta de entrada.
+    """
     input_dir = Path(config.get('PATHS', 'input_dir'))
     all_data = {}
 
-    latest_mailing = _find_latest_file(input_dir, config.get('FILENAMES', 'mailing_nucleo_pattern'))
+    latest_mailing = arquivo_mailing or _find_latest_file(input_dir, config.get('FILENAMES', 'mailing_nucleo_pattern'))
     all_data['mailing'] = _load_excel_file(latest_mailing, config, 'SCHEMA_MAILING') if latest_mailing else pd.DataFrame()
+    # Identificadores viram chaves inteiras uma única vez, antes das regras e do checkpoint
+    converter_identificadores(config, 'mailing', all_data['mailing'])
+    regras = regras_do_config(config, 'carregamento')
+    if regras and isinstance(all_data['mailing'], pd.DataFrame) and not all_data['mailing'].empty:
+        df_mailing, relatorio = aplicar_regras(all_data['mailing'], regras, latest_mailing.name)
+        # As linhas descartadas não seguem para o checkpoint nem para o processamento
+        all_data['mailing'] = df_mailing.reset_index(drop=True)
+        if relatorio_regras is not None:
+            relatorio_regras.extend(relatorio)
 
     logger.info("Etapa de carregamento de pagamentos pulada (obsoleta).")
     all_data['pagamentos'] = pd.DataFrame()
 
-    latest_enriquecimento = _find_latest_file(input_dir, config.get('FILENAMES', 'enriquecimento_file'), optional=True)
-    if latest_enriquecimento:
-        all_data['enriquecimento'] = _load_excel_file(latest_enriquecimento, config, '', all_sheets=True)
-    else:
-        all_data['enriquecimento'] = {}
-
-    latest_regras = _find_latest_file(input_dir, config.get('FILENAMES', 'regras_disposicao_file'), optional=True)
-    if latest_regras:
-        all_data['regras_disposicao'] = _load_excel_file(latest_regras, config, 'SCHEMA_TABULACOES')
-    else:
-        all_data['regras_disposicao'] = pd.DataFrame()
+    for nome, (chave_padrao, _, _) in REFERENCIAS.items():
+        if referencias is not None and nome in referencias:
+            all_data[nome] = referencias[nome]
+            continue
+        arquivo = _find_latest_file(input_dir, config.get('FILENAMES', chave_padrao), optional=True)
+        all_data[nome] = carregar_referencia(config, nome, arquivo)
 
     logger.info("Todos os arquivos de dados foram carregados e validados com sucesso.")
     return all_data
 
-# --- src/data_exporter.py ---
-def exportar_dados_humanos(df_humano: pd.DataFrame, config: ConfigParser, diretorio_alvo: Path):
-    if df_humano.empty:
-        logger.warning("DataFrame 'Humano' está vazio. Nenhuma exportação será realizada.")
-        return
-        
-    logger.info("="*20 + " INICIANDO EXPORTAÇÃO DE DADOS HUMANOS (FLUXO ÚNICO) " + "="*20)
-    
-    prefixo = config.get('SETTINGS', 'output_file_prefix', fallback='Telecobranca_TOI_')
-    date_format = config.get('SETTINGS', 'output_date_format').replace('%%', '%')
-    data_str_hoje = datetime.now().strftime(date_format)
-    
-    if 'PRODUTO' in df_humano.columns:
-        for produto, data in df_humano.groupby('PRODUTO'):
-            produto_seguro = "".join(c for c in str(produto) if c.isalnum() or c in (' ', '_')).rstrip()
-            nome_arquivo = f"{prefixo}mailing_{produto_seguro}_{data_str_hoje}.csv"
-            caminho_saida = diretorio_alvo / nome_arquivo
-            logger.info(f"Exportando {len(data)} linhas para o produto '{produto}' em '{caminho_saida}'")
-            data.to_csv(caminho_saida, index=False, sep=';', encoding='utf-8-sig', na_rep='')
-    else:
-        logger.warning("Coluna 'PRODUTO' não encontrada. Exportando arquivo consolidado.")
-        nome_arquivo = f"{prefixo}Humano_Consolidado_{data_str_hoje}.csv"
-        caminho_saida = diretorio_alvo / nome_arquivo
-        df_humano.to_csv(caminho_saida, index=False, sep=';', encoding='utf-8-sig', na_rep='')
-    logger.info("="*20 + " EXPORTAÇÃO DE DADOS HUMANOS CONCLUÍDA " + "="*20)
-
-
 # --- src/final_polisher.py ---
 def polimento_final(diretorio_alvo: Path):
     logger.info("--- Iniciando polimento final nos arquivos ---")
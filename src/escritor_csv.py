@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+import codecs
+import logging
+from pathlib import Path
+from configparser import ConfigParser
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BACKENDS_SUPORTADOS = ('pandas', 'pyarrow')
+_backend_padrao = 'pandas'
+
+class DialetoIncompativelError(Exception):
+    """O DataFrame contém valores que o backend pyarrow não consegue escrever no dialeto atual."""
+    pass
+
+def configurar_escritor_csv(config: ConfigParser):
+    """Define o backend de escrita de CSV usado por todos os exportadores a partir de [EXPORT] csv_backend."""
+    global _backend_padrao
+    backend = config.get('EXPORT', 'csv_backend', fallback='pandas').strip().lower()
+    if backend not in BACKENDS_SUPORTADOS:
+        logger.warning(f"Backend de CSV '{backend}' não suportado. Usando 'pandas'.")
+        backend = 'pandas'
+    if backend == 'pyarrow':
+        try:
+            import pyarrow.csv  # noqa: F401
+        except ImportError:
+            logger.warning("Backend 'pyarrow' requer o pacote 'pyarrow', que não está instalado. Usando 'pandas'.")
+            backend = 'pandas'
+    _backend_padrao = backend
+    logger.info(f"Backend de escrita de CSV: '{_backend_padrao}'.")
+
+def _coluna_como_texto(serie: pd.Series):
+    """
+    Converte uma coluna para um array de texto do pyarrow, reproduzindo a formatação do
+    DataFrame.to_csv. Tipos sem equivalência garantida levantam DialetoIncompativelError.
+    """
+    import pyarrow as pa
+    mascara_nulos = serie.isna().to_numpy()
+    dtype = serie.dtype
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_float_dtype(dtype):
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+            valores = serie.astype(object).where(~mascara_nulos, '').map(str).to_numpy()
+        else:
+            # Mesmo caminho do to_csv: numpy astype(str) gera o 'repr' curto dos floats
+            valores = serie.to_numpy().astype(str)
+        return pa.array(valores, mask=mascara_nulos, type=pa.string())
+    if dtype == object or pd.api.types.is_string_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+        if isinstance(dtype, pd.CategoricalDtype):
+            serie = serie.astype(object)
+        if pd.api.types.infer_dtype(serie, skipna=True) not in ('string', 'empty'):
+            serie = serie.where(mascara_nulos, serie.map(str, na_action='ignore'))
+        return pa.array(serie.to_numpy(dtype=object), mask=mascara_nulos, type=pa.string())
+    raise DialetoIncompativelError(f"tipo '{dtype}' da coluna '{serie.name}' não suportado")
+
+def _escrever_csv_pyarrow(df: pd.DataFrame, caminho: Path, sep: str):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+
+    nomes = [str(col) for col in df.columns]
+    colunas = [_coluna_como_texto(df.iloc[:, i]) for i in range(df.shape[1])]
+
+    # O pandas coloca entre aspas só os valores com caracteres estruturais; o pyarrow não sabe fazer isso.
+    padrao_estrutural = '[' + ''.join('\\' + c for c in {sep, '"'}) + '\\r\\n]'
+    if any(c in nome for nome in nomes for c in (sep, '"', '\r', '\n')):
+        raise DialetoIncompativelError("cabeçalho com caracteres que exigem aspas")
+    for nome, coluna in zip(nomes, colunas):
+        if pc.any(pc.match_substring_regex(coluna, padrao_estrutural)).as_py():
+            raise DialetoIncompativelError(f"coluna '{nome}' contém valores que exigem aspas")
+    # Com uma única coluna, o pandas escreve '""' para nulos e vazios; o pyarrow deixaria a linha em branco
+    if len(colunas) == 1 and (colunas[0].null_count or pc.any(pc.equal(colunas[0], '')).as_py()):
+        raise DialetoIncompativelError("coluna única com valores vazios")
+
+    try:
+        opcoes = pacsv.WriteOptions(include_header=False, delimiter=sep, quoting_style='none', eol=os.linesep)
+    except TypeError:
+        if os.linesep != '\n':
+            raise DialetoIncompativelError("versão do pyarrow não permite configurar o fim de linha")
+        opcoes = pacsv.WriteOptions(include_header=False, delimiter=sep, quoting_style='none')
+
+    tabela = pa.Table.from_arrays(colunas, names=nomes)
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(codecs.BOM_UTF8 + (sep.join(nomes) + os.linesep).encode('utf-8'))
+        if tabela.num_rows:
+            pacsv.write_csv(tabela, arquivo, opcoes)
+
+def escrever_csv(df: pd.DataFrame, caminho: Path, sep: str, backend: str | None = None):
+    """
+    Escreve um DataFrame no dialeto padrão das saídas: separador 'sep', BOM UTF-8, cabeçalho,
+    sem índice e nulos como string vazia. Com o backend 'pyarrow', recorre ao pandas sempre
+    que o conteúdo não puder ser escrito de forma idêntica.
+    """
+    backend = backend or _backend_padrao
+    if backend == 'pyarrow':
+        try:
+            _escrever_csv_pyarrow(df, caminho, sep)
+            return
+        except DialetoIncompativelError as e:
+            logger.debug("Backend pyarrow indisponível para '%s' (%s). Usando pandas.", Path(caminho).name, e)
+    df.to_csv(caminho, sep=sep, index=False, encoding='utf-8-sig', na_rep='')
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Exportação opcional em Parquet (pyarrow) das saídas do pipeline, com os tipos originais dos
+DataFrames em memória (datas como datas, valores como números) e colunas de texto codificadas
+em dicionário. Os arquivos vão para a subpasta 'parquet' da pasta do dia e entram no arquivo final.
+"""
+import time
+import logging
+from pathlib import Path
+from configparser import ConfigParser
+from typing import Optional, Set
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FORMATOS_SUPORTADOS = ('csv', 'parquet')
+PASTA_PARQUET = 'parquet'
+
+def formatos_exportacao(config: ConfigParser) -> Set[str]:
+    """Lê [EXPORT] formats. O CSV é sempre gerado, pois é o layout consumido pelo discador."""
+    valor = config.get('EXPORT', 'formats', fallback='csv')
+    formatos = {f.strip().lower() for f in valor.split(',') if f.strip()}
+    desconhecidos = formatos - set(FORMATOS_SUPORTADOS)
+    if desconhecidos:
+        logger.warning(f"Formatos de exportação desconhecidos ignorados: {', '.join(sorted(desconhecidos))}.")
+    if 'csv' not in formatos:
+        logger.warning("O formato 'csv' é obrigatório para o discador e continuará sendo gerado.")
+    return (formatos & set(FORMATOS_SUPORTADOS)) | {'csv'}
+
+def parquet_habilitado(config: ConfigParser) -> bool:
+    if 'parquet' not in formatos_exportacao(config):
+        return False
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logger.warning("Formato 'parquet' configurado, mas o pacote 'pyarrow' não está instalado. Exportação Parquet desativada.")
+        return False
+    return True
+
+def _tabela_arrow(df: pd.DataFrame):
+    """
+    Converte o DataFrame em tabela Arrow preservando os tipos. Colunas de texto viram dicionário;
+    colunas 'object' com tipos misturados são convertidas para texto (nulos preservados).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    colunas = {}
+    for nome in df.columns:
+        serie = df[nome]
+        try:
+            array = pa.array(serie, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            array = pa.array(serie.where(serie.isna(), serie.astype(str)), type=pa.string(), from_pandas=True)
+        if pa.types.is_null(array.type):
+            array = array.cast(pa.string())
+        if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+            array = pc.dictionary_encode(array)
+        colunas[str(nome)] = array
+    return pa.table(colunas)
+
+def exportar_parquet(df: pd.DataFrame, caminho_saida: Path) -> Optional[Path]:
+    """Grava o DataFrame em Parquet (zstd). Falhas são registradas sem interromper o pipeline."""
+    import pyarrow.parquet as pq
+
+    inicio = time.perf_counter()
+    try:
+        caminho_saida.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(_tabela_arrow(df.reset_index(drop=True)), caminho_saida, compression='zstd', use_dictionary=True)
+    except Exception as e:
+        logger.error(f"Falha ao exportar Parquet '{caminho_saida.name}': {e}")
+        return None
+    logger.info(f"Exportadas {len(df)} linhas para '{caminho_saida}' ({caminho_saida.stat().st_size:,} bytes em {time.perf_counter() - inicio:.2f}s)")
+    return caminho_saida
@@ -2,19 +2,19 @@
 import pandas as pd
 import logging
 from pathlib import Path
+from src.escritor_csv import escrever_csv
 
 logger = logging.getLogger(__name__)
 
 # 1. Adicionadas novas colunas para polimento
 COLUNAS_ENCODING_NAO = ['reav', 'corte_toi', 'cortepen', 'iu12m', 'Cliente_Regulariza']
+# CPF e ndoc não entram: são chaves inteiras desde o carregamento e saem já formatadas da exportação
 COLUNAS_TEXTO_INTEIRO = [
     'ind_telefone_1_valido', 
     'ind_telefone_2_valido',
-    'ndoc',
     'consumo',
     'fone_consumidor',
     'diasprot',
-    'CPF',
     'Quantidade_UC_por_CPF'
 ]
 
@@ -28,7 +28,7 @@ def polimento_final(diretorio_alvo: Path):
 
     for file_path in diretorio_alvo.glob('*.csv'):
         try:
-            logger.info(f"Polindo o arquivo: '{file_path.name}'")
+            logger.info("Polindo o arquivo: '%s'", file_path.name)
             sep = '|' if 'Robo' in file_path.name else ';'
             df = pd.read_csv(file_path, sep=sep, dtype=str, encoding='utf-8-sig')
             
@@ -42,8 +42,8 @@ def polimento_final(diretorio_alvo: Path):
                 if coluna in df.columns:
                     df[coluna] = df[coluna].astype(str).str.replace(r'\.0$', '', regex=True)
 
-            df.to_csv(file_path, sep=sep, index=False, encoding='utf-8-sig', na_rep='')
-            logger.info(f"Polimento do arquivo '{file_path.name}' concluído.")
+            escrever_csv(df, file_path, sep)
+            logger.info("Polimento do arquivo '%s' concluído.", file_path.name)
         except Exception as e:
             logger.error(f"Falha ao polir o arquivo '{file_path.name}': {e}")
 
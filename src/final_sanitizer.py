@@ -5,6 +5,7 @@ import pandas as pd
 from pathlib import Path
 import logging
 import tempfile # Para escrita segura em arquivos
+from src.escritor_csv import escrever_csv
 
 logger = logging.getLogger(__name__)
 
@@ -56,7 +57,7 @@ def polir_colunas_do_robo(diretorio_alvo: Path):
                         df[coluna] = df[coluna].astype(str).str.replace(r'\.0$', '', regex=True).fillna('')
                         logger.debug(f"  - Coluna '{coluna}' polida.")
                 
-                df.to_csv(arquivo_path, sep='|', index=False, encoding='utf-8-sig')
+                escrever_csv(df, arquivo_path, '|')
                 logging.info(f"Arquivo '{arquivo_path.name}' polido e salvo com sucesso.")
 
             except Exception as e:
@@ -101,7 +102,7 @@ def polir_colunas_humanas(diretorio_alvo: Path):
                 # Implementa a escrita segura para evitar corrupção de arquivos
                 temp_path = None
                 with tempfile.NamedTemporaryFile(mode='w', delete=False, dir=diretorio_alvo, suffix='.csv', encoding='utf-8-sig') as temp_file:
-                    df.to_csv(temp_file.name, sep=';', index=False, encoding='utf-8-sig')
+                    escrever_csv(df, Path(temp_file.name), ';')
                     temp_path = Path(temp_file.name)
                 
                 # Substitui o arquivo original pelo temporário já corrigido.
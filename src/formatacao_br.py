@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Formatação vetorizada de valores monetários e datas no padrão brasileiro, compartilhada
+pelos exportadores. Cada função devolve uma coluna de texto idêntica à produzida pelas
+antigas funções aplicadas célula a célula, que continuam aqui como referência e como
+caminho de fallback para os valores que não passam pelo cálculo vetorizado.
+"""
+import numpy as np
+import pandas as pd
+
+# Acima deste valor (ou perto de um empate no arredondamento) o cálculo em centavos inteiros
+# pode divergir da formatação do Python; esses poucos valores usam a função escalar.
+_LIMITE_VETORIZADO = 1e9
+_MARGEM_EMPATE = 1e-3
+
+# --- REFERÊNCIAS ESCALARES ---
+
+def _moeda_duas_casas_escalar(valor) -> str:
+    if pd.isna(valor): return ''
+    try:
+        valor_float = float(valor)
+        return f'{valor_float:.2f}'.replace('.', ',')
+    except (ValueError, TypeError):
+        return str(valor)
+
+def _moeda_texto_escalar(valor_str):
+    if not isinstance(valor_str, str) or valor_str.strip() == '':
+        return valor_str
+    try:
+        try:
+            valor_float = float(valor_str)
+        except ValueError:
+            cleaned_str = valor_str.strip().replace('.', '').replace(',', '.', 1)
+            valor_float = float(cleaned_str)
+        return f'{valor_float:.2f}'.replace('.', ',')
+    except (ValueError, TypeError):
+        return valor_str
+
+def _moeda_robo_escalar(valor) -> str:
+    if pd.isna(valor): return ''
+    try:
+        valor_float = float(valor)
+        if valor_float == int(valor_float):
+            return str(int(valor_float))
+        else:
+            return f'{valor_float:.2f}'.replace('.', ',')
+    except (ValueError, TypeError):
+        return str(valor)
+
+# --- NÚCLEO VETORIZADO ---
+
+def _mascara_vetorizavel(numeros: np.ndarray) -> np.ndarray:
+    """Valores cujo arredondamento em centavos inteiros é garantidamente igual ao do Python."""
+    with np.errstate(invalid='ignore'):
+        escalados = np.abs(numeros) * 100
+        fracao = escalados - np.floor(escalados)
+        return np.isfinite(numeros) & (np.abs(numeros) < _LIMITE_VETORIZADO) & (np.abs(fracao - 0.5) > _MARGEM_EMPATE)
+
+def _duas_casas(numeros: np.ndarray) -> np.ndarray:
+    """
+    Formata floats (já filtrados por _mascara_vetorizavel) como '1234,56'. Cada valor distinto
+    é formatado uma única vez; zeros ficam de fora da fatoração para preservar o '-0,00'.
+    """
+    resultado = np.where(np.signbit(numeros), '-0,00', '0,00').astype(object)
+    nao_zeros = numeros != 0
+    codigos, unicos = pd.factorize(numeros[nao_zeros])
+    centavos = np.rint(np.abs(unicos) * 100).astype(np.int64)
+    inteiros = (centavos // 100).astype(str)
+    decimais = np.strings.zfill((centavos % 100).astype(str), 2)
+    sinais = np.where(np.signbit(unicos), '-', '')
+    textos = np.strings.add(np.strings.add(sinais, inteiros), np.strings.add(',', decimais)).astype(object)
+    resultado[nao_zeros] = textos[codigos]
+    return resultado
+
+def _inteiros(numeros: np.ndarray) -> np.ndarray:
+    """Formata floats inteiros como texto sem casas decimais ('-0.0' vira '0', como em str(int(x)))."""
+    codigos, unicos = pd.factorize(numeros.astype(np.int64))
+    return unicos.astype(str).astype(object)[codigos]
+
+def _para_float(serie: pd.Series) -> np.ndarray:
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        return serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+def _combinar(serie: pd.Series, resultado: np.ndarray, resolvidos: np.ndarray, funcao_escalar) -> pd.Series:
+    """Aplica a função escalar apenas nas posições que o caminho vetorizado não resolveu."""
+    pendentes = np.flatnonzero(~resolvidos)
+    if len(pendentes):
+        valores = serie.to_numpy(dtype=object)
+        resultado[pendentes] = [funcao_escalar(valores[i]) for i in pendentes]
+    return pd.Series(resultado, index=serie.index, dtype=object)
+
+# --- API PÚBLICA ---
+
+def formatar_moeda(serie: pd.Series) -> pd.Series:
+    """
+    Valor monetário com duas casas e vírgula decimal; nulos viram ''.
+
+    >>> formatar_moeda(pd.Series([1234.5, 0.125, -0.001, None, 'abc'])).tolist()
+    ['1234,50', '0,12', '-0,00', '', 'abc']
+    """
+    numeros = _para_float(serie)
+    nulos = serie.isna().to_numpy()
+    rapidos = _mascara_vetorizavel(numeros) & ~nulos
+    resultado = np.empty(len(serie), dtype=object)
+    resultado[nulos] = ''
+    resultado[rapidos] = _duas_casas(numeros[rapidos])
+    return _combinar(serie, resultado, rapidos | nulos, _moeda_duas_casas_escalar)
+
+def formatar_moeda_texto(serie: pd.Series) -> pd.Series:
+    """
+    Reformata valores lidos como texto ('12.5' ou '1.234,56') com duas casas e vírgula decimal.
+    Nulos, vazios e textos não numéricos são mantidos como estão.
+
+    >>> formatar_moeda_texto(pd.Series(['12.5', '1.234,56', ' ', 'abc', None])).tolist()
+    ['12,50', '1234,56', ' ', 'abc', None]
+    """
+    valores = serie.to_numpy(dtype=object)
+    textos = np.array([isinstance(v, str) and v.strip() != '' for v in valores], dtype=bool)
+    numeros = np.full(len(serie), np.nan)
+    if textos.any():
+        candidatos = serie[textos].astype(str)
+        numeros[textos] = pd.to_numeric(candidatos, errors='coerce').to_numpy(dtype=np.float64)
+        falhas = textos & np.isnan(numeros)
+        if falhas.any():
+            limpos = (serie[falhas].astype(str).str.strip()
+                      .str.replace('.', '', regex=False).str.replace(',', '.', n=1, regex=False))
+            numeros[falhas] = pd.to_numeric(limpos, errors='coerce').to_numpy(dtype=np.float64)
+    rapidos = textos & _mascara_vetorizavel(numeros)
+    resultado = valores.copy()
+    resultado[rapidos] = _duas_casas(numeros[rapidos])
+    return _combinar(serie, resultado, rapidos | ~textos, _moeda_texto_escalar)
+
+def formatar_moeda_robo(serie: pd.Series) -> pd.Series:
+    """
+    Regra do arquivo do robô: inteiros sem casas decimais, demais valores com duas casas.
+
+    >>> formatar_moeda_robo(pd.Series([150.0, 99.9, -0.0, None])).tolist()
+    ['150', '99,90', '0', '']
+    """
+    numeros = _para_float(serie)
+    nulos = serie.isna().to_numpy()
+    with np.errstate(invalid='ignore'):
+        inteiros = np.isfinite(numeros) & (np.abs(numeros) < _LIMITE_VETORIZADO) & (numeros == np.trunc(numeros)) & ~nulos
+    rapidos = _mascara_vetorizavel(numeros) & ~inteiros & ~nulos
+    resultado = np.empty(len(serie), dtype=object)
+    resultado[nulos] = ''
+    resultado[inteiros] = _inteiros(numeros[inteiros])
+    resultado[rapidos] = _duas_casas(numeros[rapidos])
+    return _combinar(serie, resultado, rapidos | inteiros | nulos, _moeda_robo_escalar)
+
+def formatar_datas(serie: pd.Series, formato: str = '%d/%m/%Y') -> pd.Series:
+    """
+    Formata datas (dd/mm/AAAA por padrão) convertendo cada data distinta uma única vez.
+    Valores não reconhecidos como data ficam nulos.
+
+    >>> formatar_datas(pd.Series(pd.to_datetime(['2025-01-31', None, '2025-01-31']))).tolist()
+    ['31/01/2025', nan, '31/01/2025']
+    """
+    if not pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        serie = pd.to_datetime(serie, errors='coerce')
+    codigos, unicos = pd.factorize(serie)
+    textos = np.append(np.asarray(unicos.strftime(formato), dtype=object), np.nan)
+    return pd.Series(textos[codigos], index=serie.index, dtype=object)
@@ -4,137 +4,179 @@ import logging
 from pathlib import Path
 from configparser import ConfigParser
 from datetime import datetime
+from typing import Dict, List, Optional
+from src.formatacao_br import formatar_moeda_robo, formatar_datas
+from src.identificadores import formatar_identificador, DIGITOS_CPF
+from src.data_exporter import exportar_particoes
+from src.manifesto import ManifestoSaida
+from src.exportador_parquet import parquet_habilitado, exportar_parquet, PASTA_PARQUET
 
 logger = logging.getLogger(__name__)
 
-def _formatar_valor_para_robo(valor):
-    if pd.isna(valor): return ''
+COLUNAS_FINAIS_LAYOUT = [
+    'NOME_CLIENTE', 'PRODUTO', 'CPF', 'parcelasEmAtrado', 'dtPrimeiraParcelaAtrasada',
+    'dtSegundaParcelaAtrasada', 'dtTerceiraParcelaAtrasada', 'valorDivida', 'valorMinimo',
+    'valorParcelaMaisAntiga', 'codigoBarrasConta1', 'codigoBarrasConta2', 'codigoBarrasConta3',
+    'CodigoPixConta1', 'CodigoPixConta2', 'CodigoPixConta3', 'valorConta1', 'valorConta2',
+    'valorConta3', 'PerfilPagamento', 'Telefone1', 'telefone2', 'RESP_NEG'
+]
+
+# Coluna de saída -> coluna do DataFrame do robô agregada (primeiro valor não nulo por CPF)
+MAPA_COLUNAS_AGREGADAS = {
+    'NOME_CLIENTE': 'NOME_CLIENTE', 'PRODUTO': 'PRODUTO', 'parcelasEmAtrado': 'parcelasEmAtrado',
+    'valorDivida': 'valorDivida', 'valorParcelaMaisAntiga': 'liquido', 'valorMinimo': 'liquido',
+    'RESP_NEG': 'just', 'Telefone1': 'TELEFONE_01', 'telefone2': 'TELEFONE_02'
+}
+
+# Coluna de saída -> (coluna da fatura, posição da fatura por vencimento)
+MAPA_COLUNAS_FATURAS = {
+    'dtPrimeiraParcelaAtrasada': ('dtvenc_dt', 1), 'dtSegundaParcelaAtrasada': ('dtvenc_dt', 2),
+    'dtTerceiraParcelaAtrasada': ('dtvenc_dt', 3),
+    'codigoBarrasConta1': ('codbarra', 1), 'codigoBarrasConta2': ('codbarra', 2), 'codigoBarrasConta3': ('codbarra', 3),
+    'valorConta1': ('liquido', 1), 'valorConta2': ('liquido', 2), 'valorConta3': ('liquido', 3)
+}
+
+COLUNAS_MOEDA = {'valorDivida', 'valorMinimo', 'valorParcelaMaisAntiga', 'valorConta1', 'valorConta2', 'valorConta3'}
+
+def _ler_colunas_exportacao(config: ConfigParser) -> List[str]:
     try:
-        valor_float = float(valor)
-        if valor_float == int(valor_float):
-            return str(int(valor_float))
-        else:
-            return f'{valor_float:.2f}'.replace('.', ',')
-    except (ValueError, TypeError):
-        return str(valor)
-
-def gerar_arquivo_robo_mestre(df_robo_consolidado: pd.DataFrame, config: ConfigParser, diretorio_alvo: Path):
+        colunas_robo_str = config.get('EXPORT_COLUMNS', 'robo_columns')
+        colunas = [col.strip() for col in colunas_robo_str.split(',') if col.strip()]
+        logger.info(f"Aplicando filtro de exportação para robô. {len([c for c in colunas if c in COLUNAS_FINAIS_LAYOUT])} colunas serão salvas.")
+        return colunas
+    except Exception as e:
+        logger.warning(f"Não foi possível ler a configuração de colunas de exportação para o robô: {e}. Exportando todas as colunas.")
+        return COLUNAS_FINAIS_LAYOUT
+
+def _ler_grupos_horario(config: ConfigParser) -> Dict[str, str]:
+    """Lê as chaves [ROBO] grupos_* e devolve o mapa produto -> horário (ex.: 'EPB' -> '08HRS')."""
+    produto_para_horario = {}
+    if not config.has_section('ROBO'):
+        return produto_para_horario
+    for chave, valor in config.items('ROBO'):
+        if not chave.startswith('grupos_'):
+            continue
+        horario = chave[len('grupos_'):].upper()
+        for produto in (p.strip() for p in valor.split(',') if p.strip()):
+            if produto in produto_para_horario:
+                logger.warning(f"Produto '{produto}' aparece em mais de um grupo do robô. Mantido em '{produto_para_horario[produto]}'.")
+                continue
+            produto_para_horario[produto] = horario
+    return produto_para_horario
+
+def _extrair_faturas(df: pd.DataFrame, col_cpf: str, colunas_fatura: List[str]) -> pd.DataFrame:
+    """
+    Ordena as faturas de cada CPF por vencimento e devolve as três primeiras lado a lado,
+    com colunas (coluna_fatura, posição). Uma única ordenação + cumcount + unstack.
+    """
+    df_faturas = df[[col_cpf] + colunas_fatura].dropna(subset=[col_cpf, 'dtvenc_dt'])
+    if df_faturas.empty:
+        return pd.DataFrame()
+    df_faturas = df_faturas.sort_values(by=[col_cpf, 'dtvenc_dt'], kind='mergesort')
+    posicao = df_faturas.groupby(col_cpf, sort=False).cumcount() + 1
+    df_faturas = df_faturas[posicao.le(3).to_numpy()].assign(posicao=posicao[posicao.le(3)])
+    return df_faturas.set_index([col_cpf, 'posicao'])[colunas_fatura].unstack('posicao')
+
+def _coluna_vazia_tipada(col: str, indice: pd.Index) -> pd.Series:
+    """Coluna sem dados (ex.: terceira fatura inexistente) com o tipo esperado na exportação tipada."""
+    if col in COLUNAS_MOEDA:
+        return pd.Series(float('nan'), index=indice, dtype='float64')
+    if col.startswith('dt'):
+        return pd.Series(pd.NaT, index=indice, dtype='datetime64[ns]')
+    return pd.Series(None, index=indice, dtype=object)
+
+def gerar_arquivo_robo_mestre(df_robo_consolidado: pd.DataFrame, config: ConfigParser, diretorio_alvo: Path, manifesto: Optional[ManifestoSaida] = None,
+                              data_referencia: Optional[datetime] = None):
     if df_robo_consolidado.empty:
         logger.warning("DataFrame consolidado do robô está vazio. Arquivos não serão gerados.")
         return
-    
+
     logger.info("--- Iniciando Geração do Mailing Mestre do Robô (Consolidado) ---")
-    
-    col_cpf_padrao = 'CPF' 
+
+    col_cpf_padrao = 'CPF'
     col_vencimento = config.get('SOURCE_COLUMNS', 'vencimento_fatura').lower()
-    
-    df_processado = df_robo_consolidado.copy()
-    
-    if col_vencimento not in df_processado.columns:
+
+    if col_vencimento not in df_robo_consolidado.columns:
         logger.error(f"Coluna de vencimento '{col_vencimento}' definida no config.ini não foi encontrada. Abortando geração de arquivo robô.")
         return
-    if col_cpf_padrao not in df_processado.columns:
+    if col_cpf_padrao not in df_robo_consolidado.columns:
         logger.error(f"Coluna de CPF padronizada '{col_cpf_padrao}' não foi encontrada apos o pipeline. Abortando geração de arquivo robô.")
         return
 
-    df_processado['dtvenc_dt'] = pd.to_datetime(df_processado[col_vencimento], errors='coerce', dayfirst=True)
-    df_valid_dates = df_processado.dropna(subset=['dtvenc_dt']).copy()
-    
-    df_valid_dates = df_valid_dates.sort_values(by=[col_cpf_padrao, 'dtvenc_dt'], ascending=True)
-    df_valid_dates['rank'] = df_valid_dates.groupby(col_cpf_padrao).cumcount() + 1
-    
-    df_faturas = df_valid_dates[df_valid_dates['rank'].isin([1, 2, 3])].copy()
-    
-    df_pivot = pd.DataFrame()
-    if not df_faturas.empty:
-        df_pivot = df_faturas.pivot_table(
-            index=col_cpf_padrao, columns='rank',
-            values=['dtvenc_dt', 'liquido', 'codbarra'], aggfunc='first'
-        )
-        df_pivot.columns = [f'{val}_{rank}' for val, rank in df_pivot.columns]
-        df_pivot.reset_index(inplace=True)
-
-    df_agregado = df_processado.groupby(col_cpf_padrao).first().reset_index()
-    if not df_pivot.empty:
-        df_agregado = pd.merge(df_agregado, df_pivot, on=col_cpf_padrao, how='left')
-
-    # 1
-    colunas_finais_layout = [
-        'NOME_CLIENTE', 'PRODUTO', 'CPF', 'parcelasEmAtrado', 'dtPrimeiraParcelaAtrasada',
-        'dtSegundaParcelaAtrasada', 'dtTerceiraParcelaAtrasada', 'valorDivida', 'valorMinimo',
-        'valorParcelaMaisAntiga', 'codigoBarrasConta1', 'codigoBarrasConta2', 'codigoBarrasConta3',
-        'CodigoPixConta1', 'CodigoPixConta2', 'CodigoPixConta3', 'valorConta1', 'valorConta2',
-        'valorConta3', 'PerfilPagamento', 'Telefone1', 'telefone2', 'RESP_NEG'
-    ]
-    df_final = pd.DataFrame()
-
-    df_final['NOME_CLIENTE'] = df_agregado.get('NOME_CLIENTE')
-    df_final['PRODUTO'] = df_agregado.get('PRODUTO')
-    df_final['CPF'] = df_agregado.get('CPF')
-    df_final['parcelasEmAtrado'] = df_agregado.get('parcelasEmAtrado')
-
-    for i in range(1, 4):
-        dt_col = f'dtvenc_dt_{i}'
-        out_col = {1: 'dtPrimeiraParcelaAtrasada', 2: 'dtSegundaParcelaAtrasada', 3: 'dtTerceiraParcelaAtrasada'}[i]
-        if dt_col in df_agregado.columns:
-            date_series = pd.to_datetime(df_agregado[dt_col], errors='coerce')
-            df_final[out_col] = date_series.dt.strftime('%d/%m/%Y')
-
-    for i in range(1, 4):
-        cb_col = f'codbarra_{i}'
-        out_col = f'codigoBarrasConta{i}'
-        if cb_col in df_agregado.columns:
-            df_final[out_col] = df_agregado[cb_col]
-
-    df_final['valorDivida'] = df_agregado['valorDivida'].apply(_formatar_valor_para_robo)
-    df_final['valorParcelaMaisAntiga'] = df_agregado['liquido'].apply(_formatar_valor_para_robo)
-
-    for i in range(1, 4):
-        liq_col = f'liquido_{i}'
-        out_col = f'valorConta{i}'
-        if liq_col in df_agregado.columns:
-            df_final[out_col] = df_agregado[liq_col].apply(_formatar_valor_para_robo)
-
-    df_final['valorMinimo'] = df_agregado['liquido'].apply(_formatar_valor_para_robo)
-    df_final['RESP_NEG'] = df_agregado.get('just')
-    df_final['Telefone1'] = df_agregado.get('TELEFONE_01')
-    df_final['telefone2'] = df_agregado.get('TELEFONE_02')
-    df_final['PerfilPagamento'] = 'VISTA'
-
-    for col in colunas_finais_layout:
-        if col not in df_final.columns:
-            df_final[col] = ''
-    df_final = df_final.fillna('')
-    
-    try:
-        colunas_robo_str = config.get('EXPORT_COLUMNS', 'robo_columns')
-        colunas_finais_exportacao = [col.strip() for col in colunas_robo_str.split(',') if col.strip()]
-        
-        colunas_presentes = [col for col in colunas_finais_exportacao if col in df_final.columns]
-        df_final_export = df_final[colunas_presentes]
-        logger.info(f"Aplicando filtro de exportação para robô. {len(colunas_presentes)} colunas serão salvas.")
-    except Exception as e:
-        logger.warning(f"Não foi possível ler a configuração de colunas de exportação para o robô: {e}. Exportando todas as colunas.")
-        df_final_export = df_final[colunas_finais_layout]
-
-    grupos_produto = {
-        "08HRS": config.get('ROBO', 'grupos_08hrs', fallback='').split(','),
-        "09HRS": config.get('ROBO', 'grupos_09hrs', fallback='').split(','),
-        "10HRS": config.get('ROBO', 'grupos_10hrs', fallback='').split(',')
-    }
-    now = datetime.now()
+    colunas_exportacao = [col for col in _ler_colunas_exportacao(config) if col in COLUNAS_FINAIS_LAYOUT]
+
+    # Só as colunas efetivamente exportadas são agregadas por CPF
+    colunas_agregadas = list(dict.fromkeys(
+        MAPA_COLUNAS_AGREGADAS[col] for col in colunas_exportacao
+        if col in MAPA_COLUNAS_AGREGADAS and MAPA_COLUNAS_AGREGADAS[col] in df_robo_consolidado.columns
+    ))
+    df_agregado = df_robo_consolidado[[col_cpf_padrao] + colunas_agregadas].groupby(col_cpf_padrao).first()
+
+    colunas_fatura = list(dict.fromkeys(
+        MAPA_COLUNAS_FATURAS[col][0] for col in colunas_exportacao if col in MAPA_COLUNAS_FATURAS
+    ))
+    colunas_fatura = [c for c in colunas_fatura if c == 'dtvenc_dt' or c in df_robo_consolidado.columns]
+    df_faturas = pd.DataFrame()
+    if colunas_fatura:
+        vencimentos = df_robo_consolidado[col_vencimento]
+        if not pd.api.types.is_datetime64_any_dtype(vencimentos.dtype):
+            vencimentos = pd.to_datetime(vencimentos, errors='coerce', dayfirst=True)
+        colunas_fatura = list(dict.fromkeys(['dtvenc_dt'] + colunas_fatura))
+        df_base_faturas = df_robo_consolidado[[col_cpf_padrao] + [c for c in colunas_fatura if c != 'dtvenc_dt']].assign(dtvenc_dt=vencimentos)
+        df_faturas = _extrair_faturas(df_base_faturas, col_cpf_padrao, colunas_fatura).reindex(df_agregado.index)
+
+    df_final = pd.DataFrame(index=df_agregado.index)
+    df_tipado = pd.DataFrame(index=df_agregado.index)
+    digitos_cpf = config.getint('EXPORT', 'digitos_cpf', fallback=DIGITOS_CPF)
+    for col in colunas_exportacao:
+        if col == 'CPF':
+            valores = df_agregado.index.to_series()
+        elif col in MAPA_COLUNAS_AGREGADAS and MAPA_COLUNAS_AGREGADAS[col] in df_agregado.columns:
+            valores = df_agregado[MAPA_COLUNAS_AGREGADAS[col]]
+        elif col in MAPA_COLUNAS_FATURAS and MAPA_COLUNAS_FATURAS[col] in df_faturas.columns:
+            valores = df_faturas[MAPA_COLUNAS_FATURAS[col]]
+        elif col == 'PerfilPagamento':
+            valores = 'VISTA'
+        else:
+            valores = ''
+
+        df_tipado[col] = valores if isinstance(valores, pd.Series) or col == 'PerfilPagamento' else _coluna_vazia_tipada(col, df_agregado.index)
+        if isinstance(valores, pd.Series):
+            if col in COLUNAS_MOEDA:
+                valores = formatar_moeda_robo(valores)
+            elif col.startswith('dt'):
+                valores = formatar_datas(valores)
+            elif col == 'CPF':
+                valores = formatar_identificador(valores, digitos_cpf)
+        df_final[col] = valores
+    df_final_export = df_final.reset_index(drop=True).fillna('')
+
+    # Separa os registros por grupo de horário em uma única passada
+    produto_para_horario = _ler_grupos_horario(config)
+    now = data_referencia or datetime.now()
     prefixo_robo = config.get('ROBO', 'output_file_prefix', fallback='Telecobranca_TOI_Robo_')
-
-    for horario, produtos in grupos_produto.items():
-        produtos = [p.strip() for p in produtos if p.strip()]
-        if not produtos: continue
-
-        df_grupo = df_final_export[df_final_export['PRODUTO'].isin(produtos)]
-        if df_grupo.empty: continue
-            
-        nome_arquivo = f"{prefixo_robo}{horario}_{now.strftime('%H%M%S')}_{now.strftime('%d%m%Y')}.csv"
-        caminho_saida = diretorio_alvo / nome_arquivo
-        logger.info(f"Exportando {len(df_grupo)} registros do robô (consolidado) para: {caminho_saida}")
-        df_grupo.to_csv(caminho_saida, sep='|', encoding='utf-8-sig', index=False, na_rep='')
-        
+    max_workers = config.getint('EXPORT', 'max_workers', fallback=4)
+
+    particoes = []
+    if 'PRODUTO' in df_final_export.columns:
+        horarios = df_final_export['PRODUTO'].map(produto_para_horario)
+        grupos = dict(tuple(df_final_export.groupby(horarios, sort=False)))
+        for horario in dict.fromkeys(produto_para_horario.values()):
+            df_grupo = grupos.get(horario)
+            if df_grupo is None or df_grupo.empty: continue
+            nome_arquivo = f"{prefixo_robo}{horario}_{now.strftime('%H%M%S')}_{now.strftime('%d%m%Y')}.csv"
+            particoes.append((horario, df_grupo, diretorio_alvo / nome_arquivo))
+    else:
+        logger.error("Coluna 'PRODUTO' não está entre as colunas exportadas do robô. Não é possível separar por horário.")
+
+    exportar_particoes(particoes, sep='|', max_workers=max_workers, manifesto=manifesto, tipo='robo')
+
+    if parquet_habilitado(config):
+        # Um único arquivo tipado com a coluna HORARIO no lugar da separação por arquivo
+        df_tipado = df_tipado.reset_index(drop=True)
+        if 'PRODUTO' in df_tipado.columns:
+            df_tipado['HORARIO'] = df_tipado['PRODUTO'].map(produto_para_horario)
+        caminho_parquet = diretorio_alvo / PASTA_PARQUET / f"{prefixo_robo}{now.strftime('%d%m%Y')}.parquet"
+        if exportar_parquet(df_tipado, caminho_parquet) and manifesto is not None:
+            manifesto.registrar(caminho_parquet, 'parquet', 'robo', len(df_tipado), list(df_tipado.columns))
     logger.info("Mailing Mestre do Robô (Consolidado) gerado com sucesso.")
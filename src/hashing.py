@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Hashes de conteúdo compartilhados (arquivos de entrada e seções do config.ini), usados para
+identificar quando uma etapa pode reaproveitar resultados anteriores.
+"""
+import json
+import hashlib
+from pathlib import Path
+from configparser import ConfigParser
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable
+
+TAMANHO_BLOCO = 1024 * 1024
+
+def hash_arquivo(caminho: Path) -> str:
+    """sha256 do arquivo lido em blocos, sem carregá-lo inteiro em memória."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def hash_arquivos(caminhos: Iterable[Path], max_workers: int = 4) -> Dict[Path, str]:
+    """sha256 de vários arquivos em paralelo (o hashlib libera o GIL em blocos grandes)."""
+    caminhos = list(caminhos)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(caminhos) or 1)), thread_name_prefix='hash') as executor:
+        return dict(zip(caminhos, executor.map(hash_arquivo, caminhos)))
+
+def hash_secoes_config(config: ConfigParser, secoes: Iterable[str]) -> str:
+    """Hash estável do conteúdo das seções informadas (seções ausentes entram como vazias)."""
+    conteudo = {
+        secao: dict(sorted(config.items(secao, raw=True))) if config.has_section(secao) else {}
+        for secao in sorted(secoes)
+    }
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def combinar_hashes(*partes: str) -> str:
+    """Combina hashes e textos em uma única chave."""
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
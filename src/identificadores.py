@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Identificadores de cliente (CPF, documento da UC, ID da base de Tabulações) como chaves
+inteiras. Cada coluna é convertida uma única vez, no carregamento, para int64 com máscara de
+nulos (dtype 'Int64' do pandas): deduplicação, agrupamentos, merges e isin passam a comparar
+inteiros, sem a normalização de texto (strip, '.0' do Excel) repetida a cada etapa. A forma
+de texto com zeros à esquerda só é produzida na exportação.
+"""
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DIGITOS_CPF = 11
+# Maior identificador aceito: 18 dígitos cabem em int64 sem perda
+_MAX_DIGITOS = 18
+# Separadores de máscara aceitos no texto (123.456.789-01, 12.345.678/0001-90)
+_SEPARADORES = r'[.\-/\s]'
+
+def para_chave(serie: pd.Series) -> pd.Series:
+    """
+    Converte a coluna em chaves Int64. Valores que não são um inteiro não negativo de até 18
+    dígitos (com ou sem máscara, ou com o '.0' que o Excel acrescenta) viram nulos.
+
+    >>> para_chave(pd.Series(['071.870.804-44', ' 7187080444.0', 'abc', None, 55481506917])).tolist()
+    [7187080444, 7187080444, <NA>, <NA>, 55481506917]
+    """
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        chaves = serie.astype('Int64')
+        return chaves.where(chaves >= 0)
+    if pd.api.types.is_float_dtype(serie.dtype):
+        valores = serie.to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid='ignore'):
+            validos = np.isfinite(valores) & (valores >= 0) & (valores < 10.0 ** _MAX_DIGITOS) & (np.floor(valores) == valores)
+        return pd.Series(pd.arrays.IntegerArray(np.where(validos, valores, 0).astype(np.int64), ~validos), index=serie.index)
+
+    texto = serie.astype('string').str.strip().str.replace(r'^(\d+)\.0+$', r'\1', regex=True).str.replace(_SEPARADORES, '', regex=True)
+    validos = texto.str.fullmatch(rf'\d{{1,{_MAX_DIGITOS}}}').fillna(False).to_numpy(dtype=bool)
+    valores = np.zeros(len(serie), dtype=np.int64)
+    valores[validos] = texto[validos].to_numpy(dtype=object).astype(np.int64)
+    return pd.Series(pd.arrays.IntegerArray(valores, ~validos), index=serie.index)
+
+def converter_colunas(df: pd.DataFrame, colunas, origem: str = '') -> pd.DataFrame:
+    """Converte as colunas presentes do DataFrame em chaves (no próprio DataFrame), avisando dos valores descartados."""
+    for coluna in colunas:
+        if coluna not in df.columns:
+            continue
+        chaves = para_chave(df[coluna])
+        invalidos = int((chaves.isna() & df[coluna].notna()).sum())
+        if invalidos:
+            logger.warning(f"Coluna '{coluna}'{f' ({origem})' if origem else ''}: {invalidos} valores não numéricos tratados como nulos.")
+        df[coluna] = chaves
+    return df
+
+def formatar_identificador(serie: pd.Series, digitos: int = DIGITOS_CPF) -> pd.Series:
+    """
+    Forma de texto para exportação: zeros à esquerda até 'digitos' (0 não completa) e vazio
+    para nulos. Colunas que não são inteiras (já em texto) são devolvidas sem alteração.
+
+    >>> formatar_identificador(para_chave(pd.Series([7187080444, None]))).tolist()
+    ['07187080444', '']
+    """
+    if not pd.api.types.is_integer_dtype(serie.dtype):
+        return serie
+    texto = serie.astype('string')
+    if digitos > 0:
+        texto = texto.str.zfill(digitos)
+    return texto.fillna('').astype(object)
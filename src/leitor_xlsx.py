@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura direta do XML de arquivos .xlsx para ferramentas que só precisam de parte da planilha.
+O pd.read_excel (openpyxl) carrega o workbook inteiro mesmo com nrows=0; aqui o cabeçalho é
+lido só da primeira linha do XML da aba, e das strings compartilhadas apenas até o maior
+índice usado nele. A projeção de colunas percorre a aba em streaming e só guarda as células
+das colunas pedidas.
+"""
+import re
+import zipfile
+import logging
+import posixpath
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+NS_PLANILHA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_RELACOES = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PACOTE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_REF_CELULA = re.compile(r'([A-Z]+)')
+
+def _indice_coluna(referencia: str) -> int:
+    """
+    Índice (base 0) da coluna de uma referência de célula.
+
+    >>> _indice_coluna('A1'), _indice_coluna('Z9'), _indice_coluna('AB12')
+    (0, 25, 27)
+    """
+    indice = 0
+    for letra in _REF_CELULA.match(referencia).group(1):
+        indice = indice * 26 + (ord(letra) - ord('A') + 1)
+    return indice - 1
+
+def _caminho_aba(zf: zipfile.ZipFile, aba: int = 0) -> str:
+    """Caminho, dentro do zip, do XML da aba de posição 'aba' (na ordem do workbook)."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    id_relacao = workbook.find(f'{NS_PLANILHA}sheets')[aba].get(f'{NS_RELACOES}id')
+    relacoes = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    alvo = next(r.get('Target') for r in relacoes.iter(f'{NS_PACOTE}Relationship') if r.get('Id') == id_relacao)
+    # O alvo pode ser absoluto ('/xl/worksheets/sheet1.xml') ou relativo à pasta 'xl'
+    return alvo.lstrip('/') if alvo.startswith('/') else posixpath.normpath(posixpath.join('xl', alvo))
+
+def _texto_rico(elemento: ET.Element) -> str:
+    """Texto de um <si>/<is>, concatenando os trechos formatados (<r>) e ignorando a fonética (<rPh>)."""
+    partes = []
+    for filho in elemento:
+        if filho.tag == f'{NS_PLANILHA}t':
+            partes.append(filho.text or '')
+        elif filho.tag == f'{NS_PLANILHA}r':
+            partes.extend(t.text or '' for t in filho.iter(f'{NS_PLANILHA}t'))
+    return ''.join(partes)
+
+def _strings_compartilhadas(zf: zipfile.ZipFile, indices: set) -> Dict[int, str]:
+    """Lê as strings compartilhadas apenas até o maior índice pedido."""
+    if not indices or 'xl/sharedStrings.xml' not in zf.NameToInfo:
+        return {}
+    maior, encontradas, posicao = max(indices), {}, 0
+    with zf.open('xl/sharedStrings.xml') as f:
+        for _, elemento in ET.iterparse(f, events=('end',)):
+            if elemento.tag != f'{NS_PLANILHA}si':
+                continue
+            if posicao in indices:
+                encontradas[posicao] = _texto_rico(elemento)
+            elemento.clear()
+            if posicao >= maior:
+                break
+            posicao += 1
+    return encontradas
+
+def _valor_bruto(celula: ET.Element):
+    """Valor de uma célula de dados, sem formatação: texto, float, bool ou ('s', índice) para strings compartilhadas."""
+    tipo = celula.get('t')
+    if tipo == 'inlineStr':
+        interno = celula.find(f'{NS_PLANILHA}is')
+        return _texto_rico(interno) if interno is not None else None
+    valor = celula.findtext(f'{NS_PLANILHA}v')
+    if valor is None:
+        return None
+    if tipo == 's':
+        return ('s', int(valor))
+    if tipo in (None, 'n'):
+        return float(valor)
+    if tipo == 'b':
+        return valor == '1'
+    return valor
+
+def _valor_celula(celula: ET.Element, compartilhadas: Dict[int, str]) -> Optional[str]:
+    tipo = celula.get('t')
+    if tipo == 'inlineStr':
+        interno = celula.find(f'{NS_PLANILHA}is')
+        return _texto_rico(interno) if interno is not None else None
+    valor = celula.findtext(f'{NS_PLANILHA}v')
+    if valor is None:
+        return None
+    if tipo == 's':
+        return compartilhadas.get(int(valor))
+    if tipo in (None, 'n'):
+        # Números no cabeçalho viram texto como o pandas os exibiria (2023, e não 2023.0)
+        numero = float(valor)
+        return str(int(numero)) if numero.is_integer() else str(numero)
+    return valor
+
+def _nomes_como_pandas(valores: List[Optional[str]]) -> List[str]:
+    """
+    Aplica as regras de nome do pandas: células vazias viram 'Unnamed: N' e repetidos ganham '.1', '.2'...
+
+    >>> _nomes_como_pandas(['a', None, 'a', 'b'])
+    ['a', 'Unnamed: 1', 'a.1', 'b']
+    """
+    nomes, vistos = [], {}
+    for posicao, valor in enumerate(valores):
+        nome = valor if valor not in (None, '') else f"Unnamed: {posicao}"
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f"{nome}.{vistos[nome]}"
+        vistos.setdefault(nome, 0)
+        nomes.append(nome)
+    return nomes
+
+def _ler_cabecalho_xml(caminho: Path, aba: int) -> List[str]:
+    with zipfile.ZipFile(caminho) as zf:
+        celulas = []
+        with zf.open(_caminho_aba(zf, aba)) as f:
+            for _, elemento in ET.iterparse(f, events=('end',)):
+                if elemento.tag == f'{NS_PLANILHA}row':
+                    celulas = list(elemento.iter(f'{NS_PLANILHA}c'))
+                    break
+        indices = {int(c.findtext(f'{NS_PLANILHA}v')) for c in celulas if c.get('t') == 's' and c.findtext(f'{NS_PLANILHA}v')}
+        compartilhadas = _strings_compartilhadas(zf, indices)
+    valores: List[Optional[str]] = []
+    for posicao, celula in enumerate(celulas):
+        indice = _indice_coluna(celula.get('r')) if celula.get('r') else posicao
+        valores.extend([None] * (indice - len(valores)))
+        valores.append(_valor_celula(celula, compartilhadas))
+    # Células vazias no fim da linha não são colunas
+    while valores and valores[-1] in (None, ''):
+        valores.pop()
+    return _nomes_como_pandas(valores)
+
+def ler_colunas_xlsx(caminho: Path, colunas: Iterable[str], aba: int = 0) -> Dict[str, list]:
+    """
+    Valores (linha a linha, na ordem da aba) apenas das colunas pedidas, identificadas pelo nome
+    no cabeçalho. Números vêm como float e datas não são convertidas: serve para colunas de texto
+    e de códigos. Colunas inexistentes no cabeçalho não aparecem no resultado.
+    """
+    cabecalho = ler_cabecalho_xlsx(caminho, aba)
+    alvo = {cabecalho.index(nome): nome for nome in colunas if nome in cabecalho}
+    valores = {nome: [] for nome in alvo.values()}
+    if not alvo:
+        return valores
+    with zipfile.ZipFile(caminho) as zf:
+        linha_atual = 0
+        with zf.open(_caminho_aba(zf, aba)) as f:
+            for _, elemento in ET.iterparse(f, events=('end',)):
+                if elemento.tag != f'{NS_PLANILHA}row':
+                    continue
+                numero = int(elemento.get('r', linha_atual + 1))
+                if numero > 1:
+                    # Linhas ausentes no XML (totalmente vazias) viram None, mantendo o alinhamento
+                    for lista in valores.values():
+                        lista.extend([None] * (numero - 2 - len(lista)))
+                    celulas = {}
+                    for posicao, celula in enumerate(elemento.iter(f'{NS_PLANILHA}c')):
+                        indice = _indice_coluna(celula.get('r')) if celula.get('r') else posicao
+                        if indice in alvo:
+                            celulas[indice] = _valor_bruto(celula)
+                    for indice, nome in alvo.items():
+                        valores[nome].append(celulas.get(indice))
+                linha_atual = numero
+                elemento.clear()
+        indices = {v[1] for lista in valores.values() for v in lista if isinstance(v, tuple)}
+        compartilhadas = _strings_compartilhadas(zf, indices)
+    for lista in valores.values():
+        for i, valor in enumerate(lista):
+            if isinstance(valor, tuple):
+                lista[i] = compartilhadas.get(valor[1])
+    return valores
+
+def ler_cabecalho_xlsx(caminho: Path, aba: int = 0) -> List[str]:
+    """
+    Nomes das colunas da aba (primeira linha), como o pd.read_excel devolveria. Se o XML não
+    puder ser interpretado diretamente, recorre ao pandas.
+    """
+    try:
+        return _ler_cabecalho_xml(caminho, aba)
+    except (KeyError, IndexError, StopIteration, ValueError, ET.ParseError, zipfile.BadZipFile) as e:
+        logger.debug("Leitura direta do cabeçalho de '%s' falhou (%s); usando o pandas.", caminho.name, e)
+        # Importado só aqui: as ferramentas de linha de comando não pagam o import do pandas à toa
+        import pandas as pd
+        return [str(coluna) for coluna in pd.read_excel(caminho, sheet_name=aba, nrows=0).columns]
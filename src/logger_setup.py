@@ -1,8 +1,23 @@
 # -*- coding: utf-8 -*-
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import glob
+import json
+import time
+import queue
+import atexit
+import statistics
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+_listener = None
+_estagio_atual = None
+# O serviço configura o logger a cada pedido: o encerramento é registrado no atexit uma única vez
+_encerramento_registrado = False
 
 # 1. AJUSTE: Classe ExecutionReporter adicionada para gerar o relatório final.
 class ExecutionReporter:
@@ -10,6 +25,39 @@ class ExecutionReporter:
     def __init__(self):
         self.steps = []
         self.attention_points = []
+        self.stages = {}
+        self.performance_lines = []
+        self.profile_lines = []
+        # Perfilador opcional (src.perfilador), avisado a cada troca de estágio
+        self.perfilador = None
+
+    @contextmanager
+    def medir_estagio(self, nome: str):
+        """
+        Mede a duração de um estágio. O dicionário devolvido aceita a chave 'linhas' para que
+        a vazão (linhas por segundo) também seja registrada.
+        """
+        global _estagio_atual
+        estagio = {'linhas': None}
+        estagio_anterior, _estagio_atual = _estagio_atual, nome
+        if self.perfilador is not None:
+            self.perfilador.entrar_estagio(nome)
+        inicio = time.perf_counter()
+        try:
+            yield estagio
+        finally:
+            segundos = time.perf_counter() - inicio
+            linhas = estagio.get('linhas')
+            self.stages[nome] = {
+                'segundos': round(segundos, 4),
+                'linhas': linhas,
+                'linhas_por_segundo': round(linhas / segundos, 1) if linhas and segundos > 0 else None
+            }
+            logger.info("Estágio '%s' concluído em %.2fs.", nome, segundos,
+                        extra={'linhas': linhas, 'duracao': round(segundos, 4)})
+            _estagio_atual = estagio_anterior
+            if self.perfilador is not None:
+                self.perfilador.sair_estagio(estagio_anterior)
 
     def add_step(self, name, initial_count, final_count, message):
         removed = initial_count - final_count
@@ -24,6 +72,35 @@ class ExecutionReporter:
     def add_attention_point(self, source, message):
         self.attention_points.append(f"- {source.upper()}: {message}")
 
+    def analisar_desempenho(self, historico: List[dict], limite_percentual: float, duracao_minima: float = 1.0):
+        """
+        Compara a duração e a vazão de cada estágio com a mediana das execuções do histórico.
+        Desvios acima de 'limite_percentual' viram pontos de atenção. Estágios mais curtos que
+        'duracao_minima' segundos (na execução atual e na mediana) são ignorados, por serem ruído.
+        """
+        if not historico:
+            self.performance_lines.append("- Sem histórico de execuções para comparar o desempenho.")
+            return
+        for nome, atual in self.stages.items():
+            anteriores = [e['estagios'][nome] for e in historico if nome in e.get('estagios', {})]
+            duracoes = [a['segundos'] for a in anteriores if a.get('segundos') is not None]
+            if not duracoes:
+                continue
+            mediana = statistics.median(duracoes)
+            if max(mediana, atual['segundos']) < duracao_minima or mediana <= 0:
+                continue
+            desvio = (atual['segundos'] - mediana) / mediana * 100
+            linha = f"{nome}: {atual['segundos']:.2f}s vs mediana {mediana:.2f}s de {len(duracoes)} execuções ({desvio:+.1f}%)"
+            vazoes = [a['linhas_por_segundo'] for a in anteriores if a.get('linhas_por_segundo')]
+            desvio_vazao = None
+            if vazoes and atual.get('linhas_por_segundo'):
+                mediana_vazao = statistics.median(vazoes)
+                desvio_vazao = (atual['linhas_por_segundo'] - mediana_vazao) / mediana_vazao * 100
+                linha += f"; {atual['linhas_por_segundo']:,.0f} linhas/s vs {mediana_vazao:,.0f} ({desvio_vazao:+.1f}%)"
+            self.performance_lines.append(f"- {linha}")
+            if abs(desvio) > limite_percentual or (desvio_vazao is not None and abs(desvio_vazao) > limite_percentual):
+                self.add_attention_point("Desempenho", f"Estágio {linha}: desvio acima do limite de {limite_percentual:.0f}%.")
+
     def generate_final_report(self, current_metrics, last_metrics):
         """Gera e loga a tabela de resumo e os pontos de atenção."""
         report = ["\n\n", "_"*80, "\n", "RELATÓRIO DE EXECUÇÃO DA AUTOMAÇÃO"]
@@ -76,11 +153,65 @@ class ExecutionReporter:
             except Exception as e:
                 self.add_attention_point("Análise de Outliers", f"Falha ao comparar métricas: {e}")
 
+        if self.stages:
+            report.append("\n" + "="*25 + " DESEMPENHO POR ESTÁGIO " + "="*25)
+            report.append(f"| {'ESTÁGIO':<40} | {'SEGUNDOS':>12} | {'LINHAS/S':>12} |")
+            report.append(f"| {'-'*40} | {'-'*12} | {'-'*12} |")
+            for nome, estagio in self.stages.items():
+                vazao = f"{estagio['linhas_por_segundo']:,.0f}" if estagio.get('linhas_por_segundo') else '-'
+                report.append(f"| {nome:<40} | {estagio['segundos']:>12.2f} | {vazao:>12} |")
+            report.extend(self.performance_lines)
+
+        if self.profile_lines:
+            report.append("\n" + "="*25 + " PERFIL DE EXECUÇÃO " + "="*25)
+            report.extend(self.profile_lines)
+
         for line in report:
             logging.info(line)
 
-def setup_logger(log_dir: str, log_level: str = 'INFO') -> str:
-    log_format = logging.Formatter(
+class _FiltroEstagio(logging.Filter):
+    """Anexa a cada registro o estágio em execução (definido por ExecutionReporter.medir_estagio)."""
+    def filter(self, record):
+        if not hasattr(record, 'estagio'):
+            record.estagio = _estagio_atual
+        return True
+
+class _QueueHandlerSemFormatacao(QueueHandler):
+    """
+    O QueueHandler padrão formata a mensagem na thread que registrou o log. Como a fila é
+    local ao processo, o registro pode seguir intacto e ser formatado na thread do listener.
+    """
+    def prepare(self, record):
+        return record
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por registro, com estágio, linhas e duração quando informados."""
+    CAMPOS_EXTRAS = ('estagio', 'linhas', 'duracao')
+
+    def format(self, record):
+        entrada = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'modulo': record.module,
+            'linha': record.lineno,
+            'mensagem': record.getMessage(),
+        }
+        for campo in self.CAMPOS_EXTRAS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                entrada[campo] = valor
+        if record.exc_info:
+            entrada['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(entrada, ensure_ascii=False, default=str)
+
+def setup_logger(log_dir: str, log_level: str = 'INFO', log_format: str = 'texto', sufixo: str = '') -> str:
+    """
+    Configura o log da execução. Os módulos só enfileiram os registros; a escrita no arquivo
+    (texto ou JSON lines, conforme 'log_format') e no console acontece numa thread de fundo.
+    'sufixo' distingue os logs de execuções simultâneas (backfill) iniciadas no mesmo segundo.
+    """
+    global _listener, _encerramento_registrado
+    formato_texto = logging.Formatter(
         '%(asctime)s - %(levelname)s - [%(module)s:%(lineno)d] - %(message)s'
     )
     os.makedirs(log_dir, exist_ok=True)
@@ -88,20 +219,56 @@ def setup_logger(log_dir: str, log_level: str = 'INFO') -> str:
     logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
     if logger.hasHandlers():
         logger.handlers.clear()
+    encerrar_logger()
 
     # 2. AJUSTE: Retorna o caminho do arquivo de log da execução.
-    log_file_path = os.path.join(log_dir, f"automacao_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log")
+    extensao = 'jsonl' if log_format.strip().lower() == 'json' else 'log'
+    log_file_path = os.path.join(log_dir, f"automacao_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}{sufixo}.{extensao}")
     
     file_handler = RotatingFileHandler(
         log_file_path, maxBytes=5*1024*1024, backupCount=3, encoding='utf-8'
     )
-    file_handler.setFormatter(log_format)
+    file_handler.setFormatter(FormatadorJson() if extensao == 'jsonl' else formato_texto)
 
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(log_format)
+    console_handler.setFormatter(formato_texto)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    fila = queue.SimpleQueue()
+    queue_handler = _QueueHandlerSemFormatacao(fila)
+    queue_handler.addFilter(_FiltroEstagio())
+    logger.addHandler(queue_handler)
+    _listener = QueueListener(fila, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    if not _encerramento_registrado:
+        atexit.register(encerrar_logger)
+        _encerramento_registrado = True
 
     logging.info("Logger configurado com sucesso.")
     return log_file_path
+
+def descarregar_logs():
+    """Espera a fila de log esvaziar (ex.: antes de copiar o arquivo de log para o arquivamento)."""
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.flush()
+    _listener.start()
+
+def encerrar_logger():
+    """Grava os registros pendentes e encerra a thread de log."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+def arquivos_de_log(run_log_file: str) -> List[str]:
+    """Arquivo de log da execução e seus pedaços rotacionados (.1, .2, ...), do mais antigo ao atual."""
+    rotacionados = sorted(
+        (f for f in glob.glob(glob.escape(run_log_file) + '.*') if f.rsplit('.', 1)[-1].isdigit()),
+        key=lambda f: int(f.rsplit('.', 1)[-1]), reverse=True
+    )
+    return rotacionados + ([run_log_file] if os.path.exists(run_log_file) else [])
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import json
+import hashlib
+import logging
+from pathlib import Path
+from datetime import datetime
+from configparser import ConfigParser
+from typing import Dict, List, Optional
+import pandas as pd
+from src.hashing import hash_secoes_config
+
+logger = logging.getLogger(__name__)
+
+NOME_MANIFESTO = 'manifest.json'
+PASTA_REUTILIZADOS = '.reutilizados'
+# Incrementar sempre que uma mudança de código alterar os bytes gerados para a mesma partição
+VERSAO_MANIFESTO = 1
+
+def assinatura_config(config: ConfigParser) -> str:
+    """Hash estável de todas as seções do config.ini que influenciam o conteúdo das saídas."""
+    return hash_secoes_config(config, [secao for secao in config.sections() if secao != 'PATHS'])
+
+def caminho_manifesto_externo(caminho_arquivo: Path) -> Path:
+    """Manifesto gravado ao lado do arquivo final, para consulta sem abrir o arquivo."""
+    return caminho_arquivo.with_name(caminho_arquivo.name + '.manifest.json')
+
+class ManifestoSaida:
+    """
+    Registra cada arquivo de saída da execução (partição, linhas, colunas e hashes) e permite
+    reaproveitar, do arquivo final anterior, os bytes das partições que não mudaram.
+    """
+    def __init__(self, config: ConfigParser, arquivo_anterior: Optional[Path] = None, manifesto_anterior: Optional[dict] = None):
+        self.assinatura = assinatura_config(config)
+        self.arquivo_anterior = arquivo_anterior
+        self.anterior = {
+            (item.get('tipo'), item.get('particao')): item
+            for item in (manifesto_anterior or {}).get('arquivos', [])
+            if item.get('hash_particao')
+        }
+        self.arquivos: Dict[str, dict] = {}
+        self.reutilizados = 0
+
+    @classmethod
+    def carregar(cls, config: ConfigParser) -> 'ManifestoSaida':
+        """Cria o manifesto da execução atual a partir do manifesto do arquivo final mais recente."""
+        from src.compressor import encontrar_ultimo_arquivo, ler_membro_arquivo
+
+        output_dir = Path(config.get('PATHS', 'output_dir'))
+        prefixo = config.get('COMPRESSOR', 'archive_name_prefix', fallback='mailing_')
+        arquivo_anterior = encontrar_ultimo_arquivo(output_dir, prefixo)
+        if not arquivo_anterior:
+            logger.info("Nenhum arquivo final anterior encontrado. Todas as partições serão geradas.")
+            return cls(config)
+        try:
+            conteudo = ler_membro_arquivo(arquivo_anterior, NOME_MANIFESTO)
+            if conteudo is None:
+                logger.info(f"Arquivo anterior '{arquivo_anterior.name}' não possui manifesto. Todas as partições serão geradas.")
+                return cls(config)
+            manifesto_anterior = json.loads(conteudo.decode('utf-8'))
+        except Exception as e:
+            logger.warning(f"Não foi possível ler o manifesto de '{arquivo_anterior.name}': {e}. Todas as partições serão geradas.")
+            return cls(config)
+        if manifesto_anterior.get('versao') != VERSAO_MANIFESTO:
+            return cls(config)
+        logger.info(f"Manifesto anterior carregado de '{arquivo_anterior.name}'.")
+        return cls(config, arquivo_anterior, manifesto_anterior)
+
+    def hash_particao(self, df: pd.DataFrame) -> str:
+        """Hash do conteúdo da partição antes da serialização, combinado com as colunas e o config."""
+        h = hashlib.sha256()
+        h.update(f"{VERSAO_MANIFESTO}|{self.assinatura}|".encode('utf-8'))
+        h.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return h.hexdigest()
+
+    def registrar(self, caminho: Path, tipo: str, particao: Optional[str] = None, linhas: Optional[int] = None,
+                  colunas: Optional[List[str]] = None, hash_particao: Optional[str] = None, reutilizado: bool = False):
+        self.arquivos[caminho.name] = {
+            'nome': caminho.name, 'tipo': tipo, 'particao': particao, 'linhas': linhas,
+            'colunas': [str(c) for c in colunas] if colunas is not None else None,
+            'hash_particao': hash_particao, 'reutilizado': reutilizado
+        }
+
+    def reutilizar(self, tipo: str, particao: str, hash_particao: str, destino: Path) -> bool:
+        """
+        Se a partição tem o mesmo hash da execução anterior, copia os bytes finais do arquivo
+        anterior para a pasta de reutilizados (fora do alcance das etapas de polimento).
+        """
+        item = self.anterior.get((tipo, particao))
+        if not item or item['hash_particao'] != hash_particao or not self.arquivo_anterior:
+            return False
+        from src.compressor import ler_membro_arquivo
+        try:
+            dados = ler_membro_arquivo(self.arquivo_anterior, item['nome'])
+        except Exception as e:
+            logger.warning(f"Falha ao reaproveitar '{item['nome']}' de '{self.arquivo_anterior.name}': {e}")
+            return False
+        if dados is None or hashlib.sha256(dados).hexdigest() != item.get('sha256'):
+            return False
+        pasta_reutilizados = destino.parent / PASTA_REUTILIZADOS
+        pasta_reutilizados.mkdir(exist_ok=True)
+        (pasta_reutilizados / destino.name).write_bytes(dados)
+        self.registrar(destino, tipo, particao, item.get('linhas'), item.get('colunas'), hash_particao, reutilizado=True)
+        self.reutilizados += 1
+        logger.info("Partição '%s' (%s) inalterada: bytes reaproveitados de '%s' para '%s'.", particao, tipo, self.arquivo_anterior.name, destino.name)
+        return True
+
+    def gerar(self, membros: List[dict], nome_arquivo: str, codec: str) -> bytes:
+        """Monta o JSON final com o sha256 e o tamanho de cada membro calculados durante a compressão."""
+        arquivos = []
+        for membro in membros:
+            item = dict(self.arquivos.get(membro['nome'].split('/')[-1], {'nome': membro['nome'], 'tipo': 'outro'}))
+            item.update({'nome': membro['nome'], 'sha256': membro['sha256'], 'bytes': membro['tamanho']})
+            arquivos.append(item)
+        manifesto = {
+            'versao': VERSAO_MANIFESTO, 'gerado_em': datetime.now().isoformat(), 'arquivo': nome_arquivo,
+            'codec': codec, 'assinatura_config': self.assinatura, 'arquivos': arquivos
+        }
+        return json.dumps(manifesto, indent=4, ensure_ascii=False).encode('utf-8')
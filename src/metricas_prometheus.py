@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Exporta as métricas de cada execução no formato texto do Prometheus, para o coletor
+'textfile' do node-exporter. O arquivo é gravado ao fim de toda execução (sucesso ou falha)
+e substituído de forma atômica, para que uma coleta nunca leia um arquivo pela metade.
+"""
+import os
+import time
+import logging
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from configparser import ConfigParser
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PREFIXO_METRICA = 'mailing_toi'
+
+def _escapar_rotulo(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _formatar_valor(valor) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(int(valor))
+
+class MetricasTexto:
+    """
+    Acumula famílias de métricas e as serializa no formato de exposição do Prometheus.
+
+    >>> m = MetricasTexto()
+    >>> m.adicionar('duracao_segundos', 'gauge', 'Duração.', 1.5, estagio='Exportação')
+    >>> print(m.texto(), end='')
+    # HELP mailing_toi_duracao_segundos Duração.
+    # TYPE mailing_toi_duracao_segundos gauge
+    mailing_toi_duracao_segundos{estagio="Exportação"} 1.5
+    """
+    def __init__(self):
+        self._familias: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def adicionar(self, nome: str, tipo_metrica: str, ajuda: str, valor, **rotulos):
+        if valor is None:
+            return
+        nome = f"{PREFIXO_METRICA}_{nome}"
+        familia = self._familias.setdefault(nome, (tipo_metrica, ajuda, []))
+        texto_rotulos = ','.join(f'{k}="{_escapar_rotulo(v)}"' for k, v in rotulos.items())
+        familia[2].append(f"{nome}{{{texto_rotulos}}} {_formatar_valor(valor)}" if texto_rotulos else f"{nome} {_formatar_valor(valor)}")
+
+    def texto(self) -> str:
+        linhas = []
+        for nome, (tipo, ajuda, amostras) in self._familias.items():
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            linhas.extend(amostras)
+        return '\n'.join(linhas) + '\n'
+
+def _tipo_arquivo(nome: str, config: ConfigParser) -> str:
+    """Classifica um membro do arquivo final pelo prefixo configurado e pela extensão."""
+    nome_base = nome.rsplit('/', 1)[-1]
+    if nome_base.endswith('.parquet'):
+        return 'parquet'
+    if nome_base.endswith(('.log', '.jsonl')) or '.log.' in nome_base or '.jsonl.' in nome_base:
+        return 'log'
+    if nome_base.startswith(config.get('ROBO', 'output_file_prefix', fallback='Telecobranca_TOI_Robo_')):
+        return 'robo'
+    if nome_base.startswith(config.get('SETTINGS', 'output_file_prefix', fallback='Telecobranca_TOI_')):
+        return 'humano'
+    if nome_base.startswith('rejeitados'):
+        return 'rejeitados'
+    return 'outro'
+
+def _timestamp(iso: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(iso).timestamp() if iso else None
+    except ValueError:
+        return None
+
+def montar_metricas(config: ConfigParser, sucesso: bool, inicio: datetime, estagios: dict, etapas: List[dict],
+                    volumetria: dict, resumo_arquivo: Optional[dict], pico_memoria_mb: Optional[float],
+                    ultimo_sucesso: Optional[str]) -> MetricasTexto:
+    """Reúne as métricas da execução (estágios, etapas do process_report, saídas e recursos)."""
+    m = MetricasTexto()
+    agora = time.time()
+    m.adicionar('execucao_sucesso', 'gauge', '1 se a última execução terminou com sucesso, 0 se falhou.', int(sucesso))
+    m.adicionar('execucao_timestamp_segundos', 'gauge', 'Momento (epoch) do fim da última execução.', agora)
+    m.adicionar('execucao_duracao_segundos', 'gauge', 'Duração total da última execução.',
+                round((datetime.now() - inicio).total_seconds(), 3))
+    m.adicionar('ultimo_sucesso_timestamp_segundos', 'gauge', 'Momento (epoch) da última execução bem-sucedida.',
+                agora if sucesso else _timestamp(ultimo_sucesso))
+
+    for nome, estagio in estagios.items():
+        m.adicionar('estagio_duracao_segundos', 'gauge', 'Duração de cada estágio da última execução.',
+                    estagio['segundos'], estagio=nome)
+    for nome, estagio in estagios.items():
+        m.adicionar('estagio_linhas', 'gauge', 'Linhas tratadas por estágio na última execução.',
+                    estagio.get('linhas'), estagio=nome)
+
+    for metrica, chave, ajuda in (('etapa_linhas_entrada', 'initial', 'Linhas na entrada de cada etapa do processamento.'),
+                                  ('etapa_linhas_removidas', 'removed', 'Linhas removidas por cada etapa do processamento.'),
+                                  ('etapa_linhas_saida', 'final', 'Linhas na saída de cada etapa do processamento.')):
+        for etapa in etapas:
+            m.adicionar(metrica, 'gauge', ajuda, etapa.get(chave), etapa=etapa['name'])
+
+    for tipo, chave in (('entrada', 'initial'), ('humano', 'human'), ('robo', 'robot')):
+        m.adicionar('registros', 'gauge', 'Registros carregados e exportados por destino.', volumetria.get(chave), tipo=tipo)
+
+    if resumo_arquivo:
+        quantidade, tamanho = defaultdict(int), defaultdict(int)
+        for membro in resumo_arquivo['membros']:
+            tipo = _tipo_arquivo(membro['nome'], config)
+            quantidade[tipo] += 1
+            tamanho[tipo] += membro['tamanho']
+        for tipo in sorted(quantidade):
+            m.adicionar('arquivos_saida', 'gauge', 'Arquivos de saída gerados, por tipo.', quantidade[tipo], tipo=tipo)
+        for tipo in sorted(tamanho):
+            m.adicionar('arquivos_saida_bytes', 'gauge', 'Tamanho (sem compressão) dos arquivos de saída, por tipo.',
+                        tamanho[tipo], tipo=tipo)
+        m.adicionar('arquivo_final_bytes', 'gauge', 'Tamanho do arquivo comprimido final.', resumo_arquivo['bytes'])
+
+    if pico_memoria_mb:
+        m.adicionar('pico_memoria_bytes', 'gauge', 'Pico de memória residente (RSS) do processo.',
+                    int(pico_memoria_mb * 1024 * 1024))
+    return m
+
+def gravar_textfile(caminho: Path, texto: str):
+    """Grava num temporário da mesma pasta e substitui o destino com os.replace (operação atômica)."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f".{caminho.name}.{os.getpid()}.tmp")
+    try:
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(texto)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+    finally:
+        if temporario.exists():
+            temporario.unlink()
+
+def exportar_metricas(config: ConfigParser, **dados):
+    """
+    Grava o textfile em [METRICAS] arquivo_prometheus (vazio desativa). Falhas aqui nunca
+    interrompem a automação: só geram um aviso no log.
+    """
+    destino = config.get('METRICAS', 'arquivo_prometheus', fallback='').strip()
+    if not destino:
+        return
+    try:
+        gravar_textfile(Path(destino), montar_metricas(config, **dados).texto())
+        logger.info(f"Métricas da execução gravadas em '{destino}'.")
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar as métricas em '{destino}': {e}")
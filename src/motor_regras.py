@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de regras declarativas de filtragem: manter ou remover as linhas cujo valor numa coluna
+pertence a um conjunto, após uma normalização (mojibake, espaços, caixa, acentos).
+
+Cada regra é compilada uma única vez: os valores declarados passam pela mesma normalização
+aplicada aos dados e viram um conjunto de consulta, de modo que as variações de caixa e de
+encoding não precisam ser listadas uma a uma. Na avaliação, a coluna é fatorizada e a
+normalização roda só sobre os valores distintos; a máscara sai dos códigos, vetorizada.
+
+As regras vêm do config.ini:
+- [PRE_FILTROS] (com habilitado = true): mantém só os valores informados de status_instalacao
+  e iu12m, no carregamento;
+- [SCHEMA_MAILING] status_de_bloqueio_para_remover: remove os status de bloqueio, no processamento
+  (depois do cálculo das colunas agregadas, como sempre foi);
+- seções [REGRA:<nome>], com acao, coluna, valores, normalizacao e etapa.
+
+Regras da etapa 'carregamento' são aplicadas pelo data_loader logo após a leitura de cada
+planilha: as linhas descartadas não chegam ao checkpoint nem ao processamento.
+"""
+import logging
+import unicodedata
+from configparser import ConfigParser
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ACOES = ('manter', 'remover')
+ETAPAS = ('carregamento', 'processamento')
+PREFIXO_SECAO = 'REGRA:'
+NORMALIZACAO_PADRAO = ('mojibake', 'espacos', 'minusculas')
+NOME_REGRA_BLOQUEIO = 'status_de_bloqueio'
+
+def corrigir_mojibake(texto: str) -> str:
+    """
+    Tenta corrigir problemas comuns de encoding (Mojibake): UTF-8 lido como latin-1 ou como
+    cp1252 (o caso do 'Ã‡' e do 'Ãƒ' vindos do Excel).
+
+    >>> corrigir_mojibake('AÃ‡ÃƒO JUDICIAL'), corrigir_mojibake('DECISÃ£O'), corrigir_mojibake('AÇÃO JUDICIAL')
+    ('AÇÃO JUDICIAL', 'DECISãO', 'AÇÃO JUDICIAL')
+    """
+    if not isinstance(texto, str):
+        return texto
+    for encoding in ('latin1', 'cp1252'):
+        try:
+            return texto.encode(encoding).decode('utf-8')
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            continue
+    # Se a correção falhar, retorna o texto original
+    return texto
+
+def _sem_acentos(texto: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+NORMALIZACOES = {
+    'mojibake': corrigir_mojibake,
+    'espacos': str.strip,
+    'minusculas': str.lower,
+    'maiusculas': str.upper,
+    'acentos': _sem_acentos,
+}
+
+def _lista(valor: str) -> List[str]:
+    """Itens de uma chave multilinha do config.ini (um por linha)."""
+    return [item.strip() for item in valor.split('\n') if item.strip()]
+
+class Regra:
+    """
+    Uma regra compilada.
+
+    >>> regra = Regra('bloqueio', 'remover', 'bloq', ['Ação Judicial'])
+    >>> sorted(regra.conjunto), regra.corresponde('  AÃ‡ÃƒO JUDICIAL '), regra.corresponde('Outro')
+    (['ação judicial'], True, False)
+    """
+    def __init__(self, nome: str, acao: str, coluna: str, valores: Iterable[str],
+                 normalizacao: Iterable[str] = NORMALIZACAO_PADRAO, etapa: str = 'carregamento'):
+        if acao not in ACOES:
+            raise ValueError(f"Regra '{nome}': ação '{acao}' inválida (use {', '.join(ACOES)}).")
+        if etapa not in ETAPAS:
+            raise ValueError(f"Regra '{nome}': etapa '{etapa}' inválida (use {', '.join(ETAPAS)}).")
+        desconhecidas = [n for n in normalizacao if n not in NORMALIZACOES]
+        if desconhecidas:
+            raise ValueError(f"Regra '{nome}': normalização desconhecida {desconhecidas} (use {', '.join(NORMALIZACOES)}).")
+        self.nome, self.acao, self.coluna, self.etapa = nome, acao, coluna.strip().lower(), etapa
+        self.normalizacao = list(normalizacao)
+        self.conjunto = frozenset(self.normalizar(str(v)) for v in valores)
+        if not self.conjunto:
+            raise ValueError(f"Regra '{nome}': nenhum valor informado.")
+
+    def normalizar(self, texto: str) -> str:
+        for nome in self.normalizacao:
+            texto = NORMALIZACOES[nome](texto)
+        return texto
+
+    def corresponde(self, valor) -> bool:
+        return self.normalizar(str(valor)) in self.conjunto
+
+    def descricao(self) -> str:
+        return f"{self.acao} '{self.coluna}' em {len(self.conjunto)} valor(es)"
+
+    def correspondencias(self, serie):
+        """
+        Máscara (numpy) das linhas cujo valor normalizado está no conjunto. Nulos são avaliados
+        como o texto 'nan', como faria um astype(str) da coluna.
+        """
+        import numpy as np
+        import pandas as pd
+        codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+        # Uma posição extra no fim para os nulos: o código -1 indexa justamente ela
+        tabela = np.fromiter((self.corresponde(v) for v in unicos), dtype=bool, count=len(unicos))
+        tabela = np.append(tabela, self.corresponde('nan'))
+        return tabela[codigos]
+
+    def linhas_removidas(self, df):
+        """Máscara das linhas que a regra descarta, ou None se a coluna não existir no DataFrame."""
+        if self.coluna not in df.columns:
+            return None
+        correspondem = self.correspondencias(df[self.coluna])
+        return correspondem if self.acao == 'remover' else ~correspondem
+
+def regra_status_bloqueio(config: ConfigParser) -> Optional[Regra]:
+    """Regra de [SCHEMA_MAILING] status_de_bloqueio_para_remover (também usada pela auditoria do laudo.py)."""
+    status_bloqueio = _lista(config.get('SCHEMA_MAILING', 'status_de_bloqueio_para_remover', fallback=''))
+    if not status_bloqueio:
+        return None
+    coluna = config.get('SOURCE_COLUMNS', 'bloqueio', fallback='bloq')
+    return Regra(NOME_REGRA_BLOQUEIO, 'remover', coluna, status_bloqueio, NORMALIZACAO_PADRAO, 'processamento')
+
+def regras_do_config(config: ConfigParser, etapa: Optional[str] = None) -> List[Regra]:
+    """Regras declaradas no config.ini (todas, ou só as da etapa informada), na ordem de declaração."""
+    regras = []
+    if config.getboolean('PRE_FILTROS', 'habilitado', fallback=False):
+        normalizacao = ('espacos', 'minusculas')
+        for chave, coluna_origem in (('valor_status_instalacao_manter', 'status_instalacao'), ('valor_iu12m_manter', 'iu12m')):
+            valores = _lista(config.get('PRE_FILTROS', chave, fallback=''))
+            if valores:
+                coluna = config.get('SOURCE_COLUMNS', coluna_origem, fallback=coluna_origem)
+                regras.append(Regra(f"pre_filtro_{coluna_origem}", 'manter', coluna, valores, normalizacao, 'carregamento'))
+
+    regra_bloqueio = regra_status_bloqueio(config)
+    if regra_bloqueio is not None:
+        regras.append(regra_bloqueio)
+
+    for secao in secoes_de_regras(config):
+        nome = secao[len(PREFIXO_SECAO):].strip()
+        for chave in ('acao', 'coluna', 'valores'):
+            if not config.has_option(secao, chave):
+                raise ValueError(f"Chave obrigatória '{chave}' não encontrada na seção '[{secao}]' do config.ini")
+        normalizacao = [n.strip() for n in config.get(secao, 'normalizacao', fallback=','.join(NORMALIZACAO_PADRAO)).split(',') if n.strip()]
+        regras.append(Regra(
+            nome, config.get(secao, 'acao').strip().lower(), config.get(secao, 'coluna'), _lista(config.get(secao, 'valores')),
+            normalizacao, config.get(secao, 'etapa', fallback='carregamento').strip().lower()
+        ))
+    return [r for r in regras if etapa is None or r.etapa == etapa]
+
+def secoes_de_regras(config: ConfigParser) -> List[str]:
+    """Seções [REGRA:<nome>] do config.ini (entram nas chaves de checkpoint dos estágios)."""
+    return [secao for secao in config.sections() if secao.startswith(PREFIXO_SECAO)]
+
+def aplicar_regras(df, regras: Iterable[Regra], origem: str = '') -> Tuple[object, List[dict]]:
+    """
+    Avalia todas as regras sobre o DataFrame e filtra uma única vez. Cada regra conta só as
+    linhas que ela removeu além das regras anteriores. Devolve (DataFrame filtrado, relatório).
+    """
+    import numpy as np
+    relatorio, removidas = [], np.zeros(len(df), dtype=bool)
+    for regra in regras:
+        mascara = regra.linhas_removidas(df)
+        if mascara is None:
+            logger.warning(f"Regra '{regra.nome}': coluna '{regra.coluna}' não encontrada{f' em {origem}' if origem else ''}. Regra pulada.")
+            relatorio.append({'regra': regra.nome, 'descricao': regra.descricao(), 'removidos': 0, 'aplicada': False})
+            continue
+        novas = mascara & ~removidas
+        removidas |= novas
+        relatorio.append({'regra': regra.nome, 'descricao': regra.descricao(), 'removidos': int(novas.sum()), 'aplicada': True})
+    if removidas.any():
+        df = df[~removidas]
+    return df, relatorio
+
+def mensagem_regra(item: dict) -> str:
+    """Texto de uma linha do relatório de aplicar_regras, para o relatório da execução."""
+    if not item['aplicada']:
+        return f"Regra '{item['regra']}' ({item['descricao']}): coluna não encontrada. Regra pulada."
+    return f"Regra '{item['regra']}' ({item['descricao']}): {item['removidos']} registros removidos."
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Perfilamento opcional de uma execução completa (--profile ou [PERFIL] modo). O tempo é
+atribuído ao estágio em execução (ExecutionReporter.medir_estagio avisa o perfilador a cada
+troca de estágio), e não só à função:
+
+- cprofile: um cProfile por estágio, gravado em '<estágio>.pstats' e somado em 'completo.pstats'.
+  Mede apenas a thread principal (as exportações em paralelo aparecem como espera).
+- sampling: uma thread amostra a pilha de todas as threads a cada 'intervalo_ms' e grava
+  'amostras.collapsed' (formato do flamegraph.pl/speedscope), com o estágio como raiz de cada pilha.
+
+Desativado, nenhum perfilador é criado e medir_estagio apenas confere um atributo None.
+"""
+import sys
+import time
+import cProfile
+import pstats
+import logging
+import threading
+from pathlib import Path
+from collections import Counter
+from configparser import ConfigParser
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODOS_SUPORTADOS = ('cprofile', 'sampling')
+FORA_DE_ESTAGIO = '(fora de estágio)'
+# Folhas de pilha de threads ociosas (pool sem tarefa, listener do log, espera por resultado)
+FOLHAS_OCIOSAS = {'threading:wait', 'threading:_wait_for_tstate_lock', 'thread:_worker', 'handlers:dequeue'}
+
+def _nome_arquivo(estagio: str) -> str:
+    return ''.join(c if c.isalnum() else '_' for c in estagio).strip('_') or 'estagio'
+
+class _Perfilador:
+    modo = ''
+
+    def __init__(self, top_n: int = 15):
+        self.top_n = top_n
+
+    def iniciar(self): ...
+    def entrar_estagio(self, nome: str): ...
+    def sair_estagio(self, anterior: Optional[str]): ...
+    def parar(self): ...
+    def _gravar(self, pasta: Path): ...
+
+    def _pontos_quentes(self) -> Iterable[Tuple[str, str, float]]:
+        """(estágio, função, segundos de tempo próprio)."""
+        return []
+
+    def resumo(self) -> List[str]:
+        """As 'top_n' combinações estágio/função com mais tempo próprio."""
+        pontos = sorted(self._pontos_quentes(), key=lambda p: p[2], reverse=True)
+        total = sum(p[2] for p in pontos)
+        linhas = [f"- Modo '{self.modo}', {total:.2f}s atribuídos. Top {self.top_n} por tempo próprio:"]
+        for estagio, funcao, segundos in pontos[:self.top_n]:
+            percentual = segundos / total * 100 if total else 0.0
+            linhas.append(f"  [{estagio}] {funcao}: {segundos:.3f}s ({percentual:.1f}%)")
+        return linhas
+
+    def finalizar(self, pasta: Path) -> List[str]:
+        """Para o perfilador, grava os artefatos em 'pasta' e devolve o resumo para o relatório."""
+        self.parar()
+        try:
+            pasta.mkdir(parents=True, exist_ok=True)
+            self._gravar(pasta)
+            logger.info(f"Perfil da execução ({self.modo}) gravado em '{pasta}'.")
+            return self.resumo() + [f"- Artefatos em '{pasta}'."]
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o perfil da execução em '{pasta}': {e}")
+            return [f"- Falha ao gravar o perfil: {e}"]
+
+class PerfiladorCProfile(_Perfilador):
+    """Determinístico: troca de cProfile.Profile a cada mudança de estágio."""
+    modo = 'cprofile'
+
+    def __init__(self, top_n: int = 15):
+        super().__init__(top_n)
+        self._perfis = {}
+        self._ativo = None
+        self._stats = None
+
+    def _ativar(self, estagio: str):
+        if self._ativo is not None:
+            self._ativo.disable()
+        self._ativo = self._perfis.setdefault(estagio, cProfile.Profile())
+        self._ativo.enable()
+
+    def iniciar(self):
+        self._ativar(FORA_DE_ESTAGIO)
+
+    def entrar_estagio(self, nome: str):
+        if self._ativo is not None:
+            self._ativar(nome)
+
+    def sair_estagio(self, anterior: Optional[str]):
+        if self._ativo is not None:
+            self._ativar(anterior or FORA_DE_ESTAGIO)
+
+    def parar(self):
+        if self._ativo is not None:
+            self._ativo.disable()
+            self._ativo = None
+
+    def _estatisticas(self) -> List[Tuple[str, pstats.Stats]]:
+        # pstats.Stats consome os dados do Profile: as estatísticas são montadas uma única vez
+        if self._stats is None:
+            self._stats = []
+            for estagio, perfil in self._perfis.items():
+                perfil.create_stats()
+                if perfil.stats:
+                    self._stats.append((estagio, pstats.Stats(perfil)))
+        return self._stats
+
+    def _pontos_quentes(self):
+        for estagio, stats in self._estatisticas():
+            for (arquivo, linha, funcao), (_, _, tempo_proprio, _, _) in stats.stats.items():
+                yield estagio, f"{Path(arquivo).stem}:{linha}({funcao})", tempo_proprio
+
+    def _gravar(self, pasta: Path):
+        arquivos = []
+        for estagio, stats in self._estatisticas():
+            arquivos.append(str(pasta / f"{_nome_arquivo(estagio)}.pstats"))
+            stats.dump_stats(arquivos[-1])
+        if arquivos:
+            pstats.Stats(*arquivos).dump_stats(pasta / 'completo.pstats')
+
+class PerfiladorAmostragem(_Perfilador):
+    """Estatístico: amostra as pilhas de todas as threads numa thread de fundo."""
+    modo = 'sampling'
+
+    def __init__(self, intervalo: float = 0.005, top_n: int = 15):
+        super().__init__(top_n)
+        self.intervalo = intervalo
+        self._estagio = FORA_DE_ESTAGIO
+        self._pilhas = Counter()
+        self._rodadas = 0
+        self._duracao = 0.0
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._amostrar, name='perfilador', daemon=True)
+        self._thread.start()
+
+    def entrar_estagio(self, nome: str):
+        self._estagio = nome
+
+    def sair_estagio(self, anterior: Optional[str]):
+        self._estagio = anterior or FORA_DE_ESTAGIO
+
+    def parar(self):
+        if self._thread is not None:
+            self._parar.set()
+            self._thread.join()
+            self._thread = None
+
+    def _amostrar(self):
+        propria = threading.get_ident()
+        inicio = time.perf_counter()
+        while not self._parar.wait(self.intervalo):
+            self._rodadas += 1
+            estagio = self._estagio
+            for ident, frame in sys._current_frames().items():
+                if ident == propria:
+                    continue
+                pilha = []
+                while frame is not None:
+                    pilha.append(f"{Path(frame.f_code.co_filename).stem}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                if pilha and pilha[0] not in FOLHAS_OCIOSAS:
+                    self._pilhas[(estagio,) + tuple(reversed(pilha))] += 1
+        self._duracao = time.perf_counter() - inicio
+
+    def _pontos_quentes(self):
+        # A coleta de cada rodada também consome tempo: usa o intervalo efetivo, não o configurado
+        intervalo_efetivo = self._duracao / self._rodadas if self._rodadas else self.intervalo
+        folhas = Counter()
+        for pilha, amostras in self._pilhas.items():
+            folhas[(pilha[0], pilha[-1])] += amostras
+        for (estagio, funcao), amostras in folhas.items():
+            yield estagio, funcao, amostras * intervalo_efetivo
+
+    def _gravar(self, pasta: Path):
+        with open(pasta / 'amostras.collapsed', 'w', encoding='utf-8') as f:
+            for pilha, amostras in sorted(self._pilhas.items()):
+                f.write(f"{';'.join(quadro.replace(';', ',') for quadro in pilha)} {amostras}\n")
+
+def criar_perfilador(modo: Optional[str], config: ConfigParser) -> Optional[_Perfilador]:
+    """Perfilador do modo pedido (a opção de linha de comando tem precedência sobre [PERFIL] modo)."""
+    modo = (modo or config.get('PERFIL', 'modo', fallback='')).strip().lower()
+    if not modo:
+        return None
+    top_n = config.getint('PERFIL', 'top_n', fallback=15)
+    if modo == 'cprofile':
+        return PerfiladorCProfile(top_n)
+    if modo == 'sampling':
+        return PerfiladorAmostragem(config.getfloat('PERFIL', 'intervalo_ms', fallback=5.0) / 1000, top_n)
+    logger.warning(f"Modo de perfil '{modo}' desconhecido (use {', '.join(MODOS_SUPORTADOS)}). Perfil desativado.")
+    return None
@@ -6,24 +6,18 @@ from tqdm import tqdm
 from configparser import ConfigParser
 from datetime import datetime
 import re
-from typing import Tuple, Dict, List
+import time
+from typing import Tuple, Dict, List, Optional
 from pathlib import Path
+from pandas.api.extensions import take
+from src.escritor_csv import escrever_csv
+from src.identificadores import formatar_identificador, DIGITOS_CPF
+from src.exportador_parquet import parquet_habilitado, exportar_parquet, PASTA_PARQUET
+from src.motor_regras import Regra, NOME_REGRA_BLOQUEIO, regras_do_config, aplicar_regras, mensagem_regra
 
 logger = logging.getLogger(__name__)
-tqdm.pandas(desc="Processando mailing")
 
 # --- FUNCOES AUXILIARES ---
-def _sanitize_encoding(text: str) -> str:
-    """Tenta corrigir problemas comuns de encoding (Mojibake)."""
-    if not isinstance(text, str):
-        return text
-    try:
-        # Tenta reverter o padrão "UTF-8 lido como latin-1"
-        return text.encode('latin1').decode('utf-8')
-    except (UnicodeEncodeError, UnicodeDecodeError):
-        # Se a correção falhar, retorna o texto original
-        return text
-
 def _clean_phone_number(phone_val):
     if pd.isna(phone_val): return None
     phone_str = str(phone_val).split('.')[0]
@@ -55,37 +49,78 @@ def _tratar_colunas_rebeldes(df: pd.DataFrame) -> tuple:
             df[col] = _safe_to_float(df[col])
     if 'empresa' in df.columns:
         df['empresa'] = df['empresa'].astype(str).str.replace('\ufeff', '', regex=False).str.strip()
-    if 'ndoc' in df.columns:
-        df['ndoc'] = df['ndoc'].astype(str).str.replace(r'\.0$', '', regex=True)
     return df, "Tratamento inicial de colunas de valores e texto concluído."
 
-def _remover_clientes_proibidos(df_mailing: pd.DataFrame, df_bloqueio_input: pd.DataFrame | None, config: ConfigParser) -> tuple:
-    if df_bloqueio_input is None or df_bloqueio_input.empty:
-        return df_mailing, "Remoção por Tabulação: Arquivo de regras não encontrado ou vazio. Etapa pulada."
-    
+def _indice_tabulacoes(df_tabulacoes: pd.DataFrame | None, config: ConfigParser) -> Tuple[Optional[pd.DataFrame], str]:
+    """
+    Histórico de contatos por cliente na base de Tabulações, montado uma vez por execução (ou
+    mantido em memória pelo modo serviço): total de acionamentos, quantos tiveram status crítico
+    e o último status registrado, indexado pelo ID do cliente. A base não tem coluna de data: as
+    linhas estão na ordem dos contatos, então o último status é o da última linha (não nula) do
+    cliente. Quando a base não pode ser usada, devolve None e o motivo (a mensagem da etapa).
+    """
+    if df_tabulacoes is None or df_tabulacoes.empty:
+        return None, "Remoção por Tabulação: Arquivo de regras não encontrado ou vazio. Etapa pulada."
+
     key_bloqueio = config.get('SOURCE_COLUMNS', 'id_cliente_tabulacao').lower()
     key_mailing = config.get('SOURCE_COLUMNS', 'cpf').lower()
     status_col = config.get('SOURCE_COLUMNS', 'status_tabulacao').lower()
-    
+    if key_bloqueio not in df_tabulacoes.columns or status_col not in df_tabulacoes.columns:
+        return None, f"AVISO: Colunas chave para remoção ('{key_bloqueio}', '{status_col}', '{key_mailing}') não encontradas. Etapa pulada."
+
     status_criticos_str = config.get('SCHEMA_TABULACOES', 'status_criticos_para_remocao', fallback='')
     status_criticos = [s.strip().lower() for s in status_criticos_str.split('\n') if s.strip()]
-    limiar = config.getint('SCHEMA_TABULACOES', 'limiar_remocao_status_criticos', fallback=3)
 
-    if not status_criticos: return df_mailing, "Remoção por Tabulação: Nenhum status crítico definido. Etapa pulada."
-    if key_bloqueio not in df_bloqueio_input.columns or status_col not in df_bloqueio_input.columns or key_mailing not in df_mailing.columns:
+    # A base de referência não é alterada: no modo serviço ela fica em memória entre execuções.
+    # Os IDs já são chaves inteiras desde o carregamento.
+    status = df_tabulacoes[status_col].where(df_tabulacoes[status_col].isna(), df_tabulacoes[status_col].astype(str).str.strip())
+    historico = pd.DataFrame({
+        'id': df_tabulacoes[key_bloqueio],
+        'critico': status.str.lower().isin(status_criticos),
+        'status': status,
+    }).dropna(subset=['id'])
+    indice = historico.groupby('id', sort=False).agg(
+        total_acionamentos=('critico', 'size'), status_criticos=('critico', 'sum'), ultimo_status=('status', 'last')
+    )
+    return indice, f"Histórico de tabulações: {len(indice)} clientes, {len(historico)} acionamentos."
+
+def _aplicar_historico_tabulacoes(df_mailing: pd.DataFrame, historico: Tuple[Optional[pd.DataFrame], str], config: ConfigParser) -> tuple:
+    """
+    Junta o histórico de tabulações ao mailing uma única vez (por CPF): a contagem de status
+    críticos decide a remoção pelo limiar, o total de acionamentos vira a coluna
+    Quantidades_de_Acionamentos e o último status, a Ultimo_Status_Tabulacao (vazia para quem
+    não tem histórico).
+    """
+    indice, msg = historico
+    if indice is None:
+        return df_mailing, msg
+
+    key_mailing = config.get('SOURCE_COLUMNS', 'cpf').lower()
+    if key_mailing not in df_mailing.columns:
+        key_bloqueio = config.get('SOURCE_COLUMNS', 'id_cliente_tabulacao').lower()
+        status_col = config.get('SOURCE_COLUMNS', 'status_tabulacao').lower()
         return df_mailing, f"AVISO: Colunas chave para remoção ('{key_bloqueio}', '{status_col}', '{key_mailing}') não encontradas. Etapa pulada."
+    logger.info(msg)
 
-    tamanho_inicial = len(df_mailing)
-    df_bloqueio_input[key_bloqueio] = df_bloqueio_input[key_bloqueio].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
-    df_bloqueio_critico = df_bloqueio_input[df_bloqueio_input[status_col].astype(str).str.strip().str.lower().isin(status_criticos)]
-    if df_bloqueio_critico.empty: return df_mailing, "Remoção por Tabulação: Nenhum registro com status crítico encontrado."
-    
-    contagem_status = df_bloqueio_critico.groupby(key_bloqueio).size()
-    ids_para_remover = set(contagem_status[contagem_status >= limiar].index)
-    if not ids_para_remover: return df_mailing, f"Remoção por Tabulação: Nenhum cliente atingiu o limiar de {limiar}."
+    # 1. Uma busca por hash para todas as linhas; clientes sem histórico ficam com zero
+    posicoes = indice.index.get_indexer(df_mailing[key_mailing])
+    df_mailing = df_mailing.copy()
+    df_mailing['Quantidades_de_Acionamentos'] = take(indice['total_acionamentos'].to_numpy(), posicoes, allow_fill=True, fill_value=0)
+    df_mailing['Ultimo_Status_Tabulacao'] = take(indice['ultimo_status'].to_numpy(dtype=object), posicoes, allow_fill=True, fill_value=None)
+    criticos = take(indice['status_criticos'].to_numpy(), posicoes, allow_fill=True, fill_value=0)
 
-    mailing_keys_cleaned = df_mailing[key_mailing].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
-    df_filtrado = df_mailing[~mailing_keys_cleaned.isin(ids_para_remover)]
+    # 2. Remoção pelo limiar de status críticos
+    status_criticos_str = config.get('SCHEMA_TABULACOES', 'status_criticos_para_remocao', fallback='')
+    if not any(s.strip() for s in status_criticos_str.split('\n')):
+        return df_mailing, "Remoção por Tabulação: Nenhum status crítico definido. Etapa pulada."
+    if not indice['status_criticos'].any():
+        return df_mailing, "Remoção por Tabulação: Nenhum registro com status crítico encontrado."
+    limiar = config.getint('SCHEMA_TABULACOES', 'limiar_remocao_status_criticos', fallback=3)
+    if not (indice['status_criticos'] >= limiar).any():
+        return df_mailing, f"Remoção por Tabulação: Nenhum cliente atingiu o limiar de {limiar}."
+
+    tamanho_inicial = len(df_mailing)
+    df_filtrado = df_mailing[criticos < limiar]
     removidos = tamanho_inicial - len(df_filtrado)
     return df_filtrado, f"Remoção por Tabulação (Regra de Limiar): {removidos} registros removidos."
 
@@ -126,37 +161,52 @@ def _calcular_colunas_agregadas(df: pd.DataFrame, config: ConfigParser) -> tuple
         
     return df, "Colunas agregadas (valorDivida, etc.) calculadas."
 
-def _enriquecer_telefones(df_mailing: pd.DataFrame, dataframes: dict) -> tuple:
+def _indice_telefones(enriquecimento: Dict | None) -> Optional[pd.DataFrame]:
+    """
+    Telefones da base de pontuação agrupados por documento ('join_key' -> 'telefones_enriquecidos',
+    em ordem decrescente de pontuação). None quando a base está ausente ou não tem as colunas.
+    """
+    if not isinstance(enriquecimento, dict) or not enriquecimento:
+        msg = "AVISO: Dados de enriquecimento ('Pontuação.xlsx') não encontrados ou vazios. Etapa pulada, telefones serão populados apenas com dados do mailing."
+        logger.warning(msg)
+        return None
+    df_pontuacao = pd.concat(enriquecimento.values(), ignore_index=True)
+
+    colunas_pontuacao_necessarias = ['documento', 'telefone', 'pontuacao']
+    if df_pontuacao.empty or not all(col in df_pontuacao.columns for col in colunas_pontuacao_necessarias):
+        return None
+    df_pontuacao = df_pontuacao[colunas_pontuacao_necessarias].dropna(subset=['documento', 'telefone'])
+    df_pontuacao['join_key'] = df_pontuacao['documento']
+    df_pontuacao['telefone'] = df_pontuacao['telefone'].apply(_clean_phone_number)
+    df_pontuacao.dropna(subset=['join_key', 'telefone'], inplace=True)
+    df_pontuacao = df_pontuacao.sort_values(by=['join_key', 'pontuacao'], ascending=[True, False])
+    
+    telefones_agrupados = df_pontuacao.groupby('join_key')['telefone'].apply(list).reset_index()
+    return telefones_agrupados.rename(columns={'telefone': 'telefones_enriquecidos'})
+
+def preparar_referencias(dataframes: Dict, config: ConfigParser) -> Dict:
+    """
+    Índices derivados das bases de referência (Pontuação e Tabulações), que dependem só desses
+    arquivos e do config.ini. O modo serviço os mantém em memória entre execuções.
+    """
+    return {
+        'telefones': _indice_telefones(dataframes.get('enriquecimento')),
+        'historico_tabulacoes': _indice_tabulacoes(dataframes.get('regras_disposicao'), config),
+    }
+
+def _enriquecer_telefones(df_mailing: pd.DataFrame, telefones_agrupados: Optional[pd.DataFrame]) -> tuple:
     logger.info("Iniciando enriquecimento de telefones.")
     
     for i in range(1, 5):
         df_mailing[f'telefone_0{i}'] = np.nan
 
-    if 'enriquecimento' not in dataframes or not isinstance(dataframes['enriquecimento'], dict) or not dataframes['enriquecimento']:
-        msg = "AVISO: Dados de enriquecimento ('Pontuação.xlsx') não encontrados ou vazios. Etapa pulada, telefones serão populados apenas com dados do mailing."
-        logger.warning(msg)
-        df_pontuacao = pd.DataFrame()
-    else:
-        df_enriquecimento_dict = dataframes.get('enriquecimento', {})
-        df_pontuacao = pd.concat(df_enriquecimento_dict.values(), ignore_index=True)
-
-    colunas_pontuacao_necessarias = ['documento', 'telefone', 'pontuacao']
-    if not df_pontuacao.empty and all(col in df_pontuacao.columns for col in colunas_pontuacao_necessarias):
-        df_pontuacao = df_pontuacao[colunas_pontuacao_necessarias].dropna(subset=['documento', 'telefone'])
-        df_pontuacao['join_key'] = df_pontuacao['documento'].astype(str).str.lower().str.strip()
-        df_pontuacao['telefone'] = df_pontuacao['telefone'].apply(_clean_phone_number)
-        df_pontuacao.dropna(subset=['join_key', 'telefone'], inplace=True)
-        df_pontuacao = df_pontuacao.sort_values(by=['join_key', 'pontuacao'], ascending=[True, False])
-        
-        telefones_agrupados = df_pontuacao.groupby('join_key')['telefone'].apply(list).reset_index()
-        telefones_agrupados.rename(columns={'telefone': 'telefones_enriquecidos'}, inplace=True)
-        
+    if telefones_agrupados is not None:
         if 'ndoc' not in df_mailing.columns:
             msg = "ERRO: Coluna 'ndoc' não encontrada no mailing. Enriquecimento de telefones abortado."
             logger.error(msg)
             return df_mailing, msg
             
-        df_mailing['join_key'] = df_mailing['ndoc'].astype(str).str.lower().str.strip()
+        df_mailing['join_key'] = df_mailing['ndoc']
         df_final = pd.merge(df_mailing, telefones_agrupados, on='join_key', how='left')
         matches = df_final['telefones_enriquecidos'].notna().sum()
         msg = f"Enriquecimento de Telefones: {matches} clientes tiveram telefones encontrados na base de pontuação."
@@ -179,8 +229,14 @@ def _enriquecer_telefones(df_mailing: pd.DataFrame, dataframes: dict) -> tuple:
             row[f'telefone_0{i+1}'] = todos_telefones[i] if i < len(todos_telefones) else np.nan
         return row
 
+    # Registrado aqui, e não no import do módulo, para não alterar o pandas de quem só importa o pipeline
+    tqdm.pandas(desc="Processando mailing")
     df_final = df_final.progress_apply(popular_telefones, axis=1)
     df_final = df_final.drop(columns=['join_key', 'telefones_enriquecidos'], errors='ignore')
+    # O apply por linha devolve as colunas como object; as chaves Int64 (CPF, ndoc) voltam ao seu tipo
+    # para que a exportação as reconheça como identificadores, mesmo com algum CPF nulo no mailing
+    df_final = df_final.astype({col: dtype for col, dtype in df_mailing.dtypes.items()
+                                if isinstance(dtype, pd.Int64Dtype) and col in df_final.columns})
     
     logger.info(msg)
     return df_final, msg
@@ -192,34 +248,50 @@ def _criar_cliente_regulariza_from_mailing(df: pd.DataFrame) -> tuple:
         df['Cliente_Regulariza'] = 'NÃO'
     return df, "'Cliente_Regulariza' criada."
 
-def _remover_por_status_de_bloqueio(df: pd.DataFrame, config: ConfigParser, output_dir: Path) -> tuple:
+NOME_RELATORIO_REJEITADOS = "rejeitados_por_status_de_bloqueio.csv"
+
+def gravar_rejeitados(df_rejeitados: pd.DataFrame, config: ConfigParser, output_dir: Path):
+    """Grava o relatório de rejeição por status de bloqueio (CSV e, se habilitado, Parquet) em output_dir."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # O CPF é chave inteira no processamento: volta a ter os zeros à esquerda, como nas demais exportações
+    col_cpf = config.get('SOURCE_COLUMNS', 'cpf').lower()
+    if col_cpf in df_rejeitados.columns:
+        df_rejeitados = df_rejeitados.assign(**{col_cpf: formatar_identificador(
+            df_rejeitados[col_cpf], config.getint('EXPORT', 'digitos_cpf', fallback=DIGITOS_CPF))})
+    caminho_relatorio = output_dir / NOME_RELATORIO_REJEITADOS
+    escrever_csv(df_rejeitados, caminho_relatorio, ';')
+    logger.info(f"Relatório de rejeição por status de bloqueio salvo em: {caminho_relatorio}")
+    if parquet_habilitado(config):
+        exportar_parquet(df_rejeitados, output_dir / PASTA_PARQUET / "rejeitados_por_status_de_bloqueio.parquet")
+
+def _remover_por_status_de_bloqueio(df: pd.DataFrame, regra: Optional[Regra], config: ConfigParser, output_dir: Path,
+                                    relatorios: Optional[Dict[str, pd.DataFrame]] = None) -> tuple:
     coluna_filtro = config.get('SOURCE_COLUMNS', 'bloqueio').lower()
     if coluna_filtro not in df.columns:
         return df, f"Filtro de Bloqueio: Coluna '{coluna_filtro}' não encontrada. Etapa pulada."
     
-    status_para_remover_str = config.get('SCHEMA_MAILING', 'status_de_bloqueio_para_remover', fallback='')
-    status_para_remover = {s.strip().lower() for s in status_para_remover_str.split('\n') if s.strip()}
-    
-    if not status_para_remover:
+    if regra is None:
         return df, "Filtro de Bloqueio: Nenhum status de bloqueio para remover definido. Etapa pulada."
 
     tamanho_inicial = len(df)
     
-    coluna_sanitizada = df[coluna_filtro].astype(str).apply(_sanitize_encoding).str.strip().str.lower()
-    
-    mascara_remocao = coluna_sanitizada.isin(status_para_remover)
+    # Regra compilada: encoding, espaços e caixa normalizados só nos valores distintos da coluna
+    mascara_remocao = regra.linhas_removidas(df)
     df_rejeitados = df[mascara_remocao].copy()
     
     if not df_rejeitados.empty:
         df_rejeitados['motivo_remocao'] = df_rejeitados[coluna_filtro]
-        # 1
-        output_dir.mkdir(parents=True, exist_ok=True)
-        caminho_relatorio = output_dir / "rejeitados_por_status_de_bloqueio.csv"
+        # 1. Relatório em ordem de CPF, a mesma em uma execução única ou na junção de shards
+        col_cpf = config.get('SOURCE_COLUMNS', 'cpf').lower()
+        if col_cpf in df_rejeitados.columns:
+            df_rejeitados = df_rejeitados.sort_values(col_cpf, kind='stable')
         colunas_relatorio = ['ncpf', 'nomecad', 'motivo_remocao']
         # Garante que as colunas existem antes de tentar salvar
         colunas_presentes = [col for col in colunas_relatorio if col in df_rejeitados.columns]
-        df_rejeitados[colunas_presentes].to_csv(caminho_relatorio, index=False, sep=';', encoding='utf-8-sig')
-        logger.info(f"Relatório de rejeição por status de bloqueio salvo em: {caminho_relatorio}")
+        if relatorios is not None:
+            relatorios['rejeitados'] = df_rejeitados[colunas_presentes]
+        else:
+            gravar_rejeitados(df_rejeitados[colunas_presentes], config, output_dir)
 
     df_filtrado = df[~mascara_remocao]
     removidos = tamanho_inicial - len(df_filtrado)
@@ -250,10 +322,14 @@ def _aplicar_ajustes_finais(df: pd.DataFrame, config: ConfigParser) -> tuple:
     df = df[colunas_principais + outras_colunas]
     return df, "Ajustes finais de layout aplicados."
 
-def _aplicar_ordenacao_final(df: pd.DataFrame, config: ConfigParser) -> pd.DataFrame:
-    if df.empty: return pd.DataFrame()
+# Ordem final: prioridade, maior dívida e, no empate, o CPF (único após a deduplicação), para
+# que a ordem seja total e a junção de shards reproduza exatamente a execução única
+CHAVES_ORDENACAO_FINAL = [('priority_level', True), ('valorDivida', False), ('CPF', True)]
+
+def nivel_prioridade(df: pd.DataFrame, config: ConfigParser) -> pd.Series:
+    """Posição de cada linha em [PRIORITIES] order (as que não casam com nenhuma ficam por último)."""
     priority_order = [p.strip().upper() for p in config.get('PRIORITIES', 'order').split('\n') if p.strip()]
-    df['priority_level'] = len(priority_order)
+    nivel = np.full(len(df), len(priority_order))
     
     colunas_prioridade = [
         'faixa', 
@@ -269,9 +345,14 @@ def _aplicar_ordenacao_final(df: pd.DataFrame, config: ConfigParser) -> pd.DataF
                 condicao_final = condicao_final | condicao_parcial
         
         if condicao_final.any():
-            df.loc[condicao_final, 'priority_level'] = i
-            
-    df_sorted = df.sort_values(by=['priority_level', 'valorDivida'], ascending=[True, False])
+            nivel[condicao_final.to_numpy()] = i
+    return pd.Series(nivel, index=df.index)
+
+def _aplicar_ordenacao_final(df: pd.DataFrame, config: ConfigParser) -> pd.DataFrame:
+    if df.empty: return pd.DataFrame()
+    df['priority_level'] = nivel_prioridade(df, config)
+    chaves = [(coluna, crescente) for coluna, crescente in CHAVES_ORDENACAO_FINAL if coluna in df.columns]
+    df_sorted = df.sort_values(by=[c for c, _ in chaves], ascending=[a for _, a in chaves], kind='stable')
     return df_sorted.drop(columns=['priority_level'])
 
 def _aplicar_filtros_estrategicos(df: pd.DataFrame, config: ConfigParser) -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -294,8 +375,34 @@ def _aplicar_filtros_estrategicos(df: pd.DataFrame, config: ConfigParser) -> Tup
     return df_humano, df_robo
 
 # --- FUNCAO ORQUESTRADORA (ARQUITETURA UNIFICADA E ROBUSTA) ---
-def processar_dados(dataframes: Dict, config: ConfigParser, output_dir: Path) -> Tuple[Tuple[pd.DataFrame, pd.DataFrame], List[Dict]]:
+def processar_dados(dataframes: Dict, config: ConfigParser, output_dir: Path,
+                    tempos: Optional[Dict[str, float]] = None,
+                    referencias: Optional[Dict] = None,
+                    data_referencia: Optional[datetime] = None,
+                    relatorios: Optional[Dict[str, pd.DataFrame]] = None) -> Tuple[Tuple[pd.DataFrame, pd.DataFrame], List[Dict]]:
+    """
+    Executa todas as etapas do fluxo único. Cada etapa do relatório traz sua duração ('duracao',
+    em segundos); se 'tempos' for informado, recebe a duração de todas as etapas, inclusive as
+    que não aparecem no relatório. 'referencias' são os índices de preparar_referencias já
+    montados (modo serviço); sem eles, os índices são montados a partir de 'dataframes'.
+    'data_referencia' (backfill) é o dia gravado na Data_de_Importacao; o padrão é hoje. Se
+    'relatorios' for informado (execução em shards), o relatório de rejeitados volta nele, na
+    chave 'rejeitados', em vez de ser gravado em output_dir.
+    """
     process_report = []
+    tempos = tempos if tempos is not None else {}
+
+    def _medir(nome, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        tempos[nome] = time.perf_counter() - inicio
+        return resultado
+
+    def _registrar(nome, initial_count, df, msg):
+        logger.info(msg)
+        final_count = len(df)
+        process_report.append({"name": nome, "initial": initial_count, "removed": initial_count - final_count, "final": final_count,
+                               "message": msg, "duracao": round(tempos[nome], 4)})
     
     df_mailing = dataframes.get('mailing', pd.DataFrame())
     if df_mailing.empty:
@@ -306,55 +413,56 @@ def processar_dados(dataframes: Dict, config: ConfigParser, output_dir: Path) ->
     logger.info(f"Registros iniciais no mailing consolidado: {len(df_mailing)}")
     
     df_processado = df_mailing.copy()
+    if referencias is None:
+        referencias = _medir("Preparação das Referências", preparar_referencias, dataframes, config)
     
-    df_limpo, msg = _tratar_datas(df_processado)
-    df_limpo, msg = _tratar_colunas_rebeldes(df_limpo)
+    df_limpo, msg = _medir("Tratamento de Datas", _tratar_datas, df_processado)
+    df_limpo, msg = _medir("Tratamento de Colunas Rebeldes", _tratar_colunas_rebeldes, df_limpo)
     
     initial_count = len(df_limpo)
-    df_limpo, msg = _remover_clientes_proibidos(df_limpo, dataframes.get('regras_disposicao'), config)
-    logger.info(msg)
-    final_count = len(df_limpo)
-    process_report.append({"name": "Remoção por Tabulação", "initial": initial_count, "removed": initial_count - final_count, "final": final_count, "message": msg})
+    df_limpo, msg = _medir("Remoção por Tabulação", _aplicar_historico_tabulacoes, df_limpo, referencias['historico_tabulacoes'], config)
+    _registrar("Remoção por Tabulação", initial_count, df_limpo, msg)
 
     initial_count = len(df_limpo)
-    df_limpo, msg = _remover_duplicatas_inteligentemente(df_limpo, config)
-    logger.info(msg)
-    final_count = len(df_limpo)
-    process_report.append({"name": "Deduplicação por 'ncpf'", "initial": initial_count, "removed": initial_count - final_count, "final": final_count, "message": msg})
+    df_limpo, msg = _medir("Deduplicação por 'ncpf'", _remover_duplicatas_inteligentemente, df_limpo, config)
+    _registrar("Deduplicação por 'ncpf'", initial_count, df_limpo, msg)
 
     initial_count = len(df_limpo)
-    df_limpo, msg = _calcular_colunas_agregadas(df_limpo, config)
-    logger.info(msg)
-    final_count = len(df_limpo)
-    process_report.append({"name": "Cálculo de Colunas Agregadas", "initial": initial_count, "removed": initial_count - final_count, "final": final_count, "message": msg})
+    df_limpo, msg = _medir("Cálculo de Colunas Agregadas", _calcular_colunas_agregadas, df_limpo, config)
+    _registrar("Cálculo de Colunas Agregadas", initial_count, df_limpo, msg)
 
     initial_count = len(df_limpo)
-    df_limpo, msg = _enriquecer_telefones(df_limpo, dataframes)
-    logger.info(msg)
-    final_count = len(df_limpo)
-    process_report.append({"name": "Enriquecimento de Telefones", "initial": initial_count, "removed": initial_count - final_count, "final": final_count, "message": msg})
+    df_limpo, msg = _medir("Enriquecimento de Telefones", _enriquecer_telefones, df_limpo, referencias['telefones'])
+    _registrar("Enriquecimento de Telefones", initial_count, df_limpo, msg)
 
     initial_count = len(df_limpo)
-    df_limpo, msg = _criar_cliente_regulariza_from_mailing(df_limpo)
-    logger.info(msg)
-    final_count = len(df_limpo)
-    process_report.append({"name": "Criação de 'Cliente_Regulariza'", "initial": initial_count, "removed": initial_count - final_count, "final": final_count, "message": msg})
+    df_limpo, msg = _medir("Criação de 'Cliente_Regulariza'", _criar_cliente_regulariza_from_mailing, df_limpo)
+    _registrar("Criação de 'Cliente_Regulariza'", initial_count, df_limpo, msg)
 
+    regras = regras_do_config(config, 'processamento')
+    regra_bloqueio = next((r for r in regras if r.nome == NOME_REGRA_BLOQUEIO), None)
     initial_count = len(df_limpo)
-    df_limpo, msg = _remover_por_status_de_bloqueio(df_limpo, config, output_dir)
-    logger.info(msg)
-    final_count = len(df_limpo)
-    process_report.append({"name": "Filtro de Bloqueio ('bloq')", "initial": initial_count, "removed": initial_count - final_count, "final": final_count, "message": msg})
+    df_limpo, msg = _medir("Filtro de Bloqueio ('bloq')", _remover_por_status_de_bloqueio, df_limpo, regra_bloqueio, config, output_dir, relatorios)
+    _registrar("Filtro de Bloqueio ('bloq')", initial_count, df_limpo, msg)
+
+    # Regras declaradas em [REGRA:<nome>] com etapa = processamento, cada uma com sua contagem
+    for regra in regras:
+        if regra is regra_bloqueio:
+            continue
+        nome = f"Regra '{regra.nome}'"
+        initial_count = len(df_limpo)
+        df_limpo, relatorio_regra = _medir(nome, aplicar_regras, df_limpo, [regra], 'mailing')
+        _registrar(nome, initial_count, df_limpo, mensagem_regra(relatorio_regra[0]))
     
-    df_limpo['Data_de_Importacao'] = datetime.now().strftime('%d/%m/%Y')
-    df_limpo, msg = _aplicar_ajustes_finais(df_limpo, config)
+    df_limpo['Data_de_Importacao'] = (data_referencia or datetime.now()).strftime('%d/%m/%Y')
+    df_limpo, msg = _medir("Ajustes Finais de Layout", _aplicar_ajustes_finais, df_limpo, config)
     logger.info(msg)
     
     logger.info(f"Fim da limpeza: {len(df_limpo)} registros.")
 
-    df_ordenado = _aplicar_ordenacao_final(df_limpo, config)
+    df_ordenado = _medir("Ordenação Final", _aplicar_ordenacao_final, df_limpo, config)
     logger.info("Ordenação estratégica final aplicada.")
     
-    df_humano, df_robo = _aplicar_filtros_estrategicos(df_ordenado, config)
+    df_humano, df_robo = _medir("Segmentação Humano/Robô", _aplicar_filtros_estrategicos, df_ordenado, config)
 
     return (df_humano, df_robo), process_report
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Bases de referência (Pontuação e Tabulações) mantidas em memória entre execuções do modo
+serviço. Cada base só é relida quando o hash do seu arquivo ou as seções do config.ini usadas
+na leitura (colunas identificadoras e schema) mudam; os índices derivados
+(telefones por documento e histórico de tabulações por cliente) só são remontados quando a base
+ou as seções do config.ini que os definem mudam.
+"""
+import logging
+from pathlib import Path
+from configparser import ConfigParser
+from typing import Dict, Optional, Tuple
+
+from src.data_loader import REFERENCIAS, carregar_referencia, localizar_arquivos_entrada
+from src.hashing import hash_arquivo, hash_secoes_config, combinar_hashes
+from src.processing_pipeline import preparar_referencias
+
+logger = logging.getLogger(__name__)
+
+# Seções lidas por carregar_referencia (identificadores convertidos em Int64, schema) e por preparar_referencias
+SECOES_INDICES = ['SOURCE_COLUMNS', 'SCHEMA_TABULACOES']
+
+class ReferenciasResidentes:
+    def __init__(self):
+        self._arquivos: Dict[str, Optional[dict]] = {}  # base -> {caminho, tamanho, mtime_ns, sha256}
+        self._dados: Dict[str, object] = {}
+        self._chaves_bases: Dict[str, str] = {}  # base -> hash do arquivo e das seções com que foi lida
+        self._chave_indices: Optional[str] = None
+        self._indices: Optional[Dict] = None
+
+    def _assinatura(self, nome: str, arquivo: Optional[Path]) -> Optional[dict]:
+        """Identificação do arquivo atual da base; o hash só é recalculado se tamanho ou mtime mudarem."""
+        if arquivo is None:
+            return None
+        stat = arquivo.stat()
+        anterior = self._arquivos.get(nome)
+        if anterior and anterior['caminho'] == str(arquivo) and (anterior['tamanho'], anterior['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return anterior
+        return {'caminho': str(arquivo), 'tamanho': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': hash_arquivo(arquivo)}
+
+    def atualizar(self, config: ConfigParser) -> Tuple[Dict, Dict]:
+        """(bases carregadas, índices de preparar_referencias), relendo só o que mudou."""
+        arquivos = localizar_arquivos_entrada(config)
+        secoes = hash_secoes_config(config, SECOES_INDICES)
+        for nome, (chave_padrao, _, _) in REFERENCIAS.items():
+            atual = self._assinatura(nome, arquivos.get(chave_padrao))
+            chave_base = combinar_hashes(secoes, (atual or {}).get('sha256', ''))
+            self._arquivos[nome] = atual
+            if nome in self._dados and self._chaves_bases.get(nome) == chave_base:
+                logger.info(f"Base de referência '{nome}' inalterada: mantida em memória.")
+                continue
+            logger.info(f"Base de referência '{nome}' {'alterada (arquivo ou config.ini)' if nome in self._dados else 'ainda não carregada'}: lendo o arquivo.")
+            self._dados[nome] = carregar_referencia(config, nome, arquivos.get(chave_padrao))
+            self._chaves_bases[nome] = chave_base
+
+        chave = combinar_hashes(
+            secoes,
+            *(f"{nome}:{(self._arquivos[nome] or {}).get('sha256', '')}" for nome in REFERENCIAS)
+        )
+        if chave != self._chave_indices:
+            logger.info("Montando os índices das bases de referência.")
+            self._indices = preparar_referencias(self._dados, config)
+            self._chave_indices = chave
+        return dict(self._dados), self._indices
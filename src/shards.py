@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Execução em shards: um mailing grande dividido entre máquinas (ou processos) pelo hash do CPF.
+
+Cada execução 'main.py --shard k/N' carrega as bases normalmente, mantém só os CPFs cujo hash
+cai no shard k e grava, em vez dos arquivos finais, uma saída parcial tipada (Arrow IPC, como
+os checkpoints) com um manifesto. Todas as etapas do processamento são por CPF (a deduplicação
+deixa uma linha por CPF), então nenhum shard depende dos outros.
+
+'main.py --merge' confere os N manifestos (mesmas entradas, mesma configuração, todos os
+shards presentes) e intercala as saídas, já ordenadas em cada shard, na ordem final do
+pipeline (k-way merge). A partir daí a execução segue como a única: exportação por produto,
+arquivos do robô por horário, compressão e armazém produzem o mesmo resultado.
+"""
+import json
+import heapq
+import shutil
+import logging
+from pathlib import Path
+from datetime import date, datetime
+from configparser import ConfigParser
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from src.checkpoints import VERSAO_CHECKPOINT, gravar_arrow, ler_arrow
+from src.processing_pipeline import CHAVES_ORDENACAO_FINAL, nivel_prioridade
+
+logger = logging.getLogger(__name__)
+
+SECAO = 'SHARDS'
+PASTA_PADRAO = './data_shards'
+NOME_MANIFESTO = 'shard.json'
+# Saídas parciais de cada shard, na ordem em que são gravadas
+FRAMES = ('humano', 'robo', 'rejeitados')
+
+def interpretar_shard(texto: str) -> Tuple[int, int]:
+    """
+    'k/N' -> (k, N), com 1 <= k <= N.
+
+    >>> interpretar_shard('2/4')
+    (2, 4)
+    """
+    partes = texto.split('/')
+    if len(partes) != 2 or not all(p.strip().isdigit() for p in partes):
+        raise ValueError(f"shard inválido '{texto}' (use k/N, ex.: 1/4)")
+    k, n = int(partes[0]), int(partes[1])
+    if not 1 <= k <= n:
+        raise ValueError(f"shard inválido '{texto}': k deve estar entre 1 e N")
+    return k, n
+
+def shard_das_chaves(chaves: pd.Series, total: int) -> np.ndarray:
+    """
+    Shard (1 a 'total') de cada chave inteira. O hash (finalizador do MurmurHash3) é o mesmo
+    em qualquer máquina e versão do Python ou do pandas; chaves nulas vão para o shard 1.
+
+    >>> shard_das_chaves(pd.Series([7187080444, 55481506917, 12345678909, None], dtype='Int64'), 4).tolist()
+    [1, 2, 2, 1]
+    """
+    valores = chaves.astype('Int64').fillna(0).to_numpy(dtype=np.int64).view(np.uint64)
+    h = valores ^ (valores >> np.uint64(33))
+    h = h * np.uint64(0xff51afd7ed558ccd)
+    h ^= h >> np.uint64(33)
+    h = h * np.uint64(0xc4ceb9fe1a85ec53)
+    h ^= h >> np.uint64(33)
+    shards = (h % np.uint64(total)).astype(np.int64) + 1
+    return np.where(chaves.isna().to_numpy(), 1, shards)
+
+def filtrar_shard(df: pd.DataFrame, coluna_cpf: str, shard: Tuple[int, int]) -> pd.DataFrame:
+    """Linhas do mailing que pertencem ao shard (k, N)."""
+    if df.empty:
+        return df
+    if coluna_cpf not in df.columns:
+        raise ValueError(f"Coluna de CPF '{coluna_cpf}' não encontrada no mailing: impossível dividir em shards.")
+    k, n = shard
+    return df[shard_das_chaves(df[coluna_cpf], n) == k]
+
+def pasta_shards(config: ConfigParser) -> Path:
+    return Path(config.get(SECAO, 'pasta', fallback=PASTA_PADRAO))
+
+def gravar_shard(config: ConfigParser, shard: Tuple[int, int], frames: Dict[str, pd.DataFrame], meta: dict) -> Path:
+    """
+    Grava a saída parcial do shard (um arquivo Arrow por frame) e o manifesto em
+    [SHARDS] pasta/shard_<k>_de_<N>, substituindo de forma atômica a gravação anterior.
+    """
+    k, n = shard
+    destino = pasta_shards(config) / f"shard_{k}_de_{n}"
+    temporaria = destino.with_name(destino.name + '.tmp')
+    shutil.rmtree(temporaria, ignore_errors=True)
+    temporaria.mkdir(parents=True)
+
+    arquivos = {}
+    for nome in FRAMES:
+        df = frames.get(nome)
+        if df is None:
+            continue
+        arquivos[nome] = f"{nome}.arrow"
+        gravar_arrow(df, temporaria / arquivos[nome])
+    manifesto = {
+        'versao': VERSAO_CHECKPOINT, 'shard': k, 'total_shards': n,
+        'criado_em': datetime.now().isoformat(), 'frames': arquivos,
+        'linhas': {nome: len(frames[nome]) for nome in arquivos}, **meta
+    }
+    (temporaria / NOME_MANIFESTO).write_text(json.dumps(manifesto, indent=4, ensure_ascii=False), encoding='utf-8')
+
+    shutil.rmtree(destino, ignore_errors=True)
+    temporaria.replace(destino)
+    logger.info(f"Shard {k}/{n} gravado em '{destino}': {', '.join(f'{nome} {qtd}' for nome, qtd in manifesto['linhas'].items())}.")
+    return destino
+
+def localizar_shards(config: ConfigParser, pastas: Optional[List[Path]] = None) -> List[Path]:
+    """As pastas informadas ou, sem elas, todas as pastas de shard em [SHARDS] pasta."""
+    if pastas:
+        return [Path(p) for p in pastas]
+    raiz = pasta_shards(config)
+    return sorted(p for p in raiz.glob('shard_*') if (p / NOME_MANIFESTO).is_file()) if raiz.is_dir() else []
+
+def _ler_manifestos(pastas: List[Path]) -> List[dict]:
+    """Manifestos dos shards, conferidos: mesma versão, mesmo N, todos os shards uma vez, mesmas entradas."""
+    if not pastas:
+        raise ValueError("Nenhuma saída de shard encontrada para juntar.")
+    manifestos = []
+    for pasta in pastas:
+        caminho = pasta / NOME_MANIFESTO
+        if not caminho.is_file():
+            raise ValueError(f"Manifesto de shard não encontrado em '{pasta}'.")
+        manifesto = json.loads(caminho.read_text(encoding='utf-8'))
+        if manifesto.get('versao') != VERSAO_CHECKPOINT:
+            raise ValueError(f"Shard em '{pasta}' gravado por outra versão do pipeline ({manifesto.get('versao')}); reprocesse-o.")
+        manifestos.append({**manifesto, 'pasta': pasta})
+
+    total = manifestos[0]['total_shards']
+    encontrados = sorted(m['shard'] for m in manifestos)
+    if any(m['total_shards'] != total for m in manifestos) or encontrados != list(range(1, total + 1)):
+        raise ValueError(f"Shards incompletos ou misturados: esperados 1 a {total} de {total}, encontrados {encontrados}.")
+    divergentes = [m['shard'] for m in manifestos if m.get('assinatura') != manifestos[0].get('assinatura')]
+    if divergentes:
+        raise ValueError(f"Os shards {divergentes} foram processados com entradas, configuração ou dia diferentes dos demais.")
+    return sorted(manifestos, key=lambda m: m['shard'])
+
+def _chaves_ordenacao(df: pd.DataFrame, config: ConfigParser) -> List[list]:
+    """
+    Chaves de CHAVES_ORDENACAO_FINAL como listas crescentes, com os nulos por último (como o
+    sort_values da execução única).
+    """
+    chaves = []
+    for coluna, crescente in CHAVES_ORDENACAO_FINAL:
+        if coluna == 'priority_level':
+            serie = nivel_prioridade(df, config)
+        elif coluna in df.columns:
+            serie = df[coluna]
+        else:
+            continue
+        if pd.api.types.is_integer_dtype(serie.dtype):
+            # Chaves inteiras (CPF) comparadas como inteiros, sem perda de precisão
+            valores = serie.astype('Int64')
+            valores = (valores if crescente else -valores).astype(object).where(valores.notna(), float('inf'))
+            chaves.append(valores.tolist())
+            continue
+        valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        chaves.append(np.where(np.isnan(valores), np.inf, valores if crescente else -valores).tolist())
+    return chaves
+
+def intercalar_ordenados(partes: List[pd.DataFrame], config: ConfigParser) -> pd.DataFrame:
+    """
+    K-way merge de DataFrames já ordenados pela ordem final: cada parte é percorrida uma única
+    vez, com um heap de N posições, e o resultado é a ordem que a execução única teria.
+    """
+    partes = [parte for parte in partes if not parte.empty]
+    if not partes:
+        return pd.DataFrame()
+    if len(partes) == 1:
+        return partes[0]
+    inicio = np.cumsum([0] + [len(parte) for parte in partes[:-1]])
+    fluxos = [zip(*_chaves_ordenacao(parte, config), range(deslocamento, deslocamento + len(parte)))
+              for parte, deslocamento in zip(partes, inicio)]
+    posicoes = [item[-1] for item in heapq.merge(*fluxos)]
+    return pd.concat(partes).iloc[posicoes]
+
+def juntar_shards(config: ConfigParser, pastas: Optional[List[Path]] = None) -> dict:
+    """
+    Lê e confere as saídas dos shards e devolve a junção: 'frames' (humano, robo e rejeitados
+    na ordem da execução única), 'process_report' (contagens somadas por etapa), o 'dia' de
+    referência, as linhas e regras do carregamento e o número de 'shards'.
+    """
+    manifestos = _ler_manifestos(localizar_shards(config, pastas))
+    partes = {nome: [] for nome in FRAMES}
+    for manifesto in manifestos:
+        for nome, arquivo in manifesto['frames'].items():
+            partes[nome].append(ler_arrow(manifesto['pasta'] / arquivo))
+
+    col_cpf = config.get('SOURCE_COLUMNS', 'cpf').lower()
+    frames = {nome: intercalar_ordenados(partes[nome], config) for nome in ('humano', 'robo')}
+    # O relatório de rejeitados é ordenado só por CPF (chaves únicas): a intercalação vira uma ordenação estável das partes
+    rejeitados = [parte for parte in partes['rejeitados'] if not parte.empty]
+    if rejeitados:
+        df_rejeitados = pd.concat(rejeitados)
+        frames['rejeitados'] = df_rejeitados.sort_values(col_cpf, kind='stable') if col_cpf in df_rejeitados.columns else df_rejeitados
+
+    # Contagens de cada etapa somadas entre os shards (a duração é a do shard mais lento)
+    process_report = []
+    # Um shard sem nenhuma linha não passa pelas etapas e não tem relatório
+    for etapas in zip(*(m['process_report'] for m in manifestos if m['process_report'])):
+        mensagens = {etapa['message'] for etapa in etapas}
+        soma = {chave: sum(etapa[chave] for etapa in etapas) for chave in ('initial', 'removed', 'final')}
+        process_report.append({
+            'name': etapas[0]['name'], **soma,
+            'message': mensagens.pop() if len(mensagens) == 1 else f"Soma de {len(etapas)} shards: {soma['removed']} registros removidos.",
+            'duracao': max(etapa.get('duracao', 0) for etapa in etapas)
+        })
+
+    primeiro = manifestos[0]
+    logger.info(f"{len(manifestos)} shards juntados: {len(frames['humano'])} registros para humano, {len(frames['robo'])} para robô.")
+    return {
+        'frames': frames, 'process_report': process_report, 'shards': len(manifestos),
+        'dia': date.fromisoformat(primeiro['dia']), 'assinatura': primeiro.get('assinatura'),
+        'registros_iniciais': primeiro['registros_iniciais'], 'regras_carregamento': primeiro.get('regras_carregamento', [])
+    }
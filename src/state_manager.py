@@ -1,17 +1,39 @@
 # -*- coding: utf-8 -*-
+import os
+import sys
 import json
 from pathlib import Path
 import logging
 from datetime import datetime
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
+def medir_pico_memoria_mb() -> Optional[float]:
+    """Pico de memória residente (RSS) do processo em MB, ou None se não for possível medir."""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss vem em KB no Linux e em bytes no macOS
+        return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memoria = psutil.Process().memory_info()
+        return getattr(memoria, 'peak_wset', memoria.rss) / 1024 / 1024
+    except Exception:
+        return None
+
 class StateManager:
     """
-    Gerencia o estado da automação, lendo e escrevendo em um arquivo JSON.
+    Gerencia o estado da automação, lendo e escrevendo em um arquivo JSON. Opcionalmente mantém
+    um histórico append-only (JSONL) de todas as execuções, limitado às 'retencao' mais recentes.
     """
-    def __init__(self, state_path: str):
+    def __init__(self, state_path: str, history_path: Optional[str] = None, retencao: int = 200):
         self.state_file = Path(state_path)
+        self.history_file = Path(history_path) if history_path else None
+        self.retencao = max(1, retencao)
         self.state = self._load_state()
 
     def _load_state(self) -> dict:
@@ -32,28 +54,41 @@ class StateManager:
 
     def _save_state(self):
         try:
-            with open(self.state_file, 'w', encoding='utf-8') as f:
+            # Gravação atômica: execuções simultâneas (backfill) nunca deixam um JSON pela metade
+            temporario = self.state_file.with_name(f"{self.state_file.name}.{os.getpid()}.tmp")
+            with open(temporario, 'w', encoding='utf-8') as f:
                 json.dump(self.state, f, indent=4, ensure_ascii=False)
+            os.replace(temporario, self.state_file)
             logger.debug(f"Estado salvo com sucesso em '{self.state_file}'.")
         except Exception as e:
             logger.error(f"Não foi possível salvar o estado em '{self.state_file}': {e}")
 
     # 1. AJUSTE: Modificado para salvar métricas.
-    def save_success(self, metrics: dict):
-        """Atualiza o estado para sucesso, salva as métricas e o estado."""
+    def save_success(self, metrics: dict, input_signature: Optional[dict] = None, archive: Optional[dict] = None):
+        """
+        Atualiza o estado para sucesso, salva as métricas e o estado. Com a assinatura das
+        entradas e o resumo do arquivo final, uma próxima execução idêntica pode reaproveitá-lo.
+        """
         self.state = {
             'last_successful_run': datetime.now().isoformat(),
             'status': 'COMPLETED',
             'last_metrics': metrics
         }
+        if input_signature and archive:
+            self.state['input_signature'] = input_signature
+            self.state['last_archive'] = {
+                'caminho': str(Path(archive['caminho']).resolve()), 'bytes': archive['bytes'], 'membros': archive.get('membros', [])
+            }
         self._save_state()
 
     def save_failure(self, error_message: str):
-        """Atualiza o estado para falha, registra o erro e salva."""
+        """Atualiza o estado para falha, registra o erro e salva (as últimas métricas de sucesso são mantidas)."""
         self.state = {
+            'last_successful_run': self.state.get('last_successful_run'),
             'last_failed_run': datetime.now().isoformat(),
             'status': 'FAILED',
-            'error_message': error_message
+            'error_message': error_message,
+            'last_metrics': self.get_last_metrics()
         }
         self._save_state()
         
@@ -61,3 +96,51 @@ class StateManager:
     def get_last_metrics(self) -> dict:
         """Retorna as métricas da última execução bem-sucedida."""
         return self.state.get('last_metrics', {})
+
+    def reusable_archive(self, input_signature: dict) -> Optional[dict]:
+        """
+        Resumo do arquivo final da última execução, se ela terminou com sucesso a partir das
+        mesmas entradas e da mesma configuração e o arquivo continua lá, do mesmo tamanho.
+        """
+        if self.state.get('status') != 'COMPLETED' or self.state.get('input_signature') != input_signature:
+            return None
+        archive = self.state.get('last_archive') or {}
+        caminho = Path(archive.get('caminho', ''))
+        if not archive.get('caminho') or not caminho.is_file() or caminho.stat().st_size != archive.get('bytes'):
+            return None
+        return {**archive, 'caminho': caminho}
+
+    # 3. Histórico append-only das execuções
+    def append_history(self, entry: dict):
+        """Acrescenta uma execução ao histórico, descartando as mais antigas além da retenção."""
+        if not self.history_file:
+            return
+        try:
+            self.history_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.history_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                linhas = f.readlines()
+            # Reescreve (de forma atômica) só quando a retenção é ultrapassada
+            if len(linhas) > self.retencao:
+                temporario = self.history_file.with_name(f"{self.history_file.name}.{os.getpid()}.tmp")
+                with open(temporario, 'w', encoding='utf-8') as f:
+                    f.writelines(linhas[-self.retencao:])
+                os.replace(temporario, self.history_file)
+        except Exception as e:
+            logger.error(f"Não foi possível registrar a execução no histórico '{self.history_file}': {e}")
+
+    def load_history(self, limit: Optional[int] = None, status: Optional[str] = None) -> List[dict]:
+        """Retorna as execuções mais recentes do histórico (da mais antiga para a mais nova)."""
+        if not self.history_file or not self.history_file.is_file():
+            return []
+        entradas = []
+        with open(self.history_file, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    entrada = json.loads(linha)
+                except json.JSONDecodeError:
+                    continue
+                if status is None or entrada.get('status') == status:
+                    entradas.append(entrada)
+        return entradas[-limit:] if limit else entradas
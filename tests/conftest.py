@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+import sys
+from pathlib import Path
+
+# Os testes importam 'src' e os scripts da raiz como o main.py: a partir da raiz do repositório
+RAIZ = Path(__file__).resolve().parent.parent
+if str(RAIZ) not in sys.path:
+    sys.path.insert(0, str(RAIZ))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""O backend pyarrow do escrever_csv deve gerar exatamente os bytes do DataFrame.to_csv."""
+import codecs
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from src.escritor_csv import escrever_csv, _escrever_csv_pyarrow, DialetoIncompativelError
+
+def _bytes(df: pd.DataFrame, tmp_path, sep: str, backend: str) -> bytes:
+    caminho = tmp_path / f"{backend}.csv"
+    escrever_csv(df, caminho, sep, backend=backend)
+    return caminho.read_bytes()
+
+def _comparar(df: pd.DataFrame, tmp_path, sep: str) -> bytes:
+    pandas = _bytes(df, tmp_path, sep, 'pandas')
+    assert _bytes(df, tmp_path, sep, 'pyarrow') == pandas
+    return pandas
+
+CASOS_DIRETOS = {
+    'texto_e_nulos': pd.DataFrame({'CPF': ['07187080444', None, ''], 'NOME': ['JOSÉ', 'ANA', np.nan]}),
+    'inteiros_anulaveis': pd.DataFrame({'ncpf': pd.array([7187080444, None, 12], dtype='Int64'), 'qtd': [1, 2, 3]}),
+    'floats': pd.DataFrame({'valor': [1234.5, 0.1 + 0.2, np.nan, -0.0, 1e16], 'bool': [True, False, True, False, True]}),
+    'categorias': pd.DataFrame({'faixa': pd.Categorical(['A', None, 'B']), 'X': ['1', '2', '3']}),
+    'coluna_unica_sem_vazios': pd.DataFrame({'CPF': ['1', '2']}),
+    'vazio': pd.DataFrame({'CPF': pd.Series([], dtype=object), 'NOME': pd.Series([], dtype=object)}),
+}
+
+@pytest.mark.parametrize('sep', [';', '|'])
+@pytest.mark.parametrize('nome', CASOS_DIRETOS)
+def test_pyarrow_escreve_os_mesmos_bytes_que_o_pandas(nome, sep, tmp_path):
+    df = CASOS_DIRETOS[nome]
+    # Sem fallback: o próprio pyarrow escreveu o arquivo
+    _escrever_csv_pyarrow(df, tmp_path / 'direto.csv', sep)
+    dados = _comparar(df, tmp_path, sep)
+    assert dados.startswith(codecs.BOM_UTF8)
+    assert (tmp_path / 'direto.csv').read_bytes() == dados
+
+CASOS_FALLBACK = {
+    # Os valores com separador têm os dois separadores, para exigir aspas em ';' e em '|'
+    'separador_no_valor': pd.DataFrame({'NOME': ['A;B|C', 'D'], 'X': ['1', '2']}),
+    'aspas_no_valor': pd.DataFrame({'NOME': ['DISSE "OI"', 'D'], 'X': ['1', '2']}),
+    'quebra_de_linha': pd.DataFrame({'NOME': ['LINHA 1\nLINHA 2', 'D\r'], 'X': ['1', '2']}),
+    'cabecalho_com_separador': pd.DataFrame({'A;B|C': ['1', '2']}),
+    'coluna_unica_com_nulo': pd.DataFrame({'CPF': ['1', None]}),
+    'coluna_unica_com_vazio': pd.DataFrame({'CPF': ['', '2']}),
+    'datas': pd.DataFrame({'data': pd.to_datetime(['2025-01-31 00:00:00', None, '2025-06-03 10:30:00']), 'X': ['1', '2', '3']}),
+}
+
+@pytest.mark.parametrize('sep', [';', '|'])
+@pytest.mark.parametrize('nome', CASOS_FALLBACK)
+def test_dialetos_incompativeis_recorrem_ao_pandas(nome, sep, tmp_path):
+    df = CASOS_FALLBACK[nome]
+    with pytest.raises(DialetoIncompativelError):
+        _escrever_csv_pyarrow(df, tmp_path / 'direto.csv', sep)
+    _comparar(df, tmp_path, sep)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Testes "golden" da formatação brasileira: as strings exatas que os arquivos de saída contêm hoje,
+conferidas também contra as antigas funções aplicadas célula a célula (copiadas abaixo como estavam
+em data_exporter, formatador_dados e gerador_robo_mestre).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.formatacao_br import formatar_moeda, formatar_moeda_texto, formatar_moeda_robo, formatar_datas
+
+# --- FUNÇÕES ANTIGAS (.apply) ---
+
+def _formatar_valor_para_duas_casas(valor) -> str:
+    if pd.isna(valor): return ''
+    try:
+        valor_float = float(valor)
+        return f'{valor_float:.2f}'.replace('.', ',')
+    except (ValueError, TypeError):
+        return str(valor)
+
+def _formatar_valor_para_duas_casas_texto(valor_str: str) -> str:
+    if not isinstance(valor_str, str) or valor_str.strip() == '':
+        return valor_str
+    try:
+        try:
+            valor_float = float(valor_str)
+        except ValueError:
+            cleaned_str = valor_str.strip().replace('.', '').replace(',', '.', 1)
+            valor_float = float(cleaned_str)
+        return f'{valor_float:.2f}'.replace('.', ',')
+    except (ValueError, TypeError):
+        return valor_str
+
+def _formatar_valor_para_robo(valor):
+    if pd.isna(valor): return ''
+    try:
+        valor_float = float(valor)
+        if valor_float == int(valor_float):
+            return str(int(valor_float))
+        else:
+            return f'{valor_float:.2f}'.replace('.', ',')
+    except (ValueError, TypeError):
+        return str(valor)
+
+# --- VALORES E STRINGS ESPERADAS ---
+
+# valor -> (formatar_moeda, formatar_moeda_robo)
+GOLDEN_MOEDA = [
+    (1234.5, '1234,50', '1234,50'),
+    (0.125, '0,12', '0,12'),            # empate exato em binário: arredonda para o par
+    (0.135, '0,14', '0,14'),            # 0.135 é um pouco maior que 0,135 em binário
+    (2.675, '2,67', '2,67'),            # 2.675 é um pouco menor que 2,675 em binário
+    (1.005, '1,00', '1,00'),
+    (-1.005, '-1,00', '-1,00'),
+    (-0.001, '-0,00', '-0,00'),
+    (-0.0, '-0,00', '0'),
+    (100.0, '100,00', '100'),
+    (-100.0, '-100,00', '-100'),
+    (7, '7,00', '7'),
+    (0.1 + 0.2, '0,30', '0,30'),
+    (1234567890.125, '1234567890,12', '1234567890,12'),
+    (1e15, '1000000000000000,00', '1000000000000000'),
+    (np.nan, '', ''),
+    (None, '', ''),
+    ('1.234,56', '1.234,56', '1.234,56'),
+    ('abc', 'abc', 'abc'),
+]
+
+# texto -> formatar_moeda_texto
+GOLDEN_MOEDA_TEXTO = [
+    ('12.5', '12,50'),
+    ('1.234,56', '1234,56'),
+    ('-1.234,56', '-1234,56'),
+    ('1.234.567,89', '1234567,89'),
+    ('0,125', '0,12'),
+    ('2.675', '2,67'),
+    (' 10 ', '10,00'),
+    ('-0', '-0,00'),
+    (' ', ' '),
+    ('', ''),
+    ('abc', 'abc'),
+    (None, None),
+]
+
+GOLDEN_DATAS = [
+    (pd.Timestamp('2025-01-31'), '31/01/2025'),
+    (pd.Timestamp('2024-02-29 23:59:59'), '29/02/2024'),
+    (pd.NaT, np.nan),
+    (pd.Timestamp('2025-01-31'), '31/01/2025'),
+]
+
+def _valores(tabela, coluna=0):
+    return [linha[coluna] for linha in tabela]
+
+def test_formatar_moeda_golden():
+    assert [_formatar_valor_para_duas_casas(v) for v in _valores(GOLDEN_MOEDA)] == _valores(GOLDEN_MOEDA, 1)
+    assert formatar_moeda(pd.Series(_valores(GOLDEN_MOEDA), dtype=object)).tolist() == _valores(GOLDEN_MOEDA, 1)
+
+def test_formatar_moeda_robo_golden():
+    assert [_formatar_valor_para_robo(v) for v in _valores(GOLDEN_MOEDA)] == _valores(GOLDEN_MOEDA, 2)
+    assert formatar_moeda_robo(pd.Series(_valores(GOLDEN_MOEDA), dtype=object)).tolist() == _valores(GOLDEN_MOEDA, 2)
+
+def test_formatar_moeda_texto_golden():
+    assert [_formatar_valor_para_duas_casas_texto(v) for v in _valores(GOLDEN_MOEDA_TEXTO)] == _valores(GOLDEN_MOEDA_TEXTO, 1)
+    assert formatar_moeda_texto(pd.Series(_valores(GOLDEN_MOEDA_TEXTO), dtype=object)).tolist() == _valores(GOLDEN_MOEDA_TEXTO, 1)
+
+def test_formatar_datas_golden():
+    serie = pd.Series(_valores(GOLDEN_DATAS), dtype='datetime64[ns]')
+    resultado = formatar_datas(serie).tolist()
+    esperado = _valores(GOLDEN_DATAS, 1)
+    assert [r if isinstance(r, str) else 'NaT' for r in resultado] == [e if isinstance(e, str) else 'NaT' for e in esperado]
+
+def test_formatar_datas_de_texto_e_invalidas():
+    serie = pd.Series(['2025-06-03', None, 'não é data', '2025-06-03'], dtype=object)
+    antigo = pd.to_datetime(serie, errors='coerce').dt.strftime('%d/%m/%Y')
+    pd.testing.assert_series_equal(formatar_datas(serie), antigo.astype(object), check_dtype=False)
+
+@pytest.mark.parametrize('dtype', [object, 'float64'])
+def test_moeda_identica_as_funcoes_antigas(dtype):
+    rng = np.random.default_rng(29)
+    numeros = np.concatenate([
+        np.round(rng.uniform(-1e6, 1e6, 5000), 3),                    # meios centavos e empates
+        rng.integers(-10**6, 10**6, 1000).astype(float),               # valores inteiros
+        rng.uniform(-1e12, 1e12, 200),                                 # acima do limite vetorizado
+        [np.nan, -0.0, 0.0, 0.005, 0.015, 0.025, 1e9 - 0.005],
+    ])
+    serie = pd.Series(numeros).astype(dtype)
+    assert formatar_moeda(serie).tolist() == serie.apply(_formatar_valor_para_duas_casas).tolist()
+    assert formatar_moeda_robo(serie).tolist() == serie.apply(_formatar_valor_para_robo).tolist()
+
+def test_moeda_texto_identica_a_funcao_antiga():
+    rng = np.random.default_rng(29)
+    numeros = np.round(rng.uniform(-1e6, 1e6, 2000), 3)
+    textos = [f"{v:.3f}" for v in numeros[:1000]] + [f"{v:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.') for v in numeros[1000:]]
+    serie = pd.Series(textos + _valores(GOLDEN_MOEDA_TEXTO), dtype=object)
+    assert formatar_moeda_texto(serie).tolist() == serie.apply(_formatar_valor_para_duas_casas_texto).tolist()
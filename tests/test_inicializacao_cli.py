@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Tempo de inicialização do cli.py medido com -X importtime: comandos leves não carregam a pilha de dados."""
+import sys
+import subprocess
+from pathlib import Path
+
+# Mesmo teto do 'python cli.py bench inicializacao'
+from benchmark import LIMITE_IMPORT_MS
+
+RAIZ = Path(__file__).resolve().parent.parent
+PROIBIDOS = ('pandas', 'numpy', 'tqdm')
+TENTATIVAS = 3
+
+def _rastrear_imports(*comando: str) -> tuple:
+    """(tempo de import em ms, módulos importados) de 'python -X importtime cli.py <comando>'."""
+    processo = subprocess.run([sys.executable, '-X', 'importtime', 'cli.py', *comando],
+                              cwd=RAIZ, capture_output=True, text=True, check=True)
+    import_us, modulos = 0, set()
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, nome = linha[len('import time:'):].split('|')
+        modulos.add(nome.strip())
+        # Imports aninhados vêm recuados; somar só os de primeiro nível dá o total do processo
+        if nome[1:2] != ' ':
+            import_us += int(acumulado)
+    return import_us / 1000, modulos
+
+def test_validate_config_help_nao_importa_a_pilha_de_dados():
+    medidas = [_rastrear_imports('validate-config', '--help') for _ in range(TENTATIVAS)]
+    modulos = medidas[0][1]
+    carregados = sorted(m for m in modulos if m.split('.')[0] in PROIBIDOS)
+    assert not carregados, f"cli.py validate-config --help importou {carregados}"
+    # A melhor de algumas execuções: a primeira pode pagar a compilação dos .pyc
+    melhor_ms = min(ms for ms, _ in medidas)
+    assert melhor_ms < LIMITE_IMPORT_MS, f"import levou {melhor_ms:.1f} ms (teto {LIMITE_IMPORT_MS:.0f} ms)"
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+'main.py --shard k/N' em N processos seguido de 'main.py --merge' deve gerar os mesmos arquivos,
+byte a byte, que uma execução única sobre as mesmas entradas.
+"""
+import re
+import sys
+import shutil
+import zipfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('openpyxl')
+
+from src.dados_sinteticos import gerar_conjunto, gravar_conjunto
+from src.shards import shard_das_chaves
+
+RAIZ = Path(__file__).resolve().parent.parent
+TOTAL_SHARDS = 3
+SHARD_VAZIO = 3
+
+@pytest.fixture(scope='module')
+def insumos(tmp_path_factory) -> Path:
+    """
+    Massa sintética pequena sem nenhum CPF do shard 3 (que fica vazio) e com linhas de CPF
+    nulo, que shard_das_chaves manda para o shard 1.
+    """
+    conjunto = gerar_conjunto(900, semente=50)
+    mailing = conjunto['mailing']
+    mailing = mailing[shard_das_chaves(mailing['ncpf'].astype('Int64'), TOTAL_SHARDS) != SHARD_VAZIO]
+    sem_cpf = mailing.head(2).assign(ncpf=pd.NA, ndoc=[1.0, 2.0])
+    conjunto['mailing'] = pd.concat([mailing, sem_cpf], ignore_index=True).astype({'ncpf': 'Int64'})
+    assert shard_das_chaves(conjunto['mailing']['ncpf'], TOTAL_SHARDS)[-2:].tolist() == [1, 1]
+
+    destino = tmp_path_factory.mktemp('insumos')
+    gravar_conjunto(conjunto, destino, formatos=('xlsx',))
+    return destino
+
+def _executar(pasta: Path, insumos: Path, *argumentos: str):
+    """Roda o main.py com a pasta como diretório de trabalho (todos os caminhos do config.ini são relativos)."""
+    if not (pasta / 'config.ini').exists():
+        pasta.mkdir(parents=True, exist_ok=True)
+        shutil.copy(RAIZ / 'config.ini', pasta / 'config.ini')
+        shutil.copytree(insumos, pasta / 'data_input')
+    processo = subprocess.run([sys.executable, str(RAIZ / 'main.py'), *argumentos], cwd=pasta, capture_output=True, text=True)
+    assert processo.returncode == 0, processo.stdout[-3000:] + processo.stderr[-3000:]
+
+def _saidas(pasta: Path) -> dict:
+    """CSVs do arquivo final, com o horário de geração (HHMMSS) tirado do nome dos arquivos do robô."""
+    arquivos = list((pasta / 'data_output').glob('*.zip'))
+    assert len(arquivos) == 1
+    with zipfile.ZipFile(arquivos[0]) as zf:
+        return {re.sub(r'_\d{6}_(\d{8})', r'_\1', nome): zf.read(nome) for nome in zf.namelist() if nome.endswith('.csv')}
+
+def test_shards_e_merge_identicos_a_execucao_unica(insumos, tmp_path):
+    _executar(tmp_path / 'unica', insumos)
+    for k in range(1, TOTAL_SHARDS + 1):
+        _executar(tmp_path / 'shards', insumos, '--shard', f"{k}/{TOTAL_SHARDS}")
+    _executar(tmp_path / 'shards', insumos, '--merge')
+
+    unica, juntada = _saidas(tmp_path / 'unica'), _saidas(tmp_path / 'shards')
+    assert any(nome.startswith('Telecobranca_TOI_mailing_') for nome in unica)
+    assert any(re.match(r'TOI_AD_FF_ENERGISA_\d{2}HRS_', nome) for nome in unica)
+    assert 'rejeitados_por_status_de_bloqueio.csv' in unica
+    assert sorted(juntada) == sorted(unica)
+    for nome in unica:
+        assert juntada[nome] == unica[nome], f"'{nome}' difere entre a execução única e a junção dos shards"
+
+    # O shard vazio foi gravado (sem linhas) e a junção conferiu os três
+    manifesto = (tmp_path / 'shards' / 'data_shards' / f"shard_{SHARD_VAZIO}_de_{TOTAL_SHARDS}" / 'shard.json').read_text(encoding='utf-8')
+    assert '"humano": 0' in manifesto and '"robo": 0' in manifesto